@@ -0,0 +1,147 @@
+"""
+Benchmark di contesa sulle scritture di POST /bookings: percorso check vs slots.
+
+Uso:
+    python -m scripts.bench_booking_contention [--threads 8] [--rounds 50] [--with-index] [--mysql]
+
+Per ogni profilo (BOOKING_WRITE_PATH=check e slots) due scenari:
+  - hot:    tutti i thread provano a prenotare nello stesso istante lo stesso posto
+            e la stessa fascia, per --rounds fasce consecutive. Deve vincere un solo
+            thread per fascia: "double" conta le fasce finite con piu' prenotazioni.
+  - spread: ogni thread prenota fasce consecutive su un proprio posto (throughput
+            senza conflitti reali).
+L'indice in memoria dei posti e' disattivato (salvo --with-index) per misurare
+solo il controllo sul database. Ogni profilo gira in un processo separato con
+un database SQLite temporaneo; --mysql aggiunge i profili su MySQL (MYSQL_*).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+PROFILES = {
+    "sqlite-check": {"DB_BACKEND": "sqlite", "BOOKING_WRITE_PATH": "check"},
+    "sqlite-slots": {"DB_BACKEND": "sqlite", "BOOKING_WRITE_PATH": "slots"},
+    "mysql-check": {"DB_BACKEND": "mysql", "BOOKING_WRITE_PATH": "check"},
+    "mysql-slots": {"DB_BACKEND": "mysql", "BOOKING_WRITE_PATH": "slots"},
+}
+
+
+def run_child(threads, rounds):
+    from src.main import app
+    from src.backend.auth.token_generator import generate_token
+    from src.backend.common.extensions import db
+    from src.backend.models import Booking, Room, Seat, User
+
+    tag = str(os.getpid())
+    with app.app_context():
+        room = Room(name=f"bench-{tag}", floor=0, sun_exposure="north")
+        db.session.add(room)
+        db.session.flush()
+        seats = [Seat(room_id=room.id, upd_user="bench", upd_datetime=datetime.now()) for _ in range(threads + 1)]
+        user = User(username=f"bench-{tag}", password="-", first_name="bench", last_name="bench",
+                    email=f"bench-{tag}@bench.local")
+        db.session.add_all(seats + [user])
+        db.session.commit()
+        seat_ids = [s.id for s in seats]
+        token = generate_token(identity=user.username)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    base = datetime(2030, 1, 1, 8, 0)
+    slot = timedelta(minutes=app.config["BOOKING_SLOT_MINUTES"])
+    results = {}
+
+    def run(worker):
+        lock = threading.Lock()
+        stats = {"created": 0, "conflicts": 0, "errors": 0}
+        barrier = threading.Barrier(threads)
+
+        def loop(i):
+            client = app.test_client()
+            for r in range(rounds):
+                barrier.wait()
+                response = worker(client, i, r)
+                with lock:
+                    if response.status_code == 201:
+                        stats["created"] += 1
+                    elif response.status_code == 409:
+                        stats["conflicts"] += 1
+                    else:
+                        stats["errors"] += 1
+
+        pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+        began = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        stats["elapsed"] = time.perf_counter() - began
+        stats["req_per_s"] = threads * rounds / stats["elapsed"]
+        return stats
+
+    def book(client, seat_id, r):
+        start = base + r * slot
+        return client.post("/bookings", headers=headers, json={
+            "seat_id": seat_id,
+            "start_time": start.isoformat(),
+            "end_time": (start + slot).isoformat(),
+        })
+
+    hot_seat = seat_ids[-1]
+    results["hot"] = run(lambda client, i, r: book(client, hot_seat, r))
+    results["spread"] = run(lambda client, i, r: book(client, seat_ids[i], r))
+
+    with app.app_context():
+        per_round = db.session.query(Booking.start_time, db.func.count()).filter(
+            Booking.seat_id == hot_seat
+        ).group_by(Booking.start_time).all()
+    results["hot"]["double"] = sum(1 for _, n in per_round if n > 1)
+    print("BENCH_RESULT " + json.dumps(results))
+
+
+def run_profile(name, args, workdir):
+    env = {**os.environ, **PROFILES[name]}
+    env.setdefault("JWT_SECRET_KEY", "bench-secret")
+    env["SEAT_AVAILABILITY_INDEX"] = "true" if args.with_index else "false"
+    if env["DB_BACKEND"] == "sqlite":
+        env["SQLITE_PATH"] = os.path.join(workdir, f"{name}.db")
+    cmd = [sys.executable, "-m", "scripts.bench_booking_contention", "--child",
+           "--threads", str(args.threads), "--rounds", str(args.rounds)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    for line in out.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"profile {name} failed:\n{out.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--with-index", action="store_true", help="keep the in-memory seat availability index on")
+    parser.add_argument("--mysql", action="store_true", help="include the MySQL profiles (MYSQL_* env vars)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.threads, args.rounds)
+        return
+
+    profiles = ["sqlite-check", "sqlite-slots"] + (["mysql-check", "mysql-slots"] if args.mysql else [])
+    print(f"{'profile':<14}{'scenario':<9}{'created':>9}{'409':>7}{'errors':>8}{'double':>8}{'req/s':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in profiles:
+            r = run_profile(name, args, workdir)
+            for scenario in ("hot", "spread"):
+                s = r[scenario]
+                print(f"{name:<14}{scenario:<9}{s['created']:>9}{s['conflicts']:>7}{s['errors']:>8}"
+                      f"{s.get('double', '-'):>8}{s['req_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Micro-benchmark delle query per-richiesta: Query ORM ricostruita a ogni
+chiamata contro gli statement pre-costruiti di hot_queries (bindparam).
+
+Uso:
+    python -m scripts.bench_hot_queries [--iterations 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from sqlalchemy import and_
+
+from src.main import app
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Room, Seat, User
+from src.backend.models.booking import BookingStatus
+from src.backend.service import hot_queries
+
+ACTIVE = [BookingStatus.PENDING_CHECKIN, BookingStatus.CONFIRMED]
+
+
+def legacy_queries(username, seat_id, user_id, now, end):
+    """Le stesse query come erano scritte nei controller."""
+    return {
+        "user_by_username": lambda: User.query.filter_by(username=username).first(),
+        "active_booking": lambda: Booking.query.filter(
+            Booking.seat_id == seat_id,
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).first(),
+        "pending_booking": lambda: Booking.query.filter(
+            Booking.seat_id == seat_id,
+            Booking.status == BookingStatus.PENDING_CHECKIN,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).first(),
+        "user_pending_booking": lambda: Booking.query.filter(
+            Booking.user_id == user_id,
+            Booking.seat_id == seat_id,
+            Booking.status == BookingStatus.PENDING_CHECKIN,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).first(),
+        "overlapping_booking": lambda: Booking.query.filter(
+            Booking.seat_id == seat_id,
+            Booking.status.in_(ACTIVE),
+            Booking.start_time < end,
+            Booking.end_time > now,
+        ).first(),
+        "seats_with_current_booking": lambda: db.session.query(
+            Seat.id, Seat.room_id, Seat.is_active, Seat.is_occupied, Booking.status
+        ).outerjoin(
+            Booking,
+            and_(
+                Seat.id == Booking.seat_id,
+                Booking.status.in_(ACTIVE),
+                Booking.start_time <= now,
+                Booking.end_time >= now,
+            ),
+        ).all(),
+    }
+
+
+def cached_queries(username, seat_id, user_id, now, end):
+    return {
+        "user_by_username": lambda: hot_queries.user_by_username(username),
+        "active_booking": lambda: hot_queries.active_booking(seat_id, now),
+        "pending_booking": lambda: hot_queries.pending_booking(seat_id, now),
+        "user_pending_booking": lambda: hot_queries.user_pending_booking(user_id, seat_id, now),
+        "overlapping_booking": lambda: hot_queries.overlapping_booking(seat_id, now, end),
+        "seats_with_current_booking": lambda: hot_queries.seats_with_current_booking(now),
+    }
+
+
+def per_call_us(fn, iterations):
+    fn()  # warm-up: compilazione e cache
+    began = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - began) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        room = Room(name="bench", floor=0, sun_exposure="north")
+        db.session.add(room)
+        db.session.flush()
+        seat = Seat(room_id=room.id, upd_user="bench", upd_datetime=datetime.now())
+        user = User(username="bench", password="-", first_name="b", last_name="b", email="bench@bench.local")
+        db.session.add_all([seat, user])
+        db.session.commit()
+
+        now = datetime.now()
+        params = ("bench", seat.id, user.id, now, now + timedelta(hours=1))
+        legacy, cached = legacy_queries(*params), cached_queries(*params)
+
+        print(f"{'query':<28}{'legacy us':>12}{'cached us':>12}{'speedup':>10}")
+        for name in legacy:
+            before = per_call_us(legacy[name], args.iterations)
+            after = per_call_us(cached[name], args.iterations)
+            print(f"{name:<28}{before:>12.1f}{after:>12.1f}{before / after:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark di concorrenza: scritture /bookings e ingest /temperatures in parallelo.
+
+Uso:
+    python -m scripts.bench_storage [--seconds 10] [--writers 4] [--ingesters 4] [--mysql]
+
+Ogni profilo gira in un processo separato (l'app legge la configurazione
+di storage all'import). I profili SQLite usano un database temporaneo;
+con --mysql viene aggiunto il profilo MySQL configurato tramite le variabili
+MYSQL_* (usare un database di prova: il benchmark inserisce dati).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+PROFILES = {
+    # pragmas di default di SQLite (rollback journal, fsync completo)
+    "sqlite-default": {
+        "DB_BACKEND": "sqlite",
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+    },
+    "sqlite-wal": {
+        "DB_BACKEND": "sqlite",
+        "SQLITE_JOURNAL_MODE": "WAL",
+        "SQLITE_SYNCHRONOUS": "NORMAL",
+    },
+    "mysql": {
+        "DB_BACKEND": "mysql",
+    },
+}
+
+
+def run_child(seconds, writers, ingesters):
+    from src.main import app
+    from src.backend.auth.token_generator import generate_token
+    from src.backend.common.extensions import db
+    from src.backend.models import Room, Seat, User
+
+    tag = str(os.getpid())
+    with app.app_context():
+        room = Room(name=f"bench-{tag}", floor=0, sun_exposure="north")
+        db.session.add(room)
+        db.session.flush()
+        seats = [Seat(room_id=room.id, upd_user="bench", upd_datetime=datetime.now()) for _ in range(writers)]
+        user = User(username=f"bench-{tag}", password="-", first_name="bench", last_name="bench",
+                    email=f"bench-{tag}@bench.local")
+        db.session.add_all(seats + [user])
+        db.session.commit()
+        seat_ids = [s.id for s in seats]
+        room_id = room.id
+        token = generate_token(identity=user.username)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"bookings": 0, "temperatures": 0, "errors": 0, "locked": 0}
+
+    def record(kind, response):
+        with lock:
+            if response.status_code >= 500:
+                stats["errors"] += 1
+                if "locked" in response.get_data(as_text=True):
+                    stats["locked"] += 1
+            else:
+                stats[kind] += 1
+
+    def booking_writer(seat_id):
+        client = app.test_client()
+        start = datetime(2030, 1, 1)
+        while not stop.is_set():
+            end = start + timedelta(minutes=30)
+            r = client.post("/bookings", headers=headers, json={
+                "seat_id": seat_id,
+                "start_time": start.isoformat(),
+                "end_time": end.isoformat(),
+            })
+            record("bookings", r)
+            start = end
+
+    def temperature_ingest():
+        client = app.test_client()
+        while not stop.is_set():
+            r = client.post("/temperatures", json={"room_id": room_id, "temperature": 21.5})
+            record("temperatures", r)
+
+    threads = [threading.Thread(target=booking_writer, args=(sid,)) for sid in seat_ids]
+    threads += [threading.Thread(target=temperature_ingest) for _ in range(ingesters)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    stats["elapsed"] = elapsed
+    stats["ops_per_s"] = (stats["bookings"] + stats["temperatures"]) / elapsed
+    print("BENCH_RESULT " + json.dumps(stats))
+
+
+def run_profile(name, args, workdir):
+    env = {**os.environ, **PROFILES[name]}
+    env.setdefault("JWT_SECRET_KEY", "bench-secret")
+    if env["DB_BACKEND"] == "sqlite":
+        env["SQLITE_PATH"] = os.path.join(workdir, f"{name}.db")
+    cmd = [sys.executable, "-m", "scripts.bench_storage", "--child",
+           "--seconds", str(args.seconds), "--writers", str(args.writers), "--ingesters", str(args.ingesters)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    for line in out.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"profile {name} failed:\n{out.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--ingesters", type=int, default=4)
+    parser.add_argument("--mysql", action="store_true", help="include the MySQL profile (MYSQL_* env vars)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.seconds, args.writers, args.ingesters)
+        return
+
+    profiles = ["sqlite-default", "sqlite-wal"] + (["mysql"] if args.mysql else [])
+    print(f"{'profile':<16}{'bookings':>10}{'temps':>10}{'errors':>8}{'locked':>8}{'ops/s':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in profiles:
+            r = run_profile(name, args, workdir)
+            print(f"{name:<16}{r['bookings']:>10}{r['temperatures']:>10}{r['errors']:>8}{r['locked']:>8}{r['ops_per_s']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark di POST /temperatures: scrittura sincrona vs write-behind con group commit.
+
+Uso:
+    python -m scripts.bench_temperature_ingest [--threads 8] [--requests 500] [--timeseries]
+
+Per ogni profilo --threads thread inviano --requests letture ciascuno (una per
+richiesta) su alcune stanze. Si misurano le richieste al secondo e la latenza
+p50/p99; per il profilo write-behind si aspetta lo svuotamento del buffer e si
+verifica che tutte le letture siano state scritte ("rows"). Ogni profilo gira in
+un processo separato con un database SQLite temporaneo.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    "sync": {"TEMPERATURE_WRITE_BEHIND": "false"},
+    "write-behind": {"TEMPERATURE_WRITE_BEHIND": "true"},
+}
+
+
+def run_child(threads, requests):
+    from src.main import app
+    from src.backend.common.extensions import db
+    from src.backend.models import Room, TemperatureReading
+    from src.backend.service.temperature_service import temperature_store
+
+    tag = str(os.getpid())
+    with app.app_context():
+        rooms = [Room(name=f"bench-{tag}-{i}", floor=0, sun_exposure="north") for i in range(4)]
+        db.session.add_all(rooms)
+        db.session.commit()
+        room_ids = [r.id for r in rooms]
+
+    lock = threading.Lock()
+    latencies = []
+    stats = {"errors": 0}
+
+    def loop(i):
+        client = app.test_client()
+        mine = []
+        for r in range(requests):
+            began = time.perf_counter()
+            response = client.post("/temperatures", json={
+                "room_id": room_ids[(i + r) % len(room_ids)],
+                "temperature": 20.0 + (r % 10) / 10,
+            })
+            mine.append(time.perf_counter() - began)
+            if response.status_code != 200:
+                with lock:
+                    stats["errors"] += 1
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    began = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    stats["elapsed"] = time.perf_counter() - began
+
+    buffer = app.extensions.get("temperature_buffer")
+    if buffer is not None:
+        buffer.stop()
+        stats["batches"] = buffer.batches
+    stats["drained"] = time.perf_counter() - began
+
+    latencies.sort()
+    stats["req_per_s"] = threads * requests / stats["elapsed"]
+    stats["p50_ms"] = latencies[len(latencies) // 2] * 1000
+    stats["p99_ms"] = latencies[int(len(latencies) * 0.99)] * 1000
+    with app.app_context():
+        if temperature_store() is None:
+            stats["rows"] = db.session.query(TemperatureReading).filter(
+                TemperatureReading.room_id.in_(room_ids)
+            ).count()
+    print("BENCH_RESULT " + json.dumps(stats))
+
+
+def run_profile(name, args, workdir):
+    env = {**os.environ, **PROFILES[name]}
+    env.setdefault("JWT_SECRET_KEY", "bench-secret")
+    env["DB_BACKEND"] = "sqlite"
+    env["SQLITE_PATH"] = os.path.join(workdir, f"{name}.db")
+    if args.timeseries:
+        env["TEMPERATURE_BACKEND"] = "timeseries"
+        env["TEMPERATURE_SERIES_DIR"] = os.path.join(workdir, f"{name}-series")
+    cmd = [sys.executable, "-m", "scripts.bench_temperature_ingest", "--child",
+           "--threads", str(args.threads), "--requests", str(args.requests)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    for line in out.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"profile {name} failed:\n{out.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="readings per thread")
+    parser.add_argument("--timeseries", action="store_true", help="use TEMPERATURE_BACKEND=timeseries")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.threads, args.requests)
+        return
+
+    print(f"{'profile':<14}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'rows':>8}{'batches':>9}{'drained s':>11}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in PROFILES:
+            s = run_profile(name, args, workdir)
+            print(f"{name:<14}{s['req_per_s']:>9.1f}{s['p50_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['errors']:>8}"
+                  f"{s.get('rows', '-'):>8}{s.get('batches', '-'):>9}{s['drained']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Verifica con EXPLAIN QUERY PLAN che le query piu' frequenti usino un indice.
+
+Uso:
+    python -m scripts.check_query_plans
+
+Termina con codice 1 se una query ricade in una scansione completa
+di una tabella diversa da quelle ammesse.
+"""
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, select, tuple_
+
+from src.main import app
+from src.backend.common.extensions import db
+from src.backend.models import Booking, EnergyCommand, Seat, SeatSuggestion, TemperatureReading
+from src.backend.models.booking import BookingStatus
+
+
+def hot_queries():
+    """(nome, statement, tabelle per cui la SCAN e' attesa)"""
+    now = datetime(2025, 1, 1, 10, 0)
+    start, end = now, now + timedelta(hours=2)
+    active = [BookingStatus.PENDING_CHECKIN, BookingStatus.CONFIRMED]
+    after = tuple_(Booking.start_time, Booking.id) > tuple_(now, 100)
+
+    def page(*criteria):
+        return Booking.query.filter(*criteria, after).order_by(Booking.start_time, Booking.id).limit(51).statement
+
+    return [
+        ("booking overlap check", Booking.query.filter(
+            Booking.seat_id == 1,
+            Booking.status.in_(active),
+            Booking.start_time < end,
+            Booking.end_time > start,
+        ).statement, ()),
+        ("occupancy active booking", Booking.query.filter(
+            Booking.seat_id == 1,
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).statement, ()),
+        ("occupancy pending booking", Booking.query.filter(
+            Booking.seat_id == 1,
+            Booking.status == BookingStatus.PENDING_CHECKIN,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).statement, ()),
+        ("check-in booking", Booking.query.filter(
+            Booking.user_id == 1,
+            Booking.seat_id == 1,
+            Booking.status == BookingStatus.PENDING_CHECKIN,
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).statement, ()),
+        ("future bookings", Booking.query.filter(Booking.end_time >= now).statement, ()),
+        ("expired confirmed bookings", Booking.query.filter(
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.end_time <= now,
+        ).statement, ()),
+        ("stats bookings window", Booking.query.filter(
+            Booking.start_time >= start,
+            Booking.start_time <= end,
+        ).statement, ()),
+        ("stats occupancy bucket", Booking.query.filter(
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.start_time < end,
+            Booking.end_time > start,
+        ).statement, ()),
+        ("bookings page", page(Booking.end_time >= now), ()),
+        ("my bookings page", page(Booking.user_id == 1, Booking.end_time >= now), ()),
+        ("bookings by status page", page(Booking.status == BookingStatus.CONFIRMED), ()),
+        ("seat bookings page", page(Booking.seat_id == 1, Booking.end_time >= now), ()),
+        ("room bookings by day page", page(
+            Booking.seat_id.in_(select(Seat.id).where(Seat.room_id == 1)),
+            Booking.start_time >= start,
+            Booking.start_time < start + timedelta(days=1),
+        ), ()),
+        ("room seats", Seat.query.filter(Seat.room_id == 1).statement, ()),
+        ("room temperature window", TemperatureReading.query.filter(
+            TemperatureReading.room_id == 1,
+            TemperatureReading.timestamp >= start,
+            TemperatureReading.timestamp <= end,
+        ).statement, ()),
+        ("temperature bucket", db.session.query(func.avg(TemperatureReading.temperature)).filter(
+            TemperatureReading.timestamp >= start,
+            TemperatureReading.timestamp < end,
+        ).statement, ()),
+        ("energy commands export window", EnergyCommand.query.filter(
+            EnergyCommand.timestamp >= start,
+            EnergyCommand.timestamp <= end,
+        ).statement, ()),
+        ("latest suggestion date", db.session.query(func.max(SeatSuggestion.date)).statement, ()),
+        ("latest suggestion per seat", db.session.query(
+            SeatSuggestion.seat_id, func.max(SeatSuggestion.id)
+        ).filter(SeatSuggestion.date == now.date()).group_by(SeatSuggestion.seat_id).statement, ()),
+        ("suggestions by date", SeatSuggestion.query.filter(
+            SeatSuggestion.date == now.date()
+        ).order_by(SeatSuggestion.score.desc()).statement, ()),
+        # /seats restituisce tutti i posti: la scansione di seats e' voluta
+        ("seats with current booking", db.session.query(Seat, Booking.status).outerjoin(
+            Booking,
+            and_(
+                Seat.id == Booking.seat_id,
+                Booking.status.in_(active),
+                Booking.start_time <= now,
+                Booking.end_time >= now,
+            ),
+        ).statement, ("seats",)),
+    ]
+
+
+def full_scans(plan_rows, allowed):
+    """Restituisce le righe del piano che scansionano una tabella senza indice."""
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        if not detail.startswith("SCAN "):
+            continue
+        if " USING " in detail:
+            continue
+        table = detail.split()[1]
+        if table in allowed:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def main():
+    failures = 0
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != "sqlite":
+            print(f"Skipping: EXPLAIN QUERY PLAN check requires SQLite, got {engine.dialect.name}")
+            return 0
+        with engine.connect() as conn:
+            for name, stmt, allowed in hot_queries():
+                sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+                plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+                scans = full_scans(plan, allowed)
+                if scans:
+                    failures += 1
+                    print(f"FAIL {name}: {'; '.join(scans)}")
+                else:
+                    print(f"ok   {name}: {'; '.join(row[-1] for row in plan)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Revoca dei token JWT (logout) senza una query per richiesta.
+
+Le revoche sono salvate in user_token (jti, scadenza del token) e tenute in
+memoria in un dizionario jti -> scadenza: il controllo di
+token_in_blocklist_loader e' un lookup in un dict. Ogni processo rilegge dal db,
+al massimo ogni JWT_BLOCKLIST_REFRESH_SECONDS secondi, le revoche con revoked_at
+successivo all'ultimo visto meno un margine (commit in ritardo e orologi dei
+worker non allineati), quindi una revoca fatta da un altro worker vale entro
+quell'intervallo (subito nel processo che la registra). Gli id non servono come
+watermark: SQLite riusa gli id piu' alti dopo la pulizia delle revoche scadute.
+Ogni JWT_BLOCKLIST_FULL_RELOAD_SECONDS si rileggono comunque tutte le revoche
+di token non ancora scaduti.
+Le revoche di token scaduti escono dalla memoria a ogni aggiornamento (heap per
+scadenza) e dal db con il job token_purge.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from src.backend.common.logger import logger
+from src.backend.models import UserToken
+
+
+def _to_epoch(value):
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _from_epoch(value):
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+class TokenBlocklist:
+    def __init__(self, refresh_seconds, full_reload_seconds=300, overlap_seconds=60):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._lock = threading.RLock()
+        self._revoked = {}  # jti -> scadenza (epoch)
+        self._expiry = []  # heap di (scadenza, jti)
+        self.watermark = None  # revoked_at piu' recente visto
+        self._next_refresh = 0.0
+        self._next_full_reload = 0.0
+
+    def add(self, jti, expires):
+        with self._lock:
+            if jti in self._revoked:
+                return
+            self._revoked[jti] = expires
+            heapq.heappush(self._expiry, (expires, jti))
+
+    def __contains__(self, jti):
+        return jti in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def evict_expired(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, jti = heapq.heappop(self._expiry)
+                self._revoked.pop(jti, None)
+
+    def refresh(self, session, force=False):
+        """Aggiunge le revoche registrate dopo l'ultima lettura (anche da altri processi)."""
+        now = time.monotonic()
+        if not force and now < self._next_refresh:
+            return
+        if not self._lock.acquire(blocking=force):
+            return  # un altro thread sta gia' aggiornando
+        try:
+            full = force or self.watermark is None or now >= self._next_full_reload
+            stmt = select(UserToken.token, UserToken.expired_at, UserToken.revoked_at)
+            if full:
+                stmt = stmt.where(UserToken.expired_at > datetime.utcnow())
+            else:
+                stmt = stmt.where(UserToken.revoked_at >= self.watermark - self.overlap)
+            for jti, expired_at, revoked_at in session.execute(stmt).all():
+                self.add(jti, _to_epoch(expired_at))
+                if revoked_at is not None and (self.watermark is None or revoked_at > self.watermark):
+                    self.watermark = revoked_at
+            if full:
+                # senza revoche il margine parte da adesso
+                self.watermark = self.watermark or datetime.utcnow()
+                self._next_full_reload = now + self.full_reload_seconds
+            self.evict_expired()
+            self._next_refresh = now + self.refresh_seconds
+        finally:
+            self._lock.release()
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_token_blocklist(app):
+    app.extensions["token_blocklist"] = TokenBlocklist(
+        app.config["JWT_BLOCKLIST_REFRESH_SECONDS"],
+        app.config["JWT_BLOCKLIST_FULL_RELOAD_SECONDS"],
+    )
+
+
+def token_blocklist():
+    return current_app.extensions.get("token_blocklist")
+
+
+def load_token_blocklist(session):
+    """Carica all'avvio le revoche dei token non ancora scaduti."""
+    blocklist = token_blocklist()
+    if blocklist is None:
+        return 0
+    blocklist.refresh(session, force=True)
+    logger.info(f"Token blocklist loaded with {len(blocklist)} revoked tokens")
+    return len(blocklist)
+
+
+def is_token_revoked(session, jwt_payload):
+    blocklist = token_blocklist()
+    if blocklist is None:
+        return False
+    blocklist.refresh(session)
+    return jwt_payload.get("jti") in blocklist
+
+
+def revoke_token(session, jwt_payload, user_id):
+    """Registra la revoca del token; il commit e' a carico del chiamante."""
+    jti = jwt_payload["jti"]
+    if session.scalar(select(UserToken.id).where(UserToken.token == jti)) is None:
+        session.add(UserToken(
+            user_id=user_id,
+            token=jti,
+            issued_at=_from_epoch(jwt_payload["iat"]),
+            expired_at=_from_epoch(jwt_payload["exp"]),
+            revoked_at=datetime.utcnow(),
+        ))
+    blocklist = token_blocklist()
+    if blocklist is not None:
+        blocklist.add(jti, jwt_payload["exp"])
+
+
+def purge_expired_tokens(session, now=None):
+    """Elimina le revoche di token gia' scaduti (non servono piu' per rifiutarli)."""
+    now = now or datetime.utcnow()
+    result = session.execute(delete(UserToken).where(UserToken.expired_at <= now))
+    session.commit()
+    blocklist = token_blocklist()
+    if blocklist is not None:
+        blocklist.evict_expired(_to_epoch(now))
+    return result.rowcount
@@ -51,3 +51,26 @@ EMAIL_BOOKING_FORCE_RELEASED = {
         "Library Booking System"
     )
 }
+
+EMAIL_BOOKING_EVACUATED = {
+    "subject": "Spostamento prenotazione",
+    "body": (
+        "La tua prenotazione del {start_time} è stata spostata.\n\n"
+        "Posto precedente: {old_seat} (sala {old_room})\n"
+        "Nuovo posto: {new_seat} (sala {new_room})\n\n"
+        "Motivazione:\n{reason}\n\n"
+        "Grazie per la collaborazione."
+    )
+}
+
+EMAIL_WAITLIST_FULFILLED = {
+    "subject": "Posto disponibile dalla lista d'attesa",
+    "body": (
+        "Ciao {user_name},\n\n"
+        "si è liberato un posto nella sala {room}: abbiamo prenotato per te "
+        "il posto {seat_id} dalle {start_time} alle {end_time}.\n\n"
+        "Ricordati di effettuare il check-in, altrimenti il posto verrà rilasciato.\n\n"
+        "Grazie per la collaborazione.\n"
+        "Library Booking System"
+    )
+}
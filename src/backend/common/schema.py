@@ -0,0 +1,131 @@
+from sqlalchemy import inspect, select, text
+
+from src.backend.common.logger import logger
+
+
+# indici rimpiazzati da altri dichiarati nei model: {tabella: [nome]}
+SUPERSEDED_INDEXES = {
+    # coperto da ix_bookings_start_time_id (paginazione per start_time, id)
+    "bookings": ["ix_bookings_start_time"],
+}
+
+
+# tabelle con sqlite_autoincrement e le tabelle di archivio con gli stessi id:
+# la sequenza riparte dal massimo tra le due, cosi' un id archiviato non torna
+ID_ARCHIVES = {
+    "bookings": "bookings_archive",
+    "temperature_readings": "temperature_readings_archive",
+}
+
+
+def upgrade_schema(db):
+    """
+    Allinea un database esistente (es. iot.db) ai model correnti.
+    db.create_all() crea solo le tabelle mancanti: le colonne nullable e gli
+    indici aggiunti a tabelle gia' presenti vanno creati qui. Vengono rimossi
+    solo gli indici sostituiti elencati in SUPERSEDED_INDEXES. Su SQLite le
+    tabelle dichiarate con sqlite_autoincrement e create senza AUTOINCREMENT
+    vengono ricostruite.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        if _needs_autoincrement(engine, table):
+            _rebuild_with_autoincrement(engine, inspector, table, existing_tables)
+            continue
+        _add_missing_columns(engine, inspector, table)
+        existing_indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for name in SUPERSEDED_INDEXES.get(table.name, ()):
+            if name in existing_indexes:
+                _drop_index(engine, table, name)
+                existing_indexes.discard(name)
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            index.create(bind=engine)
+            logger.info(f"Created index {index.name} on {table.name}")
+
+
+def _drop_index(engine, table, name):
+    preparer = engine.dialect.identifier_preparer
+    if engine.dialect.name == "mysql":
+        ddl = f"DROP INDEX {preparer.quote(name)} ON {preparer.format_table(table)}"
+    else:
+        ddl = f"DROP INDEX IF EXISTS {preparer.quote(name)}"
+    with engine.begin() as conn:
+        conn.execute(text(ddl))
+    logger.info(f"Dropped index {name} on {table.name}")
+
+
+def _add_missing_columns(engine, inspector, table):
+    """ALTER TABLE ADD COLUMN per le colonne nullable dichiarate nel model e assenti nel db."""
+    present = {column["name"] for column in inspector.get_columns(table.name)}
+    preparer = engine.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in present:
+            continue
+        if not column.nullable or column.server_default is not None:
+            logger.warning(f"Column {table.name}.{column.name} is missing and must be added manually")
+            continue
+        ddl = (f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+               f"{preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}")
+        with engine.begin() as conn:
+            conn.execute(text(ddl))
+        logger.info(f"Added column {column.name} to {table.name}")
+
+
+def _needs_autoincrement(engine, table):
+    if engine.dialect.name != "sqlite" or not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    with engine.connect() as conn:
+        ddl = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+        ).scalar()
+    return "AUTOINCREMENT" not in (ddl or "").upper()
+
+
+def _rebuild_with_autoincrement(engine, inspector, table, existing_tables):
+    """
+    Ricrea la tabella con AUTOINCREMENT (SQLite non lo aggiunge con ALTER TABLE):
+    rinomina la vecchia, crea la nuova con i suoi indici, copia le righe e
+    allinea sqlite_sequence anche agli id gia' archiviati.
+    """
+    present = {column["name"] for column in inspector.get_columns(table.name)}
+    columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name in present)
+    old_name = f"{table.name}_before_autoincrement"
+    archive = ID_ARCHIVES.get(table.name)
+
+    with engine.connect() as conn:
+        # fuori transazione: con foreign_keys=ON il DROP cancellerebbe a cascata,
+        # e legacy_alter_table evita che il rename riscriva le FK delle altre tabelle
+        foreign_keys = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table=ON")
+        try:
+            # BEGIN esplicito: il driver aprirebbe la transazione solo al primo INSERT
+            conn.exec_driver_sql("BEGIN")
+            for index in inspector.get_indexes(table.name):
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index["name"]}"')
+            conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+            table.create(bind=conn)
+            conn.exec_driver_sql(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"')
+            conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+            floor = conn.execute(select(table.c.id).order_by(table.c.id.desc()).limit(1)).scalar() or 0
+            if archive in existing_tables:
+                floor = max(floor, conn.exec_driver_sql(f'SELECT MAX(id) FROM "{archive}"').scalar() or 0)
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": floor})
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql("PRAGMA legacy_alter_table=OFF")
+            conn.exec_driver_sql(f"PRAGMA foreign_keys={'ON' if foreign_keys else 'OFF'}")
+    logger.info(f"Rebuilt {table.name} with AUTOINCREMENT (ids start after {floor})")
@@ -0,0 +1,154 @@
+import os
+
+from flask.globals import app_ctx
+from sqlalchemy import event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from src.backend.common.logger import logger
+
+SUPPORTED_BACKENDS = ("sqlite", "mysql")
+
+# bind dell'engine in sola lettura usato da statistiche e suggerimenti
+READ_BIND = "analytics"
+
+# sessione per le letture analitiche, una per app context come db.session
+read_session = scoped_session(
+    sessionmaker(autoflush=False),
+    scopefunc=lambda: id(app_ctx._get_current_object()),
+)
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def configure_storage(app):
+    """
+    Configura URI e opzioni dell'engine in base a DB_BACKEND (sqlite | mysql).
+    Va chiamata prima di db.init_app(app).
+    """
+    backend = os.getenv("DB_BACKEND", "sqlite").lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(f"Unsupported DB_BACKEND '{backend}', expected one of {SUPPORTED_BACKENDS}")
+
+    app.config["DB_BACKEND"] = backend
+    if backend == "sqlite":
+        _configure_sqlite(app)
+    else:
+        _configure_mysql(app)
+
+
+def _configure_sqlite(app):
+    os.makedirs(app.instance_path, exist_ok=True)
+    path = os.getenv("SQLITE_PATH") or os.path.join(app.instance_path, "iot.db")
+    busy_timeout_ms = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+    path = os.path.abspath(path)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLITE_PRAGMAS"] = {
+        # WAL: i lettori non bloccano lo scrittore e viceversa
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        # con WAL, NORMAL e' sicuro contro la corruzione e evita un fsync per commit
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": busy_timeout_ms,
+        "temp_store": "MEMORY",
+        # valore negativo = dimensione in KiB
+        "cache_size": -_env_int("SQLITE_CACHE_SIZE_KB", 20000),
+    }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "connect_args": {
+            "timeout": busy_timeout_ms / 1000,
+            "check_same_thread": False,
+        },
+    }
+    # seconda connessione allo stesso file, aperta in sola lettura
+    app.config["SQLALCHEMY_BINDS"] = {
+        READ_BIND: {
+            "url": f"sqlite:///file:{path}?mode=ro&uri=true",
+            **app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        },
+    }
+
+
+def _configure_mysql(app):
+    host = os.getenv("MYSQL_HOST", "localhost")
+    port = _env_int("MYSQL_PORT", 3306)
+
+    def mysql_url(host, port):
+        return URL.create(
+            "mysql+mysqlconnector",
+            username=os.getenv("MYSQL_USER", "root"),
+            password=os.getenv("MYSQL_PASSWORD"),
+            host=host,
+            port=port,
+            database=os.getenv("MYSQL_DATABASE", "iot"),
+        ).render_as_string(hide_password=False)
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = mysql_url(host, port)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": _env_int("DB_POOL_SIZE", 10),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        # MySQL chiude le connessioni inattive dopo wait_timeout
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+    # replica di lettura se configurata, altrimenti un pool separato sul primario
+    app.config["SQLALCHEMY_BINDS"] = {
+        READ_BIND: {
+            "url": mysql_url(os.getenv("MYSQL_REPLICA_HOST", host), _env_int("MYSQL_REPLICA_PORT", port)),
+            **app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        },
+    }
+
+
+def init_storage(app, db):
+    """
+    Registra gli hook per-connessione e collega read_session all'engine
+    in sola lettura. Va chiamata dopo db.init_app(app).
+    """
+    with app.app_context():
+        _install_engine_events(app, db.engine, read_only=False)
+        read_engine = db.engines[READ_BIND]
+        _install_engine_events(app, read_engine, read_only=True)
+
+    read_session.session_factory.configure(bind=read_engine)
+
+    @app.teardown_appcontext
+    def _remove_read_session(exc):
+        read_session.remove()
+
+
+def _install_engine_events(app, engine, read_only):
+    if engine.dialect.name == "sqlite":
+        pragmas = dict(app.config.get("SQLITE_PRAGMAS") or {})
+        if read_only:
+            # journal_mode e' persistente nel file e non si imposta da una connessione ro
+            pragmas.pop("journal_mode", None)
+            pragmas["query_only"] = "ON"
+        statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+    elif read_only:
+        statements = ["SET SESSION TRANSACTION READ ONLY"]
+    else:
+        statements = []
+
+    if not statements:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    logger.info(f"{'Read-only' if read_only else 'Primary'} engine setup: {statements}")
+
+
+def describe_storage(app):
+    """Descrizione del backend configurato, con la password oscurata."""
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    return f"{app.config.get('DB_BACKEND')}: {url.render_as_string(hide_password=True)}"
@@ -0,0 +1,205 @@
+"""
+Buffer write-behind con group commit.
+
+Le richieste accodano gli elementi in una coda limitata e rispondono subito; un
+thread in background li raccoglie e chiama flush(items) con un blocco di al
+massimo max_rows elementi, al piu' tardi interval_ms dopo il primo elemento del
+blocco. Cosi' N letture costano una transazione (e un fsync) invece di N.
+
+Se la coda e' piena submit() restituisce False e il chiamante scrive in modo
+sincrono: nessuna lettura viene persa per backpressure. Un blocco il cui flush
+fallisce (es. database non raggiungibile) viene rimesso da parte e riscritto dal
+thread con backoff esponenziale (da retry_ms fino a max_retry_ms); nel frattempo
+la coda si riempie e i chiamanti tornano a scrivere da se'. I blocchi vengono
+scartati, contandoli in failed, solo durante stop() (registrato con atexit), che
+fa un ultimo tentativo e svuota la coda prima dell'uscita del processo.
+"""
+import atexit
+import collections
+import queue
+import threading
+import time
+
+from src.backend.common.logger import logger
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush, max_rows=500, interval_ms=200, capacity=10000, name="write-behind",
+                 retry_ms=500, max_retry_ms=30000):
+        self._flush = flush
+        self.max_rows = max_rows
+        self.interval = interval_ms / 1000.0
+        self.retry = retry_ms / 1000.0
+        self.max_retry = max_retry_ms / 1000.0
+        self.capacity = capacity
+        self.name = name
+        self._queue = queue.Queue(maxsize=capacity)
+        self._retry_lock = threading.Lock()
+        self._failed_batches = collections.deque()  # blocchi da riscrivere, in ordine di arrivo
+        self._backoff = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    # ------------------------------------------------------------------- produttori
+
+    def submit(self, item):
+        """Accoda item; False se il buffer e' pieno o fermo (il chiamante scrive da se')."""
+        if self._stop.is_set():
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def submit_many(self, items):
+        """Accoda gli items e restituisce quelli rifiutati (buffer pieno)."""
+        rejected = []
+        for i, item in enumerate(items):
+            if not self.submit(item):
+                rejected.extend(items[i:])
+                break
+        return rejected
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------------- consumatore
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _collect(self):
+        """Aspetta il primo elemento, poi raccoglie fino a max_rows o allo scadere dell'intervallo."""
+        try:
+            items = [self._queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(items) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _write_batch(self, items):
+        with self._flush_lock:
+            try:
+                self._flush(items)
+            except Exception:
+                logger.exception(f"{self.name}: flush of {len(items)} items failed")
+                return False
+            self.flushed += len(items)
+            self.batches += 1
+            return True
+
+    def write(self, items):
+        """
+        Scrive items subito nel thread chiamante (es. quelli rifiutati da un buffer
+        pieno). Se il flush fallisce il blocco viene riprovato dal thread con
+        backoff; restituisce False in quel caso.
+        """
+        if self._write_batch(items):
+            return True
+        self._defer(items)
+        return False
+
+    def _defer(self, items):
+        """Mette da parte un blocco fallito; durante stop() lo scarta."""
+        if self._stop.is_set():
+            self._drop(items)
+            return
+        with self._retry_lock:
+            self._failed_batches.append(items)
+            self._backoff = min(max(self._backoff * 2, self.retry), self.max_retry)
+            waiting = sum(len(batch) for batch in self._failed_batches)
+            # limite come per la coda: oltre capacity si scartano i blocchi piu' vecchi
+            dropped = []
+            while waiting > self.capacity and len(self._failed_batches) > 1:
+                batch = self._failed_batches.popleft()
+                waiting -= len(batch)
+                dropped.append(batch)
+        for batch in dropped:
+            self._drop(batch)
+        self._ensure_started()
+
+    def _drop(self, items):
+        self.failed += len(items)
+        logger.error(f"{self.name}: dropped {len(items)} items that could not be written")
+
+    def _retry_failed(self):
+        """Riscrive i blocchi falliti in ordine; False al primo che fallisce ancora."""
+        while True:
+            with self._retry_lock:
+                if not self._failed_batches:
+                    self._backoff = 0.0
+                    return True
+                items = self._failed_batches.popleft()
+            if not self._write_batch(items):
+                with self._retry_lock:
+                    self._failed_batches.appendleft(items)
+                    self._backoff = min(max(self._backoff * 2, self.retry), self.max_retry)
+                return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._failed_batches:
+                # niente nuovi blocchi finche' i precedenti non sono scritti
+                if self._stop.wait(self._backoff):
+                    break
+                self._retry_failed()
+                continue
+            items = self._collect()
+            if items:
+                self.write(items)
+
+    def flush(self):
+        """
+        Scrive subito i blocchi falliti e tutto quello che e' in coda (nel thread
+        chiamante). Se una scrittura fallisce si ferma e lascia il resto al thread,
+        tranne durante stop().
+        """
+        if not self._retry_failed() and not self._stop.is_set():
+            return
+        while True:
+            items = []
+            while len(items) < self.max_rows:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not items:
+                return
+            if not self.write(items) and not self._stop.is_set():
+                return
+
+    def stop(self, timeout=5.0):
+        """Ferma il thread, fa un ultimo tentativo sui blocchi falliti e scrive quelli rimasti in coda."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        with self._retry_lock:
+            dropped, self._failed_batches = list(self._failed_batches), collections.deque()
+        for batch in dropped:
+            self._drop(batch)
+        logger.info(f"{self.name}: stopped, {self.flushed} items written in {self.batches} batches, "
+                    f"{self.failed} failed")
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from flask import Response, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_smorest import Blueprint
+
+from src.backend.common.logger import logger
+from src.backend.common.storage import read_session
+from src.backend.controllers.admin_stats import _require_admin
+from src.backend.service.export_service import EXPORTS, EXPORT_FORMATS, csv_lines, ndjson_lines
+
+export_bp = Blueprint("admin_export", __name__, description="Admin data export")
+
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@export_bp.route('/admin/export/<dataset>', methods=['GET'])
+@jwt_required()
+def admin_export(dataset):
+    """Stream a dataset as NDJSON (default) or CSV.
+
+    Datasets: bookings, temperature-readings, energy-commands, suggestions.
+    Optional query params:
+      - format: 'ndjson' or 'csv'
+      - start / end: ISO datetimes limiting the exported rows
+      - room_id: only for temperature-readings and energy-commands
+    """
+    username = get_jwt_identity()
+    if not _require_admin(username):
+        return {"error": "Forbidden"}, 403
+
+    export = EXPORTS.get(dataset)
+    if export is None:
+        return {"error": f"Unknown dataset, expected one of {sorted(EXPORTS)}"}, 404
+
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return {"error": f"Invalid format, expected one of {list(EXPORT_FORMATS)}"}, 400
+
+    try:
+        start = request.args.get('start')
+        start = datetime.fromisoformat(start) if start else None
+        end = request.args.get('end')
+        end = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        return {"error": "Invalid datetime format"}, 400
+    room_id = request.args.get('room_id', type=int)
+
+    def generate():
+        # la query parte alla prima lettura della risposta, non qui
+        columns, rows = export(start, end, room_id)
+        lines = csv_lines if fmt == "csv" else ndjson_lines
+        try:
+            yield from lines(columns, rows)
+        except Exception:
+            # lo status 200 e' gia' stato inviato: si puo' solo troncare la risposta
+            logger.exception(f"Export of {dataset} failed")
+            read_session.rollback()
+            raise
+
+    filename = f"{dataset}-{datetime.now():%Y%m%d%H%M%S}.{fmt}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -2,15 +2,23 @@ from datetime import datetime, timedelta
 from flask_smorest import Blueprint
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.backend.common.extensions import db
-from src.backend.models import Room, Seat, TemperatureReading, RoomEnergyState, EnergyCommand, Booking, User
+from src.backend.common.storage import read_session
+from src.backend.service.archive_service import booking_history
+from src.backend.service.device_registry import stale_devices
+from src.backend.service.occupancy_log import occupancy_intervals
+from src.backend.service.temperature_service import temperature_series, temperature_summary
+from src.backend.models import Room, Seat, RoomEnergyState, EnergyCommand, Booking, User
 from sqlalchemy.exc import SQLAlchemyError
-from flask import request
+from flask import current_app, request
 
 admin_bp = Blueprint("admin", __name__, description="Admin statistics")
 
+# Le statistiche leggono tramite read_session (engine in sola lettura),
+# cosi' le scansioni lunghe non competono con l'ingest dei sensori.
+
 
 def _require_admin(username):
-    user = User.query.filter_by(username=username).first()
+    user = read_session.query(User).filter_by(username=username).first()
     return user and user.role == 'admin'
 
 
@@ -42,33 +50,25 @@ def admin_stats_overview():
         else:
             start_ts = end_ts - timedelta(hours=24)
 
-        rooms = Room.query.all()
+        rooms = read_session.query(Room).all()
 
         total_seats = 0
         total_occupied = 0
         temp_acc = 0.0
         temp_count = 0
 
+        # average temperature per room in the time window, from the rollups
+        temps_by_room = temperature_summary(start_ts, end_ts, by_room=True)
+
         rooms_out = []
         for room in rooms:
             seats = room.seats or []
             total = len(seats)
             occupied = sum(1 for s in seats if s.is_occupied)
 
-            # average temperature for this room in the time window
-            temps = (
-                TemperatureReading.query
-                .filter(TemperatureReading.room_id == room.id)
-                .filter(TemperatureReading.timestamp >= start_ts)
-                .filter(TemperatureReading.timestamp <= end_ts)
-                .all()
-            )
-            if temps:
-                avg_temp = sum(t.temperature for t in temps) / len(temps)
-            else:
-                avg_temp = None
-
-            energy = RoomEnergyState.query.filter_by(room_id=room.id).first()
+            avg_temp = temps_by_room.get(room.id, {}).get("avg")
+
+            energy = read_session.query(RoomEnergyState).filter_by(room_id=room.id).first()
             lights_on = bool(energy and energy.lights_on)
 
             rooms_out.append({
@@ -104,7 +104,7 @@ def admin_stats_overview():
         return payload, 200
 
     except SQLAlchemyError as e:
-        db.session.rollback()
+        read_session.rollback()
         return {"error": "Database error", "details": str(e)}, 500
     except Exception as e:
         return {"error": "Internal error", "details": str(e)}, 500
@@ -152,7 +152,7 @@ def admin_stats_occupancy():
         series = []
         for s, e in buckets:
             # count seats with confirmed booking overlapping this bucket
-            q = Booking.query.filter(Booking.status == 'confirmed')
+            q = read_session.query(Booking).filter(Booking.status == 'confirmed')
             if room_id:
                 q = q.join(Seat).filter(Seat.room_id == room_id)
             q = q.filter(Booking.start_time < e).filter(Booking.end_time > s)
@@ -164,6 +164,80 @@ def admin_stats_occupancy():
         return {"error": "Internal error", "details": str(e)}, 500
 
 
+@admin_bp.route('/admin/stats/seat-usage', methods=['GET'])
+@jwt_required()
+def admin_stats_seat_usage():
+    """Return measured occupancy intervals (from the seat sensors) clipped to the period, with occupied seconds per seat."""
+    try:
+        username = get_jwt_identity()
+        if not _require_admin(username):
+            return {"error": "Forbidden"}, 403
+
+        room_id = request.args.get('room_id', type=int)
+        seat_id = request.args.get('seat_id', type=int)
+        start = request.args.get('start')
+        end = request.args.get('end')
+
+        now = datetime.now()
+        if end:
+            try:
+                end_ts = datetime.fromisoformat(end)
+            except Exception:
+                end_ts = now
+        else:
+            end_ts = now
+
+        if start:
+            try:
+                start_ts = datetime.fromisoformat(start)
+            except Exception:
+                start_ts = end_ts - timedelta(days=1)
+        else:
+            start_ts = end_ts - timedelta(days=1)
+
+        intervals = []
+        occupied_seconds = {}
+        for sid, s, e in occupancy_intervals(read_session, start_ts, end_ts, seat_id=seat_id, room_id=room_id):
+            # intervalli aperti: il posto e' occupato fino a ora
+            s, e = max(s, start_ts), min(e or now, end_ts)
+            if e <= s:
+                continue
+            intervals.append({"seat_id": sid, "start": s.isoformat(), "end": e.isoformat()})
+            occupied_seconds[sid] = occupied_seconds.get(sid, 0) + (e - s).total_seconds()
+
+        seats = [{"seat_id": sid, "occupied_seconds": int(secs)} for sid, secs in sorted(occupied_seconds.items())]
+        return {"start": start_ts.isoformat(), "end": end_ts.isoformat(), "seats": seats, "intervals": intervals}, 200
+    except Exception as e:
+        read_session.rollback()
+        return {"error": "Internal error", "details": str(e)}, 500
+
+
+@admin_bp.route('/admin/devices/stale', methods=['GET'])
+@jwt_required()
+def admin_devices_stale():
+    """Return devices never seen or without heartbeat for ?minutes= (default DEVICE_STALE_MINUTES), from the in-memory registry."""
+    try:
+        username = get_jwt_identity()
+        if not _require_admin(username):
+            return {"error": "Forbidden"}, 403
+
+        minutes = request.args.get('minutes', current_app.config['DEVICE_STALE_MINUTES'], type=int)
+        now = datetime.now()
+        devices = [
+            {
+                "device_id": info.id,
+                "device_type": info.device_type,
+                "room_id": info.room_id,
+                "seat_id": info.seat_id,
+                "last_seen": info.last_seen.isoformat() if info.last_seen else None,
+            }
+            for info in stale_devices(now - timedelta(minutes=minutes))
+        ]
+        return {"minutes": minutes, "count": len(devices), "devices": devices}, 200
+    except Exception as e:
+        return {"error": "Internal error", "details": str(e)}, 500
+
+
 @admin_bp.route('/admin/stats/bookings', methods=['GET'])
 @jwt_required()
 def admin_stats_bookings():
@@ -194,16 +268,18 @@ def admin_stats_bookings():
         else:
             start_ts = end_ts - timedelta(days=30)
 
-        q = Booking.query.filter(Booking.start_time >= start_ts).filter(Booking.start_time <= end_ts)
+        # include archived bookings: the window can reach past the hot table
+        history = booking_history(since=start_ts, until=end_ts)
+        q = read_session.query(history)
         if room_id:
-            q = q.join(Seat).filter(Seat.room_id == room_id)
+            q = q.join(Seat, Seat.id == history.c.seat_id).filter(Seat.room_id == room_id)
 
         total_bookings = q.count()
 
         # top seats by bookings
         top = (
-            q.with_entities(Booking.seat_id, db.func.count(Booking.id).label('cnt'))
-            .group_by(Booking.seat_id)
+            q.with_entities(history.c.seat_id, db.func.count(history.c.id).label('cnt'))
+            .group_by(history.c.seat_id)
             .order_by(db.desc('cnt'))
             .limit(10)
             .all()
@@ -247,20 +323,10 @@ def admin_stats_temperatures():
         else:
             start_ts = end_ts - timedelta(days=7)
 
-        delta = timedelta(hours=1) if resolution == 'hour' else timedelta(days=1)
-        buckets = []
-        cur = start_ts
-        while cur < end_ts:
-            buckets.append((cur, min(cur + delta, end_ts)))
-            cur += delta
-
+        # buckets aligned to the hour/day rollups, one grouped query
         series = []
-        for s, e in buckets:
-            q = TemperatureReading.query.filter(TemperatureReading.timestamp >= s).filter(TemperatureReading.timestamp < e)
-            if room_id:
-                q = q.filter(TemperatureReading.room_id == room_id)
-            temps = q.with_entities(db.func.avg(TemperatureReading.temperature)).scalar()
-            series.append({"start": s.isoformat(), "end": e.isoformat(), "avg_temp": float(temps) if temps is not None else None})
+        for s, e, avg in temperature_series(start_ts, end_ts, resolution, room_id=room_id or None):
+            series.append({"start": s.isoformat(), "end": e.isoformat(), "avg_temp": float(avg) if avg is not None else None})
 
         return {"series": series}, 200
     except Exception as e:
@@ -297,7 +363,7 @@ def admin_stats_energy():
         else:
             start_ts = end_ts - timedelta(days=30)
 
-        q = EnergyCommand.query.filter(EnergyCommand.timestamp >= start_ts).filter(EnergyCommand.timestamp <= end_ts)
+        q = read_session.query(EnergyCommand).filter(EnergyCommand.timestamp >= start_ts).filter(EnergyCommand.timestamp <= end_ts)
         if room_id:
             q = q.filter(EnergyCommand.room_id == room_id)
 
@@ -305,7 +371,7 @@ def admin_stats_energy():
         lights_commands = q.filter(EnergyCommand.command_type.in_(['lights_on','lights_off'])).count()
 
         # current states
-        states_q = RoomEnergyState.query
+        states_q = read_session.query(RoomEnergyState)
         if room_id:
             states_q = states_q.filter_by(room_id=room_id)
         states = [{"room_id": s.room_id, "lights_on": bool(s.lights_on), "ac_on": bool(s.ac_on), "target_temperature": s.target_temperature} for s in states_q.all()]
@@ -1,17 +1,24 @@
 import datetime
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from flask.views import MethodView
 from flask_smorest import Blueprint
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from src.backend.common.logger import logger
 from src.backend.common.extensions import db
+from src.backend.auth.admin_required import admin_required
 from src.backend.common.labels import BOOKING_FORCE_MOVE_BODY
 from src.backend.models.booking import Booking, BookingStatus
-from src.backend.models.user import User
 from src.backend.models.seat import Seat
 from src.backend.notification.mail import send_email
+from src.backend.service.booking_slots import slot_alignment_error, slots_enabled
+from src.backend.service.bulk_booking_service import book_occurrences, expand_recurrence, parse_intervals
+from src.backend.service.evacuation_service import EvacuationConflict, apply_evacuation, plan_evacuation
+from src.backend.service.group_booking_service import GroupBookingConflict, book_group, find_group
+from src.backend.service.hot_queries import user_by_username, overlapping_booking, user_pending_booking
+from src.backend.service.projections import booking_rows, decode_cursor, encode_cursor
+from src.backend.service.seat_availability import seat_availability
 
 booking_bp = Blueprint("bookings", __name__, description="Booking management")
 
@@ -20,34 +27,77 @@ class BookingList(MethodView):
 
     @jwt_required()
     def get(self):
-        """Return bookings. By default returns active/future bookings for all seats.
+        """Return bookings ordered by (start_time, id). By default returns active/future bookings for all seats.
 
         Optional query params:
           - seat_id: filter by seat id
+          - room_id: filter by room id
+          - mine: 'true' -> only the current user's bookings
+          - status: one or more statuses, comma separated (e.g. 'pending_checkin,confirmed')
+          - from / to: ISO datetimes, filter start_time in [from, to)
           - future_only: 'true' or 'false' (default 'true') -> filters bookings with end_time >= now
+          - limit: page size (max BOOKINGS_PAGE_MAX); without limit/cursor every match is returned
+          - cursor: value of the X-Next-Cursor header of the previous page
 
         Each booking includes 'username' and 'is_mine' boolean to let the client highlight user's bookings.
+        When more rows follow, the response carries the X-Next-Cursor header.
         """
         try:
             username = get_jwt_identity()
-            user = User.query.filter_by(username=username).first()
+            user = user_by_username(username)
 
             if not user:
                 return {"error": "User not found"}, 404
 
             seat_id = request.args.get('seat_id', type=int)
+            room_id = request.args.get('room_id', type=int)
+            mine = request.args.get('mine', 'false').lower() in ('1', 'true', 'yes')
             future_only = request.args.get('future_only', 'true').lower() in ('1', 'true', 'yes')
 
-            now = datetime.datetime.now()
-            q = Booking.query
-
-            if seat_id:
-                q = q.filter(Booking.seat_id == seat_id)
+            statuses = [s for s in request.args.get('status', '').split(',') if s]
+            valid = {BookingStatus.PENDING_CHECKIN, BookingStatus.CONFIRMED, BookingStatus.COMPLETED}
+            if any(s not in valid for s in statuses):
+                return {"error": f"Invalid status, expected any of {sorted(valid)}"}, 400
+
+            try:
+                start_from = request.args.get('from')
+                start_from = datetime.datetime.fromisoformat(start_from) if start_from else None
+                start_to = request.args.get('to')
+                start_to = datetime.datetime.fromisoformat(start_to) if start_to else None
+            except ValueError:
+                return {"error": "Invalid datetime format"}, 400
+
+            cursor = request.args.get('cursor')
+            limit = request.args.get('limit', type=int)
+            page_max = current_app.config['BOOKINGS_PAGE_MAX']
+            if limit is not None and not 1 <= limit <= page_max:
+                return {"error": f"limit must be between 1 and {page_max}"}, 400
+            if cursor and limit is None:
+                limit = page_max
+            try:
+                after = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return {"error": "Invalid cursor"}, 400
 
-            if future_only:
-                q = q.filter(Booking.end_time >= now)
+            now = datetime.datetime.now()
+            # one joined query on the needed columns (no per-row user lazy load);
+            # one extra row tells whether another page follows
+            bookings = booking_rows(
+                seat_id=seat_id,
+                room_id=room_id,
+                user_id=user.id if mine else None,
+                statuses=statuses,
+                start_from=start_from,
+                start_to=start_to,
+                ends_after=now if future_only else None,
+                after=after,
+                limit=limit + 1 if limit else None,
+            )
 
-            bookings = q.all()
+            headers = {}
+            if limit and len(bookings) > limit:
+                bookings = bookings[:limit]
+                headers["X-Next-Cursor"] = encode_cursor(bookings[-1])
 
             result = []
             for b in bookings:
@@ -57,11 +107,11 @@ class BookingList(MethodView):
                     "start_time": b.start_time.isoformat(),
                     "end_time": b.end_time.isoformat(),
                     "status": b.status,
-                    "username": b.user.username if getattr(b, 'user', None) else None,
+                    "username": b.username,
                     "is_mine": b.user_id == user.id
                 })
 
-            return result, 200
+            return result, 200, headers
 
         except SQLAlchemyError as e:
             return {"error": "Database error", "details": str(e)}, 500
@@ -71,7 +121,7 @@ class BookingList(MethodView):
         try:
             data = request.get_json()
             username = get_jwt_identity()
-            user = User.query.filter_by(username=username).first()
+            user = user_by_username(username)
 
             if not user:
                 return {"error": "User not found"}, 404
@@ -88,24 +138,29 @@ class BookingList(MethodView):
 
             if start_time >= end_time:
                 return {"error": "Invalid time range"}, 400
+            alignment_error = slot_alignment_error(start_time, end_time)
+            if alignment_error:
+                return {"error": alignment_error}, 400
 
             seat = Seat.query.get(seat_id)
             if not seat or not seat.is_active:
                 return {"error": "Seat not available"}, 404
 
-            #  overlap check
-            overlapping = Booking.query.filter(
-                Booking.seat_id == seat_id,
-                Booking.status.in_([
-                    BookingStatus.PENDING_CHECKIN,
-                    BookingStatus.CONFIRMED
-                ]),
-                Booking.start_time < end_time,
-                Booking.end_time > start_time
-            ).first()
-
-            if overlapping:
-                return {"error": "Seat already booked in this time range"}, 409
+            #  overlap check: un conflitto segnalato dall'indice in memoria va
+            #  confermato sul db, che resta la fonte di verita'
+            index = seat_availability()
+            clash = index.overlapping(seat.id, start_time, end_time) if index is not None else None
+            # con BOOKING_WRITE_PATH=slots il conflitto lo rileva il vincolo su booking_slots al commit
+            if clash is not None or not slots_enabled():
+                overlapping = overlapping_booking(seat_id, start_time, end_time)
+
+                if overlapping:
+                    return {"error": "Seat already booked in this time range"}, 409
+                if clash is not None:
+                    # indice rimasto indietro (modifica fatta da un altro processo o sul db):
+                    # le voci del posto nella finestra non esistono piu'
+                    for entry in index.between(seat.id, start_time, end_time):
+                        index.remove(entry.booking_id)
 
             booking = Booking(
                 user_id=user.id,
@@ -125,9 +180,145 @@ class BookingList(MethodView):
 
         except ValueError:
             return {"error": "Invalid datetime format"}, 400
+        except IntegrityError:
+            db.session.rollback()
+            return {"error": "Seat already booked in this time range"}, 409
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"error": "Database error", "details": str(e)}, 500
+@booking_bp.route("/bookings/bulk")
+class BookingBulk(MethodView):
+
+    @jwt_required()
+    def post(self):
+        """Create several bookings on one seat in a single transaction.
+
+        Body: seat_id plus either
+          - intervals: [{"start_time", "end_time"}, ...]
+          - recurrence: {"start_time", "end_time", "frequency": "daily"|"weekly",
+                         "interval", "weekdays": [0-6], "count" | "until"}
+        Optional all_or_nothing (default false): create nothing if any occurrence conflicts.
+
+        Returns one result per occurrence: created (with booking_id), conflict or skipped.
+        """
+        try:
+            data = request.get_json()
+            username = get_jwt_identity()
+            user = user_by_username(username)
+
+            if not user:
+                return {"error": "User not found"}, 404
+
+            seat_id = data.get("seat_id")
+            if not seat_id or not (data.get("intervals") or data.get("recurrence")):
+                return {"error": "Missing required fields"}, 400
+
+            seat = Seat.query.get(seat_id)
+            if not seat or not seat.is_active:
+                return {"error": "Seat not available"}, 404
+
+            limit = current_app.config['BOOKINGS_BULK_MAX']
+            try:
+                if data.get("intervals"):
+                    occurrences = parse_intervals(data["intervals"], limit)
+                else:
+                    occurrences = expand_recurrence(data["recurrence"], limit)
+            except (KeyError, TypeError) as e:
+                return {"error": f"Invalid interval: {e}"}, 400
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            if not occurrences:
+                return {"error": "No occurrences to book"}, 400
+            alignment_error = next(filter(None, (slot_alignment_error(start, end) for start, end in occurrences)), None)
+            if alignment_error:
+                return {"error": alignment_error}, 400
+
+            results = book_occurrences(user.id, seat.id, occurrences, bool(data.get("all_or_nothing")))
+            db.session.commit()
+
+            created = sum(1 for r in results if r["status"] == "created")
+            return {
+                "created": created,
+                "conflicts": sum(1 for r in results if r["status"] == "conflict"),
+                "results": results,
+            }, 201 if created else 409
+
+        except IntegrityError:
+            # BOOKING_WRITE_PATH=slots: una prenotazione concorrente ha occupato una fascia
+            db.session.rollback()
+            return {"error": "Seat booked concurrently, retry"}, 409
         except SQLAlchemyError as e:
             db.session.rollback()
             return {"error": "Database error", "details": str(e)}, 500
+@booking_bp.route("/bookings/group")
+class BookingGroup(MethodView):
+
+    @jwt_required()
+    def post(self):
+        """Book N mutually adjacent free seats in one room, atomically.
+
+        Body: start_time, end_time and either size (all bookings to the caller) or
+        members (list of usernames, one seat each). Optional room_id / floor.
+        Seats need coordinates (pos_x, pos_y): two seats are adjacent within the
+        room adjacency_radius (default SEAT_ADJACENCY_RADIUS).
+        """
+        try:
+            data = request.get_json() or {}
+            user = user_by_username(get_jwt_identity())
+            if not user:
+                return {"error": "User not found"}, 404
+
+            members = data.get("members")
+            size = len(members) if members else data.get("size")
+            if not all([size, data.get("start_time"), data.get("end_time")]):
+                return {"error": "Missing required fields"}, 400
+            size = int(size)
+            max_size = current_app.config['GROUP_BOOKING_MAX_SIZE']
+            if not 1 <= size <= max_size:
+                return {"error": f"size must be between 1 and {max_size}"}, 400
+
+            start_time = datetime.datetime.fromisoformat(data["start_time"])
+            end_time = datetime.datetime.fromisoformat(data["end_time"])
+            if start_time >= end_time:
+                return {"error": "Invalid time range"}, 400
+            alignment_error = slot_alignment_error(start_time, end_time)
+            if alignment_error:
+                return {"error": alignment_error}, 400
+
+            if members:
+                users = {name: user_by_username(name) for name in members}
+                unknown = [name for name, u in users.items() if u is None]
+                if unknown:
+                    return {"error": "Unknown members", "members": unknown}, 404
+                user_ids = [users[name].id for name in members]
+            else:
+                user_ids = [user.id] * size
+
+            found = find_group(size, start_time, end_time,
+                               room_id=data.get("room_id"), floor=data.get("floor"))
+            if not found:
+                return {"error": f"No {size} adjacent free seats in this time range"}, 404
+            room_id, seat_ids = found
+
+            bookings = book_group(user_ids, seat_ids, start_time, end_time)
+            db.session.commit()
+
+            return {
+                "message": "Group booking created, waiting for check-in",
+                "room_id": room_id,
+                "bookings": [{"booking_id": b.id, "seat_id": b.seat_id, "user_id": b.user_id} for b in bookings],
+            }, 201
+
+        except ValueError:
+            return {"error": "Invalid datetime format"}, 400
+        except (GroupBookingConflict, IntegrityError):
+            db.session.rollback()
+            return {"error": "Seats booked concurrently, retry"}, 409
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"error": "Database error", "details": str(e)}, 500
+
+
 @booking_bp.route("/bookings/check-in")
 class BookingCheckIn(MethodView):
 
@@ -151,20 +342,14 @@ class BookingCheckIn(MethodView):
                 return {"error": "Missing seat_id or seat_identifier"}, 400
 
             username = get_jwt_identity()
-            user = User.query.filter_by(username=username).first()
+            user = user_by_username(username)
 
             if not user:
                 return {"error": "User not found"}, 404
 
             now = datetime.datetime.now()
 
-            booking = Booking.query.filter(
-                Booking.user_id == user.id,
-                Booking.seat_id == seat_id,
-                Booking.status == BookingStatus.PENDING_CHECKIN,
-                Booking.start_time <= now,
-                Booking.end_time >= now
-            ).first()
+            booking = user_pending_booking(user.id, seat_id, now)
 
             if not booking:
                 return {"error": "No valid booking found"}, 404
@@ -221,8 +406,73 @@ class BookingForceMove(MethodView):
                 "new_seat_id": new_seat_id
             }, 200
 
+        except IntegrityError:
+            # BOOKING_WRITE_PATH=slots: il posto di destinazione e' gia' prenotato
+            db.session.rollback()
+            return {"error": "Target seat already booked in this time range"}, 409
         except SQLAlchemyError as e:
             db.session.rollback()
             return {"error": "Database error", "details": str(e)}, 500
 
 
+
+@booking_bp.route("/bookings/evacuate")
+class BookingEvacuate(MethodView):
+
+    @admin_required
+    def post(self):
+        """
+        Sposta tutte le prenotazioni attive di una sala (room_id) o di alcuni posti
+        (seat_ids) che si sovrappongono a [start_time, end_time) su posti liberi di
+        altre sale, preferendo lo stesso piano e uno score simile.
+        Body: room_id | seat_ids, start_time (default adesso), end_time, reason, dry_run.
+        Le email vengono accodate e inviate dal job della outbox.
+        """
+        try:
+            data = request.get_json() or {}
+            room_id = data.get("room_id")
+            seat_ids = data.get("seat_ids")
+            reason = data.get("reason")
+
+            if not (room_id or seat_ids) or not data.get("end_time") or not reason:
+                return {"error": "Missing required fields"}, 400
+
+            try:
+                start = datetime.datetime.fromisoformat(data["start_time"]) if data.get("start_time") \
+                    else datetime.datetime.now()
+                end = datetime.datetime.fromisoformat(data["end_time"])
+            except ValueError:
+                return {"error": "Invalid datetime format"}, 400
+            if start >= end:
+                return {"error": "Invalid time range"}, 400
+
+            if room_id:
+                seat_ids = [s.id for s in Seat.query.filter_by(room_id=room_id).all()]
+            if not seat_ids:
+                return {"error": "No seats to evacuate"}, 404
+
+            assignments, unassigned = plan_evacuation(seat_ids, start, end)
+            if not data.get("dry_run"):
+                apply_evacuation(assignments, reason)
+                db.session.commit()
+
+            return {
+                "dry_run": bool(data.get("dry_run")),
+                "moved": len(assignments),
+                "unassigned_booking_ids": unassigned,
+                "assignments": [{
+                    "booking_id": a.booking_id,
+                    "old_seat_id": a.old_seat_id,
+                    "new_seat_id": a.new_seat_id,
+                    "start_time": a.start_time.isoformat(),
+                    "end_time": a.end_time.isoformat(),
+                } for a in assignments],
+            }, 200
+
+        except (EvacuationConflict, IntegrityError) as e:
+            # un posto di destinazione e' stato prenotato nel frattempo: il piano va ricalcolato
+            db.session.rollback()
+            return {"error": "Target seats changed during evacuation, retry", "details": str(e)}, 409
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"error": "Database error", "details": str(e)}, 500
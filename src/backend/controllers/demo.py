@@ -3,9 +3,18 @@ from flask import Blueprint, request
 from datetime import datetime, timedelta
 from flask.views import MethodView
 from src.backend.common.extensions import db
-from src.backend.models import Room, Seat, TemperatureReading, Booking, SeatSuggestion, User, RoomEnergyState
+from src.backend.models import (
+    Room, Seat, TemperatureReading, Booking, SeatSuggestion, User, RoomEnergyState,
+    BookingArchive, BookingSlot, TemperatureReadingArchive, TemperatureRollup, WaitlistEntry,
+    SeatOccupancyReading, SeatOccupancyInterval
+)
 from src.backend.models.booking import BookingStatus
 from src.backend.service.generate_suggestion_service import _generate_suggestions_service
+from src.backend.service.occupancy_filter import reset_occupancy_filter
+from src.backend.service.seat_availability import rebuild_seat_availability
+from src.backend.service.spatial_index import reset_seat_grids
+from src.backend.service.temperature_service import record_temperature, temperature_store
+from src.backend.service.waitlist_service import rebuild_waitlist
 from src.backend.common.logger import logger
 from src.backend.controllers.seat_suggestion import SeatSuggestionGenerate
 from werkzeug.security import generate_password_hash
@@ -19,13 +28,27 @@ class DemoClearAll(MethodView):
         """
         try:
             db.session.query(SeatSuggestion).delete()
+            db.session.query(WaitlistEntry).delete()
+            db.session.query(BookingSlot).delete()
             db.session.query(Booking).delete()
+            db.session.query(BookingArchive).delete()
             db.session.query(TemperatureReading).delete()
+            db.session.query(TemperatureReadingArchive).delete()
+            db.session.query(TemperatureRollup).delete()
+            db.session.query(SeatOccupancyReading).delete()
+            db.session.query(SeatOccupancyInterval).delete()
             db.session.query(RoomEnergyState).delete()
             db.session.query(Seat).delete()
             db.session.query(Room).delete()
             db.session.query(User).delete()
             db.session.commit()
+            if temperature_store() is not None:
+                temperature_store().clear()
+            # i delete bulk non passano dagli eventi di sessione
+            rebuild_seat_availability(db.session)
+            rebuild_waitlist(db.session)
+            reset_seat_grids()
+            reset_occupancy_filter()
 
             return {"message": "Database cleaned"}, 200
         except Exception as e:
@@ -42,7 +65,7 @@ class DemoPopulateRoomsSeats(MethodView):
         - cold_room (north)
         - medium_room (east)
         - hot_room (south)
-        con 10 posti ciascuna
+        con 10 posti ciascuna, su due file da 5 a un metro di distanza
         """
         try:
             rooms_data = [
@@ -60,6 +83,8 @@ class DemoPopulateRoomsSeats(MethodView):
                     seat = Seat(
                         room_id=room.id,
                         is_active=True, 
+                        pos_x=float(i % 5),
+                        pos_y=float(i // 5),
                         upd_user="demo",
                         upd_datetime=datetime.now()
                     )
@@ -128,12 +153,7 @@ class DemoPopulateTemperatures(MethodView):
                     base = 25
 
                 for d in range(30):
-                    t = TemperatureReading(
-                        room_id=room.id,
-                        temperature=base + random.uniform(-1, 1),
-                        timestamp=now - timedelta(days=d)
-                    )
-                    db.session.add(t)
+                    record_temperature(room.id, base + random.uniform(-1, 1), now - timedelta(days=d))
 
             db.session.commit()
             return {"message": "Temperature history populated"}, 201
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
+from flask_jwt_extended import get_jwt, jwt_required
 from werkzeug.security import check_password_hash
+from src.backend.common.extensions import db
 from src.backend.models.user import User
+from src.backend.auth.token_blocklist import revoke_token
 from src.backend.auth.token_generator import generate_token
 
 login_bp = Blueprint('login', __name__)
@@ -26,8 +29,20 @@ def login():
         return jsonify({"message": "Errore durante il login", "error": str(e)}), 500
 
 @login_bp.route('/logout', methods=['POST'])
+@jwt_required()
 def logout():
     """
-    Effettua il logout (opzionale, lato client si può semplicemente eliminare il token).
+    Effettua il logout revocando il token usato per la richiesta:
+    da quel momento ogni richiesta con lo stesso token riceve 401.
     """
-    return jsonify({"message": "Logout effettuato con successo"}), 200
\ No newline at end of file
+    try:
+        payload = get_jwt()
+        user = User.query.filter_by(username=payload["sub"]).first()
+        if not user:
+            return jsonify({"message": "Utente non trovato"}), 404
+        revoke_token(db.session, payload, user.id)
+        db.session.commit()
+        return jsonify({"message": "Logout effettuato con successo"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Errore durante il logout", "error": str(e)}), 500
@@ -1,7 +1,14 @@
+import datetime
+from flask import request
 from flask.views import MethodView
 from flask_smorest import Blueprint
-from flask_jwt_extended import jwt_required
-from src.backend.models.room import Room
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.backend.auth.admin_required import admin_required
+from src.backend.common.extensions import db
+from src.backend.models import Room, Seat
+from src.backend.service.projections import room_rows
 
 room_bp = Blueprint("rooms", __name__)
 
@@ -10,7 +17,7 @@ class RoomList(MethodView):
 
     @jwt_required()
     def get(self):
-        rooms = Room.query.all()
+        rooms = room_rows()
         return [
             {
                 "id": r.id,
@@ -19,3 +26,60 @@ class RoomList(MethodView):
                 "sun_exposure": r.sun_exposure
             } for r in rooms
         ], 200
+
+
+@room_bp.route("/rooms/<int:room_id>/layout")
+class RoomLayout(MethodView):
+
+    @jwt_required()
+    def get(self, room_id):
+        """Pianta della sala: raggio di adiacenza e coordinate dei posti."""
+        room = db.session.get(Room, room_id)
+        if not room:
+            return {"error": "Room not found"}, 404
+        seats = Seat.query.filter_by(room_id=room_id).order_by(Seat.id).all()
+        return {
+            "room_id": room.id,
+            "adjacency_radius": room.adjacency_radius,
+            "seats": [{"seat_id": s.id, "pos_x": s.pos_x, "pos_y": s.pos_y, "active": s.is_active} for s in seats],
+        }, 200
+
+    @admin_required
+    def put(self, room_id):
+        """
+        Aggiorna la pianta: {"adjacency_radius": 1.2, "seats": [{"seat_id", "pos_x", "pos_y"}]}.
+        pos_x/pos_y null tolgono il posto dalle prenotazioni di gruppo.
+        """
+        try:
+            data = request.get_json() or {}
+            room = db.session.get(Room, room_id)
+            if not room:
+                return {"error": "Room not found"}, 404
+
+            if "adjacency_radius" in data:
+                radius = data["adjacency_radius"]
+                if radius is not None and float(radius) <= 0:
+                    return {"error": "adjacency_radius must be positive"}, 400
+                room.adjacency_radius = float(radius) if radius is not None else None
+
+            positions = {int(item["seat_id"]): item for item in data.get("seats", [])}
+            seats = Seat.query.filter(Seat.room_id == room_id, Seat.id.in_(positions)).all()
+            missing = sorted(set(positions) - {s.id for s in seats})
+            if missing:
+                return {"error": "Seats not in this room", "seat_ids": missing}, 404
+
+            now = datetime.datetime.now()
+            for seat in seats:
+                item = positions[seat.id]
+                seat.pos_x = float(item["pos_x"]) if item.get("pos_x") is not None else None
+                seat.pos_y = float(item["pos_y"]) if item.get("pos_y") is not None else None
+                seat.upd_user = get_jwt_identity()
+                seat.upd_datetime = now
+            db.session.commit()
+            return {"message": "Layout updated", "seats": len(seats)}, 200
+
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"Invalid layout: {e}"}, 400
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"error": "Database error", "details": str(e)}, 500
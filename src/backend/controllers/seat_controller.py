@@ -1,11 +1,14 @@
 import datetime
-from flask import Blueprint, jsonify
-from sqlalchemy import and_
+from flask import Blueprint, current_app, jsonify, request
 from sqlalchemy.exc import SQLAlchemyError
 
-from src.backend.common.extensions import db
 from src.backend.models.seat import Seat
-from src.backend.models.booking import Booking, BookingStatus
+from src.backend.service.day_availability_service import ENCODINGS, day_availability
+from src.backend.service.projections import seat_rows
+from src.backend.service.seat_search_service import search_free_seats
+from src.backend.service.spatial_index import nearest_free_seats
+
+SEARCH_MAX_RESULTS = 100
 
 seats_bp = Blueprint("seats", __name__)
 @seats_bp.route("/seats", methods=["GET"], strict_slashes=False)
@@ -18,34 +21,128 @@ def get_all_seats():
     try:
         now = datetime.datetime.now()
 
-        results = db.session.query(
-            Seat,
-            Booking.status
-        ).outerjoin(
-            Booking,
-            and_(
-                Seat.id == Booking.seat_id,
-                Booking.status.in_([
-                    BookingStatus.PENDING_CHECKIN,
-                    BookingStatus.CONFIRMED
-                ]),
-                Booking.start_time <= now,
-                Booking.end_time >= now
-            )
-        ).all()
-
         response = []
-        for seat, booking_status in results:
+        for seat in seat_rows(now):
             response.append({
-                "seat_id": seat.id,
+                "seat_id": seat.seat_id,
                 "room_id": seat.room_id,
-                "active": seat.is_active,
-                "booking_status": booking_status if booking_status else None,
+                "active": seat.active,
+                "booking_status": seat.booking_status if seat.booking_status else None,
                 "is_occupied": seat.is_occupied
             })
 
         return jsonify(response), 200
 
+    except SQLAlchemyError as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+@seats_bp.route("/seats/search", methods=["GET"])
+def search_seats():
+    """
+    Posti attivi liberi nella finestra [start, end), ordinati per l'ultimo score di suggerimento.
+    Parametri: start (default adesso), end (default start + 1h), k (default 10, max 100),
+    room_id, floor, sun_exposure.
+    """
+    try:
+        try:
+            start = request.args.get("start")
+            start = datetime.datetime.fromisoformat(start) if start else datetime.datetime.now()
+            end = request.args.get("end")
+            end = datetime.datetime.fromisoformat(end) if end else start + datetime.timedelta(hours=1)
+        except ValueError:
+            return jsonify({"error": "Invalid datetime format"}), 400
+        if start >= end:
+            return jsonify({"error": "Invalid time range"}), 400
+
+        k = request.args.get("k", 10, type=int)
+        if not 1 <= k <= SEARCH_MAX_RESULTS:
+            return jsonify({"error": f"k must be between 1 and {SEARCH_MAX_RESULTS}"}), 400
+
+        seats = search_free_seats(
+            start, end, k,
+            room_id=request.args.get("room_id", type=int),
+            floor=request.args.get("floor", type=int),
+            sun_exposure=request.args.get("sun_exposure"),
+        )
+        return jsonify([{
+            "seat_id": seat.seat_id,
+            "room_id": seat.room_id,
+            "room_name": seat.room_name,
+            "floor": seat.floor,
+            "sun_exposure": seat.sun_exposure,
+            "score": round(seat.score, 3) if seat.score is not None else None,
+        } for seat in seats]), 200
+
+    except SQLAlchemyError as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+@seats_bp.route("/seats/availability", methods=["GET"])
+def seats_day_availability():
+    """
+    Griglia di occupazione del giorno per ogni posto attivo, a fasce di slot_minutes.
+    Parametri: date (default oggi), room_id, slot_minutes (default BOOKING_SLOT_MINUTES),
+    encoding=bitset (base64, bit i = fascia i, little-endian) | rle (sequenze libero/occupato
+    a partire da libero), heatmap=true per il numero di posti occupati per fascia.
+    """
+    try:
+        try:
+            day = request.args.get("date")
+            day = datetime.date.fromisoformat(day) if day else datetime.date.today()
+        except ValueError:
+            return jsonify({"error": "Invalid date format"}), 400
+
+        slot_minutes = request.args.get("slot_minutes", current_app.config["BOOKING_SLOT_MINUTES"], type=int)
+        if slot_minutes <= 0 or (24 * 60) % slot_minutes:
+            return jsonify({"error": "slot_minutes must divide 1440"}), 400
+
+        encoding = request.args.get("encoding", "bitset")
+        if encoding not in ENCODINGS:
+            return jsonify({"error": f"Invalid encoding, expected one of {list(ENCODINGS)}"}), 400
+
+        return jsonify(day_availability(
+            day, slot_minutes,
+            room_id=request.args.get("room_id", type=int),
+            encoding=encoding,
+            heatmap=request.args.get("heatmap", "false").lower() in ("1", "true", "yes"),
+        )), 200
+
+    except SQLAlchemyError as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+@seats_bp.route("/seats/nearest", methods=["GET"])
+def nearest_seats():
+    """
+    I k posti liberi piu' vicini a un punto della sala (es. QR all'ingresso).
+    Parametri: room_id, x, y (metri nella pianta) oppure seat_id come punto di partenza,
+    k (default 5, max 100), minutes: il posto deve restare senza prenotazioni per
+    questi minuti da adesso (default 60).
+    """
+    try:
+        k = request.args.get("k", 5, type=int)
+        if not 1 <= k <= SEARCH_MAX_RESULTS:
+            return jsonify({"error": f"k must be between 1 and {SEARCH_MAX_RESULTS}"}), 400
+        minutes = request.args.get("minutes", 60, type=int)
+        if minutes <= 0:
+            return jsonify({"error": "minutes must be positive"}), 400
+
+        origin_id = request.args.get("seat_id", type=int)
+        if origin_id is not None:
+            origin = Seat.query.get(origin_id)
+            if not origin or origin.pos_x is None or origin.pos_y is None:
+                return jsonify({"error": "Seat not found or without position"}), 404
+            room_id, x, y = origin.room_id, origin.pos_x, origin.pos_y
+        else:
+            room_id = request.args.get("room_id", type=int)
+            x = request.args.get("x", type=float)
+            y = request.args.get("y", type=float)
+            if room_id is None or x is None or y is None:
+                return jsonify({"error": "Missing room_id, x, y or seat_id"}), 400
+
+        start = datetime.datetime.now()
+        found = nearest_free_seats(room_id, x, y, k, start, start + datetime.timedelta(minutes=minutes))
+        return jsonify([{
+            "seat_id": seat_id,
+            "room_id": room_id,
+            "distance": round(distance, 2),
+        } for distance, seat_id in found]), 200
+
     except SQLAlchemyError as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
 @seats_bp.route("/seats/<int:seat_id>", methods=["GET"])
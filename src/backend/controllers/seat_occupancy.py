@@ -1,21 +1,31 @@
 from datetime import datetime
-from flask import request
+from flask import current_app, request
 from flask.views import MethodView
 from flask_smorest import Blueprint
 from src.backend.common.logger import logger
 from src.backend.common.extensions import db
-from src.backend.models import (
-    SeatOccupancyReading,
-    Seat,
-    Booking,
-    User
-)
-from src.backend.common.labels import EMAIL_FORCE_RELEASE
-from src.backend.models.booking import BookingStatus
-from src.backend.notification.mail import send_email
+from src.backend.service.device_registry import record_heartbeats, resolve_device
+from src.backend.service.occupancy_filter import APPLY, filter_occupancy, forget_occupancy
+from src.backend.service.occupancy_service import apply_occupancy
 
 occupancy_bp = Blueprint("occupancy", __name__)
 
+_OCCUPIED_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+def parse_reading(item):
+    """(device_id, is_occupied) da {"device_id", "is_occupied"}; ValueError se non validi."""
+    if not isinstance(item, dict):
+        raise ValueError("reading must be an object")
+    device_id = int(item["device_id"])
+    value = item["is_occupied"]
+    # solo true/false/0/1 (anche come stringa): bool("false") sarebbe occupato
+    if isinstance(value, bool):
+        return device_id, value
+    if isinstance(value, (int, str)) and str(value).strip().lower() in _OCCUPIED_VALUES:
+        return device_id, _OCCUPIED_VALUES[str(value).strip().lower()]
+    raise ValueError(f"is_occupied must be true/false/0/1, got {value!r}")
+
 @occupancy_bp.route("/seat-occupancy")
 class SeatOccupancyIngest(MethodView):
 
@@ -24,55 +34,22 @@ class SeatOccupancyIngest(MethodView):
         now = datetime.now()
 
         try:
-            device_id = data["device_id"]
-            is_occupied = data["is_occupied"]
-            seat = Seat.query.filter_by(id=device_id).first()
-            if not seat:
-                raise ValueError("Seat not found for device_id")
-            # salva la lettura IoT
-            seat.is_occupied = is_occupied
-            logger.info(f"Occupancy seat: {seat}")
-            # prenotazione attiva
-            booking = Booking.query.filter(
-                Booking.seat_id == device_id,
-                Booking.status == BookingStatus.CONFIRMED,
-                Booking.start_time <= now,
-                Booking.end_time >= now
-            ).first()
-            logger.info(f"Occupancy booking: {booking}")
-            # CASO 1: qualcuno si siede → confermo la prenotazione
-            if is_occupied:
-                if booking:
-                    # già confermata, non faccio nulla
-                    pass
-                else:
-                    # se esiste una prenotazione pending, la confermo
-                    pending = Booking.query.filter(
-                        Booking.seat_id == device_id,
-                        Booking.status == BookingStatus.PENDING_CHECKIN,
-                        Booking.start_time <= now,
-                        Booking.end_time >= now
-                    ).first()
-
-                    if pending:
-                        pending.status = BookingStatus.CONFIRMED
-
-            # CASO 2: la sedia si libera → rilascio forzato
-            else:
-                if booking:
-                    booking.status = BookingStatus.COMPLETED
-
-                    user = User.query.get(booking.user_id)
-
-                    send_email(
-                        subject=EMAIL_FORCE_RELEASE["subject"],
-                        body=EMAIL_FORCE_RELEASE["body"].format(
-                            user_name=user.username,
-                            seat_id=seat.id,
-                            end_time=booking.end_time.strftime("%H:%M")
-                        ),
-                        recipients=[user.email]
-                    )
+            device_id, is_occupied = parse_reading(data)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"Invalid reading: {e}"}, 400
+
+        try:
+            record_heartbeats([device_id], now)
+            # letture ripetute o dentro la finestra di debounce non toccano il db
+            verdict = filter_occupancy([(device_id, is_occupied)], now)[0]
+            if verdict != APPLY:
+                logger.info(f"Occupancy device {device_id}: {verdict}")
+                return {"message": "Occupancy processed"}, 201
+            # salva la lettura IoT e applica le transizioni della prenotazione in corso
+            result = apply_occupancy([(device_id, is_occupied)], now)[0]
+            if result.error:
+                raise ValueError(result.error)
+            logger.info(f"Occupancy seat {result.seat_id}: {result.action}")
 
             db.session.commit()
             logger.info("message: Occupancy processed")
@@ -80,5 +57,59 @@ class SeatOccupancyIngest(MethodView):
 
         except Exception as e:
             db.session.rollback()
+            forget_occupancy([device_id])
+            logger.exception(e)
+            return {"error": str(e)}, 500
+
+
+@occupancy_bp.route("/seat-occupancy/batch")
+class SeatOccupancyBatchIngest(MethodView):
+
+    def post(self):
+        """
+        Blocco di letture {"readings": [{"device_id", "is_occupied"}, ...]} nell'ordine di arrivo.
+        Posti e prenotazioni in corso sono letti con due query per tutto il blocco e
+        le transizioni vanno in un'unica transazione. Esito per lettura: action
+        confirmed | released | none | unchanged | deferred, oppure error.
+        """
+        data = request.get_json() or {}
+        readings = data.get("readings") if isinstance(data, dict) else data
+        if not isinstance(readings, list) or not readings:
+            return {"error": "Missing readings"}, 400
+        limit = current_app.config["INGEST_BATCH_MAX"]
+        if len(readings) > limit:
+            return {"error": f"At most {limit} readings per request"}, 400
+
+        valid, results = [], [None] * len(readings)
+        for i, item in enumerate(readings):
+            try:
+                valid.append((i, parse_reading(item)))
+            except (KeyError, TypeError, ValueError) as e:
+                results[i] = {"device_id": item.get("device_id") if isinstance(item, dict) else None,
+                              "error": f"Invalid reading: {e}"}
+
+        now = datetime.now()
+        record_heartbeats({device_id for _, (device_id, _) in valid}, now)
+        verdicts = filter_occupancy([reading for _, reading in valid], now)
+        for (i, (device_id, _)), verdict in zip(valid, verdicts):
+            if verdict != APPLY:
+                results[i] = {"device_id": device_id, "seat_id": resolve_device(device_id)[1], "action": verdict}
+        valid = [item for item, verdict in zip(valid, verdicts) if verdict == APPLY]
+
+        try:
+            applied = apply_occupancy([reading for _, reading in valid], now)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            forget_occupancy([device_id for _, (device_id, _) in valid])
             logger.exception(e)
             return {"error": str(e)}, 500
+
+        forget_occupancy([result.device_id for result in applied if result.error])
+        for (i, _), result in zip(valid, applied):
+            results[i] = {"device_id": result.device_id, "seat_id": result.seat_id, "action": result.action}
+            if result.error:
+                results[i]["error"] = result.error
+        errors = sum(1 for r in results if "error" in r)
+        logger.info(f"Occupancy batch processed: {len(results)} readings, {errors} errors")
+        return {"processed": len(results) - errors, "errors": errors, "results": results}, 200
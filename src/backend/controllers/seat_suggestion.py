@@ -2,15 +2,14 @@ from flask.views import MethodView
 from flask_smorest import Blueprint
 from flask import request, jsonify
 from datetime import datetime
-from sqlalchemy import func
 from sqlalchemy.exc import SQLAlchemyError
 
 from src.backend.auth.admin_required import admin_required
 from src.backend.auth.auth import auth_required
 from src.backend.common.extensions import db
 from src.backend.common.logger import logger
-from src.backend.models.seat_suggestion import SeatSuggestion
 from src.backend.service.generate_suggestion_service import _generate_suggestions_service, _parse_payload_date_hour
+from src.backend.service.projections import suggestion_rows
 
 suggestion_bp = Blueprint("suggestions", __name__)
 
@@ -26,18 +25,8 @@ class SeatSuggestionList(MethodView):
         try:
             date_q = request.args.get("date")
             top = request.args.get("top", type=int)
-            query = SeatSuggestion.query
-            if date_q:
-                date_obj = datetime.fromisoformat(date_q).date()
-                query = query.filter(SeatSuggestion.date == date_obj)
-            else:
-                latest = db.session.query(func.max(SeatSuggestion.date)).scalar()
-                if latest:
-                    query = query.filter(SeatSuggestion.date == latest)
-            query = query.order_by(SeatSuggestion.score.desc())
-            if top:
-                query = query.limit(top)
-            results = query.all()
+            date_obj = datetime.fromisoformat(date_q).date() if date_q else None
+            results = suggestion_rows(date=date_obj, top=top)
             out = [{"seat_id": s.seat_id, "score": round(s.score, 3), "reason": s.reason, "is_recommended": s.is_recommended} for s in results]
             return jsonify(out), 200
         except Exception as e:
@@ -1,18 +1,32 @@
-from datetime import datetime
-from flask import request, jsonify
+from datetime import datetime, timezone
+from flask import current_app, request, jsonify
 from flask.views import MethodView
 from flask_smorest import Blueprint
+from sqlalchemy import select
 from src.backend.common.extensions import db
-from sqlalchemy import func
 from src.backend.common.logger import logger
-from src.backend.models import TemperatureReading, Seat, Booking
+from src.backend.models import Seat, Booking
 from src.backend.models.booking import BookingStatus
+from src.backend.service.device_registry import record_heartbeats
+from src.backend.service.temperature_service import submit_temperatures, temperature_summary
 
 temperature_bp = Blueprint("temperatures", __name__)
 # Parametri di comfort (costanti di progetto)
 COMFORT_TEMP = 2.0
 TOLERANCE = 2.0
 
+
+def hvac_decision(temperature, booking_active):
+    """(azione hvac, luci) per la temperatura della stanza: tutto spento senza prenotazioni confermate."""
+    if not booking_active:
+        return "off", False
+    if temperature > COMFORT_TEMP + TOLERANCE:
+        return "cool", True
+    if temperature < COMFORT_TEMP - TOLERANCE:
+        return "heat", True
+    return "off", True
+
+
 @temperature_bp.route("/temperatures")
 class TemperatureIngest(MethodView):
 
@@ -23,14 +37,14 @@ class TemperatureIngest(MethodView):
             room_id = int(data["room_id"])
             temperature = float(data["temperature"])
             now = datetime.utcnow()
+            # device_id (opzionale) del sensore: heartbeat per /admin/devices/stale
+            if data.get("device_id") is not None:
+                record_heartbeats([int(data["device_id"])], datetime.now())
 
-            # salva lettura (assume TemperatureReading ha campi room_id, temperature, timestamp/created_at)
-            reading = TemperatureReading(
-                room_id=room_id,
-                temperature=temperature
-            )
-            db.session.add(reading)
-            db.session.commit()
+            # salva lettura e aggiorna i rollup minute/hour/day
+            # (con TEMPERATURE_WRITE_BEHIND la scrittura avviene in blocco dal thread di flush)
+            if submit_temperatures([(room_id, temperature, now)]):
+                db.session.commit()
 
             # ---- verifica prenotazione CONFIRMED attiva per la stanza ----
             booking_active = db.session.query(Booking).join(Seat).filter(
@@ -43,18 +57,7 @@ class TemperatureIngest(MethodView):
             #presence = any([s.is_occupied for s in seats])
 
             # Se non c'è prenotazione valida o non c'è presenza => tutto OFF
-            if not booking_active: #or not presence:
-                hvac_action = "off"
-                lights = False
-            else:
-                # calcolo HVAC in base alla temperatura
-                if temperature > COMFORT_TEMP + TOLERANCE:
-                    hvac_action = "cool"
-                elif temperature < COMFORT_TEMP - TOLERANCE:
-                    hvac_action = "heat"
-                else:
-                    hvac_action = "off"
-                lights = True
+            hvac_action, lights = hvac_decision(temperature, booking_active)
 
             response = {
                 "room_id": room_id,
@@ -68,19 +71,83 @@ class TemperatureIngest(MethodView):
             logger.exception("Error processing temperature input")
             return jsonify({"error": str(e)}), 500
 
+@temperature_bp.route("/temperatures/batch")
+class TemperatureBatchIngest(MethodView):
+
+    def post(self):
+        """
+        Blocco di letture {"readings": [{"room_id", "temperature", "timestamp"?, "device_id"?}, ...]}:
+        un insert multi-riga, un upsert dei rollup e un commit. Restituisce l'esito
+        per lettura e la decisione HVAC per stanza sull'ultima lettura del blocco.
+        """
+        data = request.get_json() or {}
+        readings = data.get("readings") if isinstance(data, dict) else data
+        if not isinstance(readings, list) or not readings:
+            return jsonify({"error": "Missing readings"}), 400
+        limit = current_app.config["INGEST_BATCH_MAX"]
+        if len(readings) > limit:
+            return jsonify({"error": f"At most {limit} readings per request"}), 400
+
+        now = datetime.utcnow()
+        valid, results, latest, devices = [], [], {}, set()
+        for item in readings:
+            try:
+                room_id = int(item["room_id"])
+                temperature = float(item["temperature"])
+                device_id = int(item["device_id"]) if item.get("device_id") is not None else None
+                timestamp = datetime.fromisoformat(item["timestamp"]) if item.get("timestamp") else now
+                if timestamp.tzinfo is not None:
+                    timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            except (KeyError, TypeError, ValueError) as e:
+                results.append({"error": f"Invalid reading: {e}"})
+                continue
+            valid.append((room_id, temperature, timestamp))
+            if device_id is not None:
+                devices.add(device_id)
+            results.append({"room_id": room_id, "status": "recorded"})
+            if room_id not in latest or timestamp >= latest[room_id][1]:
+                latest[room_id] = (temperature, timestamp)
+
+        try:
+            record_heartbeats(devices, datetime.now())
+            if submit_temperatures(valid):
+                db.session.commit()
+
+            # stanze con almeno una prenotazione CONFIRMED, per tutto il blocco in una query
+            active_rooms = set(db.session.scalars(
+                select(Seat.room_id).distinct().join(Booking, Booking.seat_id == Seat.id).where(
+                    Seat.room_id.in_(latest),
+                    Booking.status == BookingStatus.CONFIRMED,
+                )
+            )) if latest else set()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Error processing temperature batch")
+            return jsonify({"error": str(e)}), 500
+
+        rooms = []
+        for room_id, (temperature, _) in sorted(latest.items()):
+            hvac_action, lights = hvac_decision(temperature, room_id in active_rooms)
+            rooms.append({"room_id": room_id, "temperature": temperature, "hvac": hvac_action, "lights": lights})
+        return jsonify({
+            "recorded": len(valid),
+            "errors": len(results) - len(valid),
+            "results": results,
+            "rooms": rooms,
+        }), 200
+
 @temperature_bp.route("/temperatures/stats")
 class TemperatureStats(MethodView):
 
     def get(self):
         try:
-            avg_temp = db.session.query(func.avg(TemperatureReading.temperature)).scalar()
-            max_temp = db.session.query(func.max(TemperatureReading.temperature)).scalar()
-            min_temp = db.session.query(func.min(TemperatureReading.temperature)).scalar()
+            # rollup giornalieri: coprono tutto lo storico anche dopo la retention delle letture
+            summary = temperature_summary()
 
             return {
-                "average_temperature": avg_temp,
-                "max_temperature": max_temp,
-                "min_temperature": min_temp
+                "average_temperature": summary["avg"],
+                "max_temperature": summary["max"],
+                "min_temperature": summary["min"]
             }, 200
 
         except Exception as e:
@@ -0,0 +1,120 @@
+import datetime
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.backend.common.extensions import db
+from src.backend.models import Room, WaitlistEntry
+from src.backend.models.waitlist import WaitlistStatus
+from src.backend.service.hot_queries import user_by_username
+from src.backend.service.seat_search_service import search_free_seats
+from src.backend.service.waitlist_service import WaitEntry, waitlist_queue
+
+waitlist_bp = Blueprint("waitlist", __name__, description="Seat waitlist")
+
+
+def _entry_json(entry):
+    return {
+        "id": entry.id,
+        "room_id": entry.room_id,
+        "start_time": entry.start_time.isoformat(),
+        "end_time": entry.end_time.isoformat(),
+        "status": entry.status,
+        "booking_id": entry.booking_id,
+        "created_at": entry.created_at.isoformat() if entry.created_at else None,
+    }
+
+
+@waitlist_bp.route("/waitlist")
+class WaitlistList(MethodView):
+
+    @jwt_required()
+    def get(self):
+        """Iscrizioni dell'utente corrente, le piu' recenti per prime (?status= per filtrare)."""
+        user = user_by_username(get_jwt_identity())
+        if not user:
+            return {"error": "User not found"}, 404
+        query = WaitlistEntry.query.filter_by(user_id=user.id)
+        if request.args.get("status"):
+            query = query.filter(WaitlistEntry.status == request.args["status"])
+        return [_entry_json(e) for e in query.order_by(WaitlistEntry.id.desc()).limit(100)], 200
+
+    @jwt_required()
+    def post(self):
+        """
+        Iscrizione alla lista d'attesa di una sala per una fascia dello stesso giorno.
+        Quando un posto della sala si libera per tutta la fascia viene creata una
+        prenotazione pending_checkin e inviata un'email.
+        """
+        try:
+            data = request.get_json() or {}
+            user = user_by_username(get_jwt_identity())
+            if not user:
+                return {"error": "User not found"}, 404
+
+            room_id = data.get("room_id")
+            if not all([room_id, data.get("start_time"), data.get("end_time")]):
+                return {"error": "Missing required fields"}, 400
+            start_time = datetime.datetime.fromisoformat(data["start_time"])
+            end_time = datetime.datetime.fromisoformat(data["end_time"])
+
+            if start_time >= end_time or end_time <= datetime.datetime.now():
+                return {"error": "Invalid time range"}, 400
+            if (end_time - datetime.timedelta(microseconds=1)).date() != start_time.date():
+                return {"error": "The time range must be within a single day"}, 400
+            if not db.session.get(Room, room_id):
+                return {"error": "Room not found"}, 404
+
+            already = WaitlistEntry.query.filter(
+                WaitlistEntry.user_id == user.id,
+                WaitlistEntry.room_id == room_id,
+                WaitlistEntry.status == WaitlistStatus.WAITING,
+                WaitlistEntry.start_time < end_time,
+                WaitlistEntry.end_time > start_time,
+            ).first()
+            if already:
+                return {"error": "Already waiting for this room in this time range", "id": already.id}, 409
+
+            free = search_free_seats(start_time, end_time, k=1, room_id=room_id)
+            if free:
+                return {"error": "Seats available in this room, book directly", "seat_id": free[0].seat_id}, 409
+
+            entry = WaitlistEntry(user_id=user.id, room_id=room_id, start_time=start_time, end_time=end_time)
+            db.session.add(entry)
+            db.session.commit()
+
+            queue = waitlist_queue()
+            if queue is not None:
+                queue.push(WaitEntry(entry.id, entry.user_id, entry.room_id, entry.start_time, entry.end_time))
+            return _entry_json(entry), 201
+
+        except ValueError:
+            return {"error": "Invalid datetime format"}, 400
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return {"error": "Database error", "details": str(e)}, 500
+
+
+@waitlist_bp.route("/waitlist/<int:entry_id>")
+class WaitlistItem(MethodView):
+
+    @jwt_required()
+    def delete(self, entry_id):
+        """Cancella un'iscrizione ancora in attesa dell'utente corrente."""
+        user = user_by_username(get_jwt_identity())
+        if not user:
+            return {"error": "User not found"}, 404
+        entry = db.session.get(WaitlistEntry, entry_id)
+        if not entry or entry.user_id != user.id:
+            return {"error": "Waitlist entry not found"}, 404
+        if entry.status != WaitlistStatus.WAITING:
+            return {"error": f"Waitlist entry is {entry.status}"}, 409
+
+        entry.status = WaitlistStatus.CANCELLED
+        db.session.commit()
+        queue = waitlist_queue()
+        if queue is not None:
+            queue.discard(entry.id)
+        return _entry_json(entry), 200
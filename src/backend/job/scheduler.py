@@ -1,12 +1,22 @@
 from datetime import datetime
+from flask import current_app
 from sqlalchemy import and_
 
+from src.backend.auth.token_blocklist import purge_expired_tokens
 from src.backend.common.logger import logger
 from src.backend.common.extensions import db
 from src.backend.common.labels import EMAIL_BOOKING_COMPLETED
 from src.backend.models import Booking
 from src.backend.models.booking import BookingStatus
-from src.backend.notification.mail import send_email
+from src.backend.notification.mail import deliver_queued_emails, send_email
+from src.backend.service.archive_service import archive_history
+from src.backend.service.booking_slots import prune_booking_slots, slots_enabled
+from src.backend.service.device_registry import flush_heartbeats
+from src.backend.service.occupancy_filter import settle_pending_occupancy
+from src.backend.service.occupancy_log import compact_occupancy_events
+from src.backend.service.seat_availability import seat_availability
+from src.backend.service.temperature_service import expire_temperature_history
+from src.backend.service.waitlist_service import expire_waitlist
 
 def close_expired_bookings():
     now = datetime.now()
@@ -30,4 +40,74 @@ def close_expired_bookings():
 
     if expired:
         db.session.commit()
-    logger.info(f"Closed {len(expired)} expired bookings.")
\ No newline at end of file
+    logger.info(f"Closed {len(expired)} expired bookings.")
+
+    # le COMPLETED escono dall'indice al commit; restano le pending mai confermate
+    index = seat_availability()
+    if index is not None:
+        index.prune(now)
+    if slots_enabled():
+        prune_booking_slots(db.session, now)
+    expire_waitlist(db.session, now)
+
+
+def archive_old_records():
+    """Sposta prenotazioni chiuse e letture vecchie nelle tabelle di archivio."""
+    try:
+        archive_history()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Archiving job failed")
+
+
+
+def expire_temperature_readings():
+    """Retention delle letture grezze e dei rollup minute/hour."""
+    try:
+        expire_temperature_history()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Temperature retention job failed")
+
+
+def send_queued_emails():
+    """Invia le email accodate nella outbox."""
+    try:
+        deliver_queued_emails()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Email outbox job failed")
+
+
+def purge_revoked_tokens():
+    """Elimina le revoche dei token ormai scaduti."""
+    try:
+        purge_expired_tokens(db.session)
+    except Exception:
+        db.session.rollback()
+        logger.exception("Token purge job failed")
+
+
+def settle_occupancy_changes():
+    """Applica i cambi di occupazione rimasti stabili per la finestra di debounce."""
+    try:
+        settle_pending_occupancy(datetime.now())
+    except Exception:
+        logger.exception("Occupancy debounce job failed")
+
+
+def compact_occupancy_log():
+    """Riduce il log eventi di occupazione a intervalli per posto."""
+    try:
+        compact_occupancy_events(db.session, current_app.config["OCCUPANCY_COMPACT_BATCH_SIZE"])
+    except Exception:
+        db.session.rollback()
+        logger.exception("Occupancy compaction job failed")
+
+
+def flush_device_heartbeats():
+    """Scrive in blocco i last_seen dei dispositivi accumulati in memoria."""
+    try:
+        flush_heartbeats(db.session)
+    except Exception:
+        logger.exception("Device heartbeat job failed")
@@ -1,23 +1,36 @@
+from .archive import BookingArchive, TemperatureReadingArchive
 from .booking import Booking
+from .booking_slot import BookingSlot
 from .command_device import EnergyCommand, RoomEnergyState
 from .device import Device
+from .email_outbox import EmailOutbox
+from .occupancy_interval import SeatOccupancyInterval
 from .reading_device import TemperatureReading, SeatOccupancyReading
 from .room import Room
 from .seat_suggestion import SeatSuggestion
 from .seat import Seat
+from .temperature_rollup import TemperatureRollup
 from .user_token import UserToken
 from .user import User
+from .waitlist import WaitlistEntry
 
 __all__ = [
     "Booking",
+    "BookingArchive",
+    "BookingSlot",
+    "TemperatureReadingArchive",
     "Device",
+    "EmailOutbox",
     "Room",
     "SeatSuggestion",
     "Seat",
     "UserToken",
     "User",
+    "WaitlistEntry",
     "TemperatureReading",
+    "TemperatureRollup",
     "SeatOccupancyReading",
+    "SeatOccupancyInterval",
     "EnergyCommand",
     "RoomEnergyState",
 ]
\ No newline at end of file
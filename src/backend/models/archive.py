@@ -0,0 +1,35 @@
+from src.backend.common.extensions import db
+
+
+class BookingArchive(db.Model):
+    """Prenotazioni chiuse spostate fuori dalla tabella bookings (stesso id)."""
+    __tablename__ = "bookings_archive"
+    __table_args__ = (
+        db.Index("ix_bookings_archive_seat_start", "seat_id", "start_time"),
+        db.Index("ix_bookings_archive_start_time", "start_time"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    seat_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+
+class TemperatureReadingArchive(db.Model):
+    """Letture di temperatura oltre la finestra calda (stesso id)."""
+    __tablename__ = "temperature_readings_archive"
+    __table_args__ = (
+        db.Index("ix_temperature_readings_archive_room_timestamp", "room_id", "timestamp"),
+        db.Index("ix_temperature_readings_archive_timestamp", "timestamp"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    room_id = db.Column(db.Integer)
+    temperature = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
@@ -6,6 +6,20 @@ class BookingStatus(str):
 
 class Booking(db.Model):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # overlap check / prenotazione attiva per posto
+        db.Index("ix_bookings_seat_status_window", "seat_id", "status", "start_time", "end_time"),
+        # job di chiusura e statistiche occupazione
+        db.Index("ix_bookings_status_end_time", "status", "end_time"),
+        db.Index("ix_bookings_end_time", "end_time"),
+        # paginazione keyset su (start_time, id) con i filtri di GET /bookings
+        db.Index("ix_bookings_start_time_id", "start_time", "id"),
+        db.Index("ix_bookings_user_start_time_id", "user_id", "start_time", "id"),
+        db.Index("ix_bookings_seat_start_time_id", "seat_id", "start_time", "id"),
+        db.Index("ix_bookings_status_start_time_id", "status", "start_time", "id"),
+        # AUTOINCREMENT: gli id delle prenotazioni archiviate e cancellate non vengono riusati
+        {"sqlite_autoincrement": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer,db.ForeignKey("users.id", ondelete="CASCADE"),nullable=False )
@@ -13,7 +27,7 @@ class Booking(db.Model):
     seat_id = db.Column(db.Integer,db.ForeignKey("seats.id", ondelete="CASCADE"),nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
-    status = db.Column(db.String, nullable=False, default=BookingStatus.PENDING_CHECKIN)
+    status = db.Column(db.String(20), nullable=False, default=BookingStatus.PENDING_CHECKIN)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
@@ -0,0 +1,18 @@
+from src.backend.common.extensions import db
+
+
+class BookingSlot(db.Model):
+    """
+    Fascia di BOOKING_SLOT_MINUTES occupata da una prenotazione attiva
+    (solo con BOOKING_WRITE_PATH=slots). La chiave primaria (seat_id, slot_start)
+    fa rifiutare al database, in modo atomico, due prenotazioni sulla stessa fascia.
+    """
+    __tablename__ = "booking_slots"
+    __table_args__ = (
+        db.Index("ix_booking_slots_booking_id", "booking_id"),
+        db.Index("ix_booking_slots_slot_start", "slot_start"),
+    )
+
+    seat_id = db.Column(db.Integer, db.ForeignKey("seats.id", ondelete="CASCADE"), primary_key=True)
+    slot_start = db.Column(db.DateTime, primary_key=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey("bookings.id", ondelete="CASCADE"), nullable=False)
@@ -4,6 +4,10 @@ from src.backend.common.extensions import db
 
 class EnergyCommand(db.Model):
     __tablename__ = "energy_commands"
+    __table_args__ = (
+        # export e statistiche per intervallo di tempo
+        db.Index("ix_energy_commands_timestamp", "timestamp"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"))
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from src.backend.common.extensions import db
+
+
+class EmailStatus(str):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailOutbox(db.Model):
+    """
+    Email da inviare, scritte nella stessa transazione della modifica che le genera
+    e spedite dal job send_queued_emails.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_id", "status", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # separati da virgola
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=EmailStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
@@ -0,0 +1,18 @@
+from src.backend.common.extensions import db
+
+
+class SeatOccupancyInterval(db.Model):
+    """
+    Intervallo in cui un posto e' risultato occupato, ottenuto compattando il log
+    seat_occupancy_readings. end_time NULL: il posto e' ancora occupato.
+    """
+    __tablename__ = "seat_occupancy_intervals"
+    __table_args__ = (
+        db.Index("ix_seat_occupancy_intervals_seat_start", "seat_id", "start_time"),
+        db.Index("ix_seat_occupancy_intervals_start", "start_time"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    seat_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=True)
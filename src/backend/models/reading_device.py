@@ -4,6 +4,12 @@ from src.backend.common.extensions import db
 
 class TemperatureReading(db.Model):
     __tablename__ = "temperature_readings"
+    __table_args__ = (
+        db.Index("ix_temperature_readings_room_timestamp", "room_id", "timestamp"),
+        db.Index("ix_temperature_readings_timestamp", "timestamp"),
+        # AUTOINCREMENT: gli id delle letture archiviate e cancellate non vengono riusati
+        {"sqlite_autoincrement": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"))
@@ -15,10 +21,19 @@ class TemperatureReading(db.Model):
 
 
 class SeatOccupancyReading(db.Model):
+    """
+    Log append-only dei cambi di occupazione (scritto a blocchi dopo il commit
+    dell'ingest); il job occupancy_compaction lo riduce a SeatOccupancyInterval.
+    timestamp e' nell'ora locale, come le prenotazioni.
+    """
     __tablename__ = "seat_occupancy_readings"
+    __table_args__ = (
+        db.Index("ix_seat_occupancy_readings_seat_timestamp", "seat_id", "timestamp"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     device_id = db.Column(db.Integer, db.ForeignKey("devices.id"))
-
+    seat_id = db.Column(db.Integer, nullable=True)
+    is_occupied = db.Column(db.Boolean, nullable=True)
 
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -9,6 +9,9 @@ class Room(db.Model):
     sun_exposure = db.Column(db.String(20))
     # north, south, east, west (serve per il comfort)
 
+    # distanza massima (metri) tra due posti adiacenti; se vuota vale SEAT_ADJACENCY_RADIUS
+    adjacency_radius = db.Column(db.Float)
+
     seats = db.relationship("Seat", back_populates="room")
     devices = db.relationship("Device", back_populates="room")
     temperatures = db.relationship("TemperatureReading", back_populates="room")
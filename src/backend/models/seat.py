@@ -3,15 +3,21 @@ from src.backend.common.extensions import db
 
 class Seat(db.Model):
     __tablename__ = "seats"
+    __table_args__ = (
+        db.Index("ix_seats_room_id", "room_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     seat_identifier = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     is_occupied = db.Column(db.Boolean, default=False)
     # Indica se il posto è abilitato/visibile per prenotazioni
     is_active = db.Column(db.Boolean, default=True, nullable=False)
-    upd_user=db.Column(db.String, nullable=False)
+    upd_user=db.Column(db.String(80), nullable=False)
     upd_datetime=db.Column(db.DateTime, nullable=False)
     room_id = db.Column(db.Integer, db.ForeignKey("rooms.id"), nullable=False)
+    # posizione nella pianta della sala (metri), opzionale: serve per le prenotazioni di gruppo
+    pos_x = db.Column(db.Float)
+    pos_y = db.Column(db.Float)
     bookings = db.relationship('Booking', back_populates='seat', lazy=True)
     room = db.relationship("Room", back_populates="seats")
     device = db.relationship("Device", uselist=False)
@@ -4,6 +4,11 @@ from src.backend.common.extensions import db
 
 class SeatSuggestion(db.Model):
     __tablename__ = "seat_suggestions"
+    __table_args__ = (
+        db.Index("ix_seat_suggestions_date_score", "date", "score"),
+        # ultimo suggerimento per posto (ricerca posti liberi)
+        db.Index("ix_seat_suggestions_date_seat_id", "date", "seat_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     seat_id = db.Column(db.Integer, db.ForeignKey("seats.id"))
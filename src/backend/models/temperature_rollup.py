@@ -0,0 +1,21 @@
+from src.backend.common.extensions import db
+
+
+class TemperatureRollup(db.Model):
+    """
+    Aggregato delle letture di temperatura per stanza e intervallo.
+    granularity: minute | hour | day; bucket_start e' l'inizio dell'intervallo (UTC).
+    """
+    __tablename__ = "temperature_rollups"
+    __table_args__ = (
+        db.Index("ix_temperature_rollups_granularity_bucket", "granularity", "bucket_start"),
+    )
+
+    granularity = db.Column(db.String(6), primary_key=True)
+    room_id = db.Column(db.Integer, primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum = db.Column(db.Float, nullable=False, default=0.0)
+    min = db.Column(db.Float)
+    max = db.Column(db.Float)
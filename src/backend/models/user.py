@@ -4,13 +4,13 @@ class User(db.Model):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    username = db.Column(db.String,unique=True, nullable=False)
+    username = db.Column(db.String(80),unique=True, nullable=False)
     password = db.Column(db.String(256), nullable=False)
-    first_name = db.Column(db.String, nullable=False)
-    last_name = db.Column(db.String, nullable=False)
+    first_name = db.Column(db.String(100), nullable=False)
+    last_name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), default="student")  # student | admin
     # token = db.Column(db.String, nullable=False)
-    email = db.Column(db.String, unique=True, nullable=False)
+    email = db.Column(db.String(255), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     ins_istance=db.Column(db.DateTime, default=db.func.current_timestamp())
 
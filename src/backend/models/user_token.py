@@ -1,13 +1,21 @@
 from src.backend.common.extensions import db
 
 class UserToken(db.Model):
+    """Token JWT revocati (logout): token e' il jti, expired_at la scadenza del token."""
     __tablename__ = "user_token"
+    __table_args__ = (
+        # pulizia delle revoche di token ormai scaduti
+        db.Index("ix_user_token_expired_at", "expired_at"),
+        # revoche nuove lette dagli altri processi (watermark su revoked_at)
+        db.Index("ix_user_token_revoked_at", "revoked_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False) 
     token = db.Column(db.String(36), nullable=False, unique=True)
     issued_at = db.Column(db.DateTime, nullable=False)
     expired_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
 
     #user = db.relationship('User', backref=db.backref('user_token', uselist=False))
-    user = db.relationship("User", back_populates="tokens")
\ No newline at end of file
+    user = db.relationship("User", back_populates="tokens")
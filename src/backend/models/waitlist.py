@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from src.backend.common.extensions import db
+
+
+class WaitlistStatus(str):
+    WAITING = "waiting"
+    FULFILLED = "fulfilled"  # prenotazione creata su un posto liberato
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+
+
+class WaitlistEntry(db.Model):
+    """
+    Richiesta di un posto in una sala per una fascia dello stesso giorno,
+    soddisfatta (in ordine di iscrizione) quando un posto della sala si libera.
+    """
+    __tablename__ = "waitlist_entries"
+    __table_args__ = (
+        # caricamento della coda e scadenza delle richieste
+        db.Index("ix_waitlist_entries_status_end_time", "status", "end_time"),
+        db.Index("ix_waitlist_entries_user_status", "user_id", "status"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=WaitlistStatus.WAITING)
+    booking_id = db.Column(db.Integer, db.ForeignKey("bookings.id", ondelete="SET NULL"))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    fulfilled_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<WaitlistEntry ID {self.id} - Room {self.room_id} - Status {self.status}>"
@@ -1,6 +1,9 @@
+from datetime import datetime
+
 from flask import current_app
 from flask_mail import Message
-from src.backend.common.extensions import mail
+from src.backend.common.extensions import db, mail
+from src.backend.models.email_outbox import EmailOutbox, EmailStatus
 from src.backend.models.user import User
 from src.backend.common.logger import logging
 
@@ -28,3 +31,60 @@ def send_email(subject, body, recipients):
     except Exception as e:
         logging.error(f"Errore durante l'invio dell'email: {str(e)}")
         raise
+
+
+def queue_email(subject, body, recipients):
+    """
+    Accoda un'email nella outbox usando la sessione corrente: viene salvata
+    con il commit del chiamante (e scartata con il suo rollback) e spedita
+    dal job send_queued_emails.
+    """
+    if not recipients:
+        raise ValueError("Nessun destinatario specificato per l'email")
+    db.session.add(EmailOutbox(recipients=",".join(recipients), subject=subject, body=body))
+
+
+def deliver_queued_emails(batch_size=50):
+    """
+    Invia fino a batch_size email in attesa su un'unica connessione SMTP.
+    Dopo EMAIL_MAX_ATTEMPTS tentativi falliti l'email passa a failed.
+    Restituisce il numero di email inviate.
+    """
+    pending = EmailOutbox.query.filter_by(status=EmailStatus.PENDING) \
+        .order_by(EmailOutbox.id).limit(batch_size).all()
+    if not pending:
+        return 0
+
+    max_attempts = current_app.config.get("EMAIL_MAX_ATTEMPTS", 5)
+    sender = current_app.config.get("MAIL_DEFAULT_SENDER")
+    sent = 0
+
+    def failed(item, error):
+        item.attempts += 1
+        item.last_error = error
+        if item.attempts >= max_attempts:
+            item.status = EmailStatus.FAILED
+
+    try:
+        with mail.connect() as conn:
+            for item in pending:
+                msg = Message(subject=item.subject, recipients=item.recipients.split(","),
+                              body=item.body, sender=sender)
+                try:
+                    conn.send(msg)
+                except Exception as e:
+                    failed(item, str(e))
+                    continue
+                item.status = EmailStatus.SENT
+                item.sent_at = datetime.utcnow()
+                sent += 1
+    except Exception as e:
+        # connessione SMTP non disponibile: nessuna email del blocco e' partita
+        logging.error(f"Errore di connessione al server email: {str(e)}")
+        for item in pending:
+            if item.status == EmailStatus.PENDING:
+                failed(item, str(e))
+
+    db.session.commit()
+    logging.info(f"Email outbox: {sent}/{len(pending)} inviate")
+    return sent
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, literal, select, union_all
+
+from src.backend.common.extensions import db
+from src.backend.common.logger import logger
+from src.backend.models import Booking, BookingArchive, TemperatureReading, TemperatureReadingArchive
+from src.backend.models.booking import BookingStatus
+
+BOOKING_COLUMNS = ("id", "user_id", "seat_id", "start_time", "end_time", "status", "created_at", "updated_at")
+READING_COLUMNS = ("id", "room_id", "temperature", "timestamp")
+
+
+def _move_rows(source, target, columns, criteria, batch_size, archived_at):
+    """
+    Copia in target e cancella da source le righe che soddisfano criteria,
+    a blocchi di batch_size con un commit per blocco per non tenere il lock a lungo.
+    """
+    moved = 0
+    while True:
+        ids = db.session.scalars(
+            select(source.id).where(*criteria).order_by(source.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        rows = select(
+            *[getattr(source, c) for c in columns],
+            literal(archived_at, type_=db.DateTime).label("archived_at"),
+        ).where(source.id.in_(ids))
+        db.session.execute(insert(target).from_select([*columns, "archived_at"], rows))
+        db.session.execute(delete(source).where(source.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+    return moved
+
+
+def archive_history(now=None):
+    """
+    Sposta nelle tabelle di archivio le prenotazioni COMPLETED terminate da piu' di
+    ARCHIVE_BOOKINGS_AFTER_DAYS giorni e le letture di temperatura piu' vecchie di
+    ARCHIVE_READINGS_AFTER_DAYS giorni. Restituisce il numero di righe spostate.
+    """
+    now = now or datetime.now()
+    config = current_app.config
+    batch_size = config["ARCHIVE_BATCH_SIZE"]
+
+    booking_cutoff = now - timedelta(days=config["ARCHIVE_BOOKINGS_AFTER_DAYS"])
+    bookings = _move_rows(
+        Booking, BookingArchive, BOOKING_COLUMNS,
+        [Booking.status == BookingStatus.COMPLETED, Booking.end_time < booking_cutoff],
+        batch_size, now,
+    )
+
+    # i timestamp delle letture sono in UTC (datetime.utcnow)
+    reading_cutoff = datetime.utcnow() - timedelta(days=config["ARCHIVE_READINGS_AFTER_DAYS"])
+    readings = _move_rows(
+        TemperatureReading, TemperatureReadingArchive, READING_COLUMNS,
+        [TemperatureReading.timestamp < reading_cutoff],
+        batch_size, now,
+    )
+
+    logger.info(f"Archived {bookings} bookings and {readings} temperature readings")
+    return {"bookings": bookings, "temperature_readings": readings}
+
+
+def booking_history(since=None, until=None):
+    """
+    Subquery con le prenotazioni calde e archiviate (colonne di BOOKING_COLUMNS).
+    since/until filtrano start_time in ciascun ramo, cosi' ogni tabella usa il proprio indice.
+    """
+    def branch(model):
+        q = select(*[getattr(model, c) for c in BOOKING_COLUMNS])
+        if since is not None:
+            q = q.where(model.start_time >= since)
+        if until is not None:
+            q = q.where(model.start_time <= until)
+        return q
+
+    return union_all(branch(Booking), branch(BookingArchive)).subquery("booking_history")
+
+
+def temperature_history(since=None, until=None, room_id=None):
+    """Subquery con le letture di temperatura calde e archiviate (colonne di READING_COLUMNS)."""
+    def branch(model):
+        q = select(*[getattr(model, c) for c in READING_COLUMNS])
+        if room_id is not None:
+            q = q.where(model.room_id == room_id)
+        if since is not None:
+            q = q.where(model.timestamp >= since)
+        if until is not None:
+            q = q.where(model.timestamp <= until)
+        return q
+
+    return union_all(branch(TemperatureReading), branch(TemperatureReadingArchive)).subquery("temperature_history")
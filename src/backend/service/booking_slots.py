@@ -0,0 +1,155 @@
+"""
+Percorso di scrittura delle prenotazioni a fasce (BOOKING_WRITE_PATH=slots).
+
+Ogni prenotazione attiva occupa in booking_slots tutte le fasce di
+BOOKING_SLOT_MINUTES che tocca (arrotondando verso l'esterno). Per questo le
+prenotazioni create dalle API devono iniziare e finire su un confine di fascia
+(slot_alignment_error): con estremi arrotondati due prenotazioni solo adiacenti
+occuperebbero la stessa fascia e la seconda riceverebbe un 409 che il percorso
+check non darebbe. Le righe sono
+scritte nello stesso flush della prenotazione, quindi una sovrapposizione fa
+fallire il commit con IntegrityError sulla chiave (seat_id, slot_start): niente
+check-then-insert e nessun lock globale tra prenotazioni su posti diversi.
+Completamento, rilascio forzato e spostamento liberano o spostano le fasce
+nello stesso modo, da qualunque punto del codice arrivino.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.dialects import mysql, sqlite
+
+from src.backend.common.logger import logger
+from src.backend.models import Booking, BookingSlot
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+
+WRITE_PATHS = ("check", "slots")
+
+_TRACKED = ("seat_id", "start_time", "end_time", "status")
+
+
+def init_booking_write_path(app, db):
+    """
+    BOOKING_WRITE_PATH=check (default): query di sovrapposizione e poi insert.
+    BOOKING_WRITE_PATH=slots: conflitti rilevati dal vincolo su booking_slots.
+    """
+    path = app.config.get("BOOKING_WRITE_PATH", "check")
+    if path not in WRITE_PATHS:
+        raise ValueError(f"Unsupported BOOKING_WRITE_PATH '{path}', expected one of {WRITE_PATHS}")
+    if path == "slots" and not event.contains(db.session, "after_flush", _sync_slots):
+        event.listen(db.session, "after_flush", _sync_slots)
+
+
+def slots_enabled():
+    return current_app.config.get("BOOKING_WRITE_PATH", "check") == "slots"
+
+
+def slot_starts(start, end, minutes):
+    """Inizi delle fasce di minutes minuti che intersecano [start, end)."""
+    step = timedelta(minutes=minutes)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    cur = midnight + ((start - midnight) // step) * step
+    starts = []
+    while cur < end:
+        starts.append(cur)
+        cur += step
+    return starts
+
+
+def slot_alignment_error(start, end):
+    """Messaggio d'errore se con BOOKING_WRITE_PATH=slots start o end non cadono su un confine di fascia, altrimenti None."""
+    if not slots_enabled():
+        return None
+    minutes = current_app.config["BOOKING_SLOT_MINUTES"]
+    step = timedelta(minutes=minutes)
+    for ts in (start, end):
+        if (ts - ts.replace(hour=0, minute=0, second=0, microsecond=0)) % step:
+            return f"start_time and end_time must be aligned to {minutes}-minute slots"
+    return None
+
+
+def _slot_rows(booking_id, seat_id, start, end, minutes):
+    return [
+        {"seat_id": seat_id, "slot_start": slot, "booking_id": booking_id}
+        for slot in slot_starts(start, end, minutes)
+    ]
+
+
+def _sync_slots(session, flush_context):
+    """Dopo il flush delle prenotazioni, occupa/libera le relative fasce nella stessa transazione."""
+    if not has_app_context():
+        return
+    minutes = current_app.config["BOOKING_SLOT_MINUTES"]
+    release, claims = set(), []
+
+    for obj in session.new:
+        if isinstance(obj, Booking) and obj.status in ACTIVE_STATUSES:
+            claims += _slot_rows(obj.id, obj.seat_id, obj.start_time, obj.end_time, minutes)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        attrs = inspect(obj).attrs
+        changed = {name for name in _TRACKED if attrs[name].history.has_changes()}
+        if not changed:
+            continue
+        old_status = attrs.status.history.deleted[0] if attrs.status.history.deleted else obj.status
+        was_active, is_active = old_status in ACTIVE_STATUSES, obj.status in ACTIVE_STATUSES
+        if changed == {"status"} and was_active == is_active:
+            continue  # es. check-in: stesse fasce
+        release.add(obj.id)
+        if is_active:
+            claims += _slot_rows(obj.id, obj.seat_id, obj.start_time, obj.end_time, minutes)
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            release.add(obj.id)
+
+    if not release and not claims:
+        return
+    conn = session.connection()
+    table = BookingSlot.__table__
+    if release:
+        conn.execute(delete(table).where(table.c.booking_id.in_(release)))
+    if claims:
+        conn.execute(insert(table), claims)
+
+
+def ensure_booking_slots(session, now=None):
+    """
+    Crea le fasce mancanti per le prenotazioni attive non terminate
+    (db esistenti o passaggio da BOOKING_WRITE_PATH=check). Le fasce gia'
+    occupate da un'altra prenotazione vengono saltate e segnalate.
+    """
+    if not slots_enabled():
+        return 0
+    now = now or datetime.now()
+    minutes = current_app.config["BOOKING_SLOT_MINUTES"]
+    missing = session.execute(
+        select(Booking.id, Booking.seat_id, Booking.start_time, Booking.end_time).where(
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.end_time >= now,
+            Booking.id.not_in(select(BookingSlot.booking_id)),
+        )
+    ).all()
+    rows = [slot for booking in missing for slot in _slot_rows(*booking, minutes)]
+    if rows:
+        table = BookingSlot.__table__
+        if session.get_bind().dialect.name == "mysql":
+            stmt = mysql.insert(table).prefix_with("IGNORE")
+        else:
+            stmt = sqlite.insert(table).on_conflict_do_nothing()
+        inserted = session.execute(stmt, rows).rowcount
+        session.commit()
+        if inserted != len(rows):
+            logger.warning(f"{len(rows) - inserted} booking slots already taken by overlapping bookings")
+        logger.info(f"Created booking slots for {len(missing)} bookings")
+    return len(missing)
+
+
+def prune_booking_slots(session, before):
+    """Elimina le fasce terminate prima di before (es. prenotazioni pending mai confermate)."""
+    step = timedelta(minutes=current_app.config["BOOKING_SLOT_MINUTES"])
+    result = session.execute(delete(BookingSlot).where(BookingSlot.slot_start < before - step))
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,177 @@
+"""
+Prenotazioni multiple sullo stesso posto: lista di intervalli o regola di ricorrenza.
+
+Le occorrenze vengono verificate con una query per blocco di al massimo
+CONFLICT_CHUNK occorrenze (join tra le occorrenze, come union di righe
+letterali, e le prenotazioni attive del posto) e quelle libere sono inserite in
+un'unica transazione.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, literal, select, union_all
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking
+from src.backend.models.booking import BookingStatus
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+
+FREQUENCIES = ("daily", "weekly")
+
+# occorrenze per query in find_conflicts: SQLite rifiuta union con piu' di 500
+# select (SQLITE_MAX_COMPOUND_SELECT) e, prima della 3.32, piu' di 999 parametri
+CONFLICT_CHUNK = 300
+
+
+def _parse_until(value):
+    """until come data (giorno incluso) o datetime (istante incluso) -> limite esclusivo."""
+    until = datetime.fromisoformat(value)
+    if len(value) == 10:
+        return until + timedelta(days=1)
+    return until + timedelta(microseconds=1)
+
+
+def expand_recurrence(rule, limit):
+    """
+    Occorrenze [(start, end)] di una regola:
+        {"start_time", "end_time"}  prima occorrenza
+        "frequency": daily | weekly, "interval": ogni quanti giorni/settimane (default 1)
+        "weekdays": per weekly, giorni della settimana 0=lunedi' (default quello di start_time)
+        "count" oppure "until" (data o datetime, incluso)
+    ValueError se la regola non e' valida o supera limit occorrenze.
+    """
+    try:
+        first_start = datetime.fromisoformat(rule["start_time"])
+        first_end = datetime.fromisoformat(rule["end_time"])
+    except KeyError as e:
+        raise ValueError(f"Missing recurrence field {e}") from e
+    if first_start >= first_end:
+        raise ValueError("Invalid time range")
+    duration = first_end - first_start
+
+    frequency = rule.get("frequency", "weekly")
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Invalid frequency, expected one of {list(FREQUENCIES)}")
+    interval = int(rule.get("interval", 1))
+    if interval < 1:
+        raise ValueError("interval must be >= 1")
+
+    count = rule.get("count")
+    until = _parse_until(rule["until"]) if rule.get("until") else None
+    if count is None and until is None:
+        raise ValueError("Recurrence needs count or until")
+    count = int(count) if count is not None else None
+
+    if frequency == "daily":
+        offsets = [timedelta(0)]
+        period = timedelta(days=interval)
+        origin = first_start
+    else:
+        weekdays = sorted({int(d) for d in rule.get("weekdays", [first_start.weekday()])})
+        if not weekdays or weekdays[0] < 0 or weekdays[-1] > 6:
+            raise ValueError("weekdays must be integers between 0 (Monday) and 6 (Sunday)")
+        offsets = [timedelta(days=d) for d in weekdays]
+        period = timedelta(weeks=interval)
+        origin = first_start - timedelta(days=first_start.weekday())
+
+    occurrences = []
+    k = 0
+    while True:
+        for offset in offsets:
+            start = origin + k * period + offset
+            if start < first_start:
+                continue
+            if (until is not None and start >= until) or (count is not None and len(occurrences) >= count):
+                return occurrences
+            if len(occurrences) >= limit:
+                raise ValueError(f"Recurrence expands to more than {limit} occurrences")
+            occurrences.append((start, start + duration))
+        k += 1
+
+
+def parse_intervals(intervals, limit):
+    """[{"start_time", "end_time"}] -> [(start, end)]; ValueError se non validi."""
+    if len(intervals) > limit:
+        raise ValueError(f"At most {limit} intervals per request")
+    occurrences = []
+    for item in intervals:
+        start = datetime.fromisoformat(item["start_time"])
+        end = datetime.fromisoformat(item["end_time"])
+        if start >= end:
+            raise ValueError("Invalid time range")
+        occurrences.append((start, end))
+    return occurrences
+
+
+def find_conflicts(seat_id, occurrences):
+    """
+    {indice occorrenza: [id prenotazioni attive sovrapposte]} con una query per
+    blocco di CONFLICT_CHUNK occorrenze. Le occorrenze diventano righe letterali
+    (idx, start, end) unite alle prenotazioni del posto sull'indice
+    (seat_id, status, start_time, end_time).
+    """
+    conflicts = {}
+    for offset in range(0, len(occurrences), CONFLICT_CHUNK):
+        chunk = occurrences[offset:offset + CONFLICT_CHUNK]
+        rows = union_all(*[
+            select(
+                literal(i).label("idx"),
+                literal(start, type_=db.DateTime).label("start_time"),
+                literal(end, type_=db.DateTime).label("end_time"),
+            )
+            for i, (start, end) in enumerate(chunk, start=offset)
+        ]).subquery("occurrences")
+
+        stmt = select(rows.c.idx, Booking.id).join(
+            Booking,
+            and_(
+                Booking.seat_id == seat_id,
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.start_time < rows.c.end_time,
+                Booking.end_time > rows.c.start_time,
+            ),
+        )
+        for idx, booking_id in db.session.execute(stmt):
+            conflicts.setdefault(idx, []).append(booking_id)
+    return conflicts
+
+
+def book_occurrences(user_id, seat_id, occurrences, all_or_nothing=False):
+    """
+    Crea le prenotazioni libere in un'unica transazione e restituisce un esito
+    per occorrenza. Le occorrenze sovrapposte tra loro: vince la prima.
+    Con all_or_nothing=True basta un conflitto per non creare nulla.
+    Il commit e' a carico del chiamante.
+    """
+    conflicts = find_conflicts(seat_id, occurrences)
+
+    accepted = []  # (start, end) gia' accettati nella richiesta
+    results = []
+    for i, (start, end) in enumerate(occurrences):
+        result = {"start_time": start.isoformat(), "end_time": end.isoformat()}
+        if i in conflicts:
+            result.update(status="conflict", conflicting_booking_ids=sorted(conflicts[i]))
+        elif any(s < end and e > start for s, e in accepted):
+            result.update(status="conflict", reason="Overlaps another occurrence of this request")
+        else:
+            result["status"] = "created"
+            accepted.append((start, end))
+        results.append(result)
+
+    if all_or_nothing and len(accepted) < len(occurrences):
+        for result in results:
+            if result["status"] == "created":
+                result["status"] = "skipped"
+        return results
+
+    bookings = [
+        Booking(user_id=user_id, seat_id=seat_id, start_time=start, end_time=end,
+                status=BookingStatus.PENDING_CHECKIN)
+        for start, end in accepted
+    ]
+    db.session.add_all(bookings)
+    db.session.flush()
+    created = iter(bookings)
+    for result in results:
+        if result["status"] == "created":
+            result["booking_id"] = next(created).id
+    return results
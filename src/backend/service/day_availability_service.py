@@ -0,0 +1,103 @@
+"""
+Griglia giornaliera posti x fasce per la UI di prenotazione.
+
+Ogni posto diventa un intero Python usato come bitset: il bit i e' a 1 se la
+fascia i del giorno (di slot_minutes minuti, da mezzanotte) interseca una
+prenotazione attiva. Le prenotazioni del giorno vengono dall'indice in memoria
+dei posti (o da un'unica query se disattivato) e ogni prenotazione e' un OR di
+una maschera di bit contigui.
+"""
+import base64
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import select
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Seat
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.seat_availability import seat_availability
+
+ENCODINGS = ("bitset", "rle")
+
+
+def _booked_intervals(seat_ids, day_start, day_end):
+    """{seat_id: [(start, end)]} delle prenotazioni attive che intersecano il giorno."""
+    index = seat_availability()
+    if index is not None:
+        return {sid: [(e.start, e.end) for e in index.between(sid, day_start, day_end)] for sid in seat_ids}
+
+    intervals = {sid: [] for sid in seat_ids}
+    rows = db.session.execute(
+        select(Booking.seat_id, Booking.start_time, Booking.end_time).where(
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < day_end,
+            Booking.end_time > day_start,
+        )
+    )
+    for seat_id, start, end in rows:
+        if seat_id in intervals:
+            intervals[seat_id].append((start, end))
+    return intervals
+
+
+def _mask(intervals, day_start, step, slots):
+    mask = 0
+    for start, end in intervals:
+        first = max(0, (start - day_start) // step)
+        last = min(slots, -(-(end - day_start) // step))  # fascia finale per eccesso
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+    return mask
+
+
+def encode_bitset(mask, slots):
+    """base64 dei byte del bitset, little-endian: la fascia i e' il bit i % 8 del byte i // 8."""
+    return base64.b64encode(mask.to_bytes((slots + 7) // 8, "little")).decode()
+
+
+def encode_rle(mask, slots):
+    """Lunghezze delle sequenze alternate libero/occupato, a partire da libero (eventualmente 0)."""
+    bits = format(mask, f"0{slots}b")[::-1]  # fascia 0 per prima
+    runs = [] if bits.startswith("0") else [0]
+    runs += [len(list(group)) for _, group in groupby(bits)]
+    return runs
+
+
+def booked_per_slot(masks, slots):
+    """Numero di posti occupati per fascia, scorrendo solo i bit a 1."""
+    counts = [0] * slots
+    for mask in masks:
+        while mask:
+            low = mask & -mask
+            counts[low.bit_length() - 1] += 1
+            mask ^= low
+    return counts
+
+
+def day_availability(day, slot_minutes, room_id=None, encoding="bitset", heatmap=False):
+    """Bitmap di occupazione per ogni posto attivo (della stanza) nel giorno day."""
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    step = timedelta(minutes=slot_minutes)
+    slots = int(timedelta(days=1) / step)
+
+    stmt = select(Seat.id).where(Seat.is_active.is_(True)).order_by(Seat.id)
+    if room_id is not None:
+        stmt = stmt.where(Seat.room_id == room_id)
+    seat_ids = list(db.session.scalars(stmt))
+
+    intervals = _booked_intervals(seat_ids, day_start, day_end)
+    masks = {sid: _mask(intervals[sid], day_start, step, slots) for sid in seat_ids}
+
+    encode = encode_rle if encoding == "rle" else encode_bitset
+    result = {
+        "date": day.isoformat(),
+        "slot_minutes": slot_minutes,
+        "slots": slots,
+        "encoding": encoding,
+        "seats": {str(sid): encode(mask, slots) for sid, mask in masks.items()},
+    }
+    if heatmap:
+        result["booked_per_slot"] = booked_per_slot(masks.values(), slots)
+    return result
@@ -0,0 +1,201 @@
+"""
+Registro in memoria dei dispositivi IoT (tabella devices) e heartbeat last_seen.
+
+L'ingest risolve device_id -> posto con un lookup in un dizionario invece di
+una query. Il registro viene ricaricato alla prima richiesta dopo un commit che
+crea, modifica o elimina un Device (eventi di sessione). Un device_id non
+registrato viene trattato come id del posto, come prima dell'introduzione del
+registro, con un warning (una volta per device).
+
+Ogni lettura (/seat-occupancy, /temperatures con device_id) aggiorna last_seen
+solo in memoria; il job device_heartbeats scrive gli ultimi valori con un UPDATE
+bulk ogni DEVICE_HEARTBEAT_FLUSH_SECONDS e ricarica il registro, cosi' vede
+anche gli heartbeat degli altri processi. Tra i device stale compaiono solo i
+sensori (HEARTBEAT_DEVICE_TYPES): gli attuatori non inviano letture.
+"""
+import threading
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update
+
+from src.backend.common.extensions import db
+from src.backend.common.logger import logger
+from src.backend.models import Device
+
+DeviceInfo = namedtuple("DeviceInfo", "id device_type room_id seat_id last_seen")
+
+# tipi di device che inviano letture (quindi heartbeat): gli attuatori non compaiono tra gli stale
+HEARTBEAT_DEVICE_TYPES = ("seat_sensor", "temperature_sensor")
+
+_PENDING_KEY = "device_registry_changed"
+
+
+class DeviceRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = None  # device_id -> DeviceInfo; None = da (ri)caricare
+        self._heartbeats = {}  # device_id -> ultimo last_seen non ancora scritto
+        self._warned = set()
+
+    def load(self, rows):
+        """Sostituisce il contenuto con rows: (id, device_type, room_id, seat_id, last_seen)."""
+        with self._lock:
+            devices = {}
+            for row in rows:
+                info = DeviceInfo(*row)
+                pending = self._heartbeats.get(info.id)
+                if pending is not None and (info.last_seen is None or pending > info.last_seen):
+                    info = info._replace(last_seen=pending)
+                devices[info.id] = info
+            self._devices = devices
+        return len(devices)
+
+    @property
+    def loaded(self):
+        return self._devices is not None
+
+    def invalidate(self):
+        with self._lock:
+            self._devices = None
+
+    def get(self, device_id):
+        devices = self._devices
+        return devices.get(device_id) if devices is not None else None
+
+    def touch(self, device_id, ts):
+        """Registra un heartbeat; i device sconosciuti vengono ignorati."""
+        with self._lock:
+            if self._devices is None or device_id not in self._devices:
+                return
+            info = self._devices[device_id]
+            if info.last_seen is None or ts > info.last_seen:
+                self._devices[device_id] = info._replace(last_seen=ts)
+                self._heartbeats[device_id] = ts
+
+    def drain(self):
+        """{device_id: last_seen} degli heartbeat da scrivere, svuotando il buffer."""
+        with self._lock:
+            pending, self._heartbeats = self._heartbeats, {}
+        return pending
+
+    def restore(self, pending):
+        """Rimette nel buffer heartbeat non scritti (es. flush fallito)."""
+        with self._lock:
+            for device_id, ts in pending.items():
+                current = self._heartbeats.get(device_id)
+                if current is None or ts > current:
+                    self._heartbeats[device_id] = ts
+
+    def stale(self, before, device_types=HEARTBEAT_DEVICE_TYPES):
+        """DeviceInfo dei device di device_types mai visti o con last_seen precedente a before."""
+        devices = self._devices or {}
+        return sorted(
+            (info for info in devices.values()
+             if info.device_type in device_types and (info.last_seen is None or info.last_seen < before)),
+            key=lambda info: info.id,
+        )
+
+    def warn_once(self, device_id):
+        if device_id in self._warned:
+            return False
+        self._warned.add(device_id)
+        return True
+
+    def __len__(self):
+        return len(self._devices or {})
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_device_registry(app, db):
+    app.extensions["device_registry"] = DeviceRegistry()
+    for name, listener in (("after_flush", _collect_changes),
+                           ("after_commit", _apply_changes),
+                           ("after_rollback", _discard_changes)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def device_registry():
+    """Registro caricato (alla prima richiesta dopo un'invalidazione)."""
+    registry = current_app.extensions.get("device_registry")
+    if registry is not None and not registry.loaded:
+        registry.load(_read_devices(db.session))
+    return registry
+
+
+def _read_devices(session):
+    return session.execute(
+        select(Device.id, Device.device_type, Device.room_id, Device.seat_id, Device.last_seen)
+    ).all()
+
+
+def load_device_registry(session):
+    registry = current_app.extensions.get("device_registry")
+    if registry is None:
+        return 0
+    loaded = registry.load(_read_devices(session))
+    logger.info(f"Device registry loaded with {loaded} devices")
+    return loaded
+
+
+def resolve_device(device_id):
+    """(id del Device registrato o None, seat_id) per la lettura di un sensore di seduta."""
+    registry = device_registry()
+    info = registry.get(device_id) if registry is not None else None
+    if info is not None:
+        return info.id, info.seat_id
+    if registry is not None and registry.warn_once(device_id):
+        logger.warning(f"Device {device_id} is not registered: using it as seat id")
+    return None, device_id
+
+
+def record_heartbeats(device_ids, ts):
+    registry = device_registry()
+    if registry is None:
+        return
+    for device_id in device_ids:
+        registry.touch(device_id, ts)
+
+
+def flush_heartbeats(session):
+    """Scrive gli heartbeat accumulati con un UPDATE bulk per chiave primaria e ricarica il registro."""
+    registry = current_app.extensions.get("device_registry")
+    if registry is None:
+        return 0
+    pending = registry.drain()
+    if pending:
+        try:
+            session.execute(update(Device), [
+                {"id": device_id, "last_seen": ts} for device_id, ts in pending.items()
+            ])
+            session.commit()
+        except Exception:
+            session.rollback()
+            registry.restore(pending)
+            raise
+    registry.load(_read_devices(session))
+    return len(pending)
+
+
+def stale_devices(before):
+    registry = device_registry()
+    return registry.stale(before) if registry is not None else []
+
+
+def _collect_changes(session, flush_context):
+    if any(isinstance(obj, Device) for obj in session.new | session.dirty | session.deleted):
+        session.info[_PENDING_KEY] = True
+
+
+def _apply_changes(session):
+    if not session.info.pop(_PENDING_KEY, False) or not has_app_context():
+        return
+    registry = current_app.extensions.get("device_registry")
+    if registry is not None:
+        registry.invalidate()
+
+
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,147 @@
+"""
+Evacuazione di una sala (o di un insieme di posti): spostamento di tutte le
+prenotazioni attive della finestra su posti liberi di altre sale.
+
+Il piano e' un'assegnazione greedy per intervalli: le prenotazioni, in ordine
+di inizio, vanno sul primo posto libero della classifica del posto di origine
+(stesso piano prima, poi score di suggerimento piu' vicino). La disponibilita'
+dei posti di destinazione e' tenuta in un SeatAvailabilityIndex locale caricato
+con un'unica query e aggiornato a ogni assegnazione, cosi' il piano non crea
+sovrapposizioni. L'applicazione avviene in un'unica transazione con le email
+accodate nella outbox.
+"""
+from collections import namedtuple
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased
+
+from src.backend.common.extensions import db
+from src.backend.common.labels import EMAIL_BOOKING_EVACUATED
+from src.backend.models import Booking, Room, Seat, User
+from src.backend.notification.mail import queue_email
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.seat_availability import SeatAvailabilityIndex
+from src.backend.service.seat_search_service import latest_scores
+from src.backend.service.waitlist_service import exclude_from_waitlist
+
+Assignment = namedtuple("Assignment", "booking_id user_id old_seat_id new_seat_id start_time end_time")
+
+_SeatInfo = namedtuple("_SeatInfo", "seat_id room_id floor")
+
+
+class EvacuationConflict(Exception):
+    """Un posto di destinazione e' stato prenotato tra il calcolo del piano e il commit."""
+
+
+def _seat_info(stmt):
+    return {row[0]: _SeatInfo._make(row) for row in db.session.execute(stmt)}
+
+
+def plan_evacuation(source_seat_ids, start, end):
+    """
+    Restituisce (assegnazioni, id delle prenotazioni senza posto libero) per le
+    prenotazioni attive dei posti di origine che si sovrappongono a [start, end).
+    """
+    source_seat_ids = set(source_seat_ids)
+    bookings = db.session.execute(
+        select(Booking.id, Booking.user_id, Booking.seat_id, Booking.start_time, Booking.end_time).where(
+            Booking.seat_id.in_(source_seat_ids),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < end,
+            Booking.end_time > start,
+        ).order_by(Booking.start_time, Booking.id)
+    ).all()
+    if not bookings:
+        return [], []
+
+    seat_columns = select(Seat.id, Seat.room_id, Room.floor).join(Room, Room.id == Seat.room_id)
+    sources = _seat_info(seat_columns.where(Seat.id.in_(source_seat_ids)))
+    source_rooms = {info.room_id for info in sources.values()}
+    targets = [
+        info for info in _seat_info(seat_columns.where(Seat.is_active.is_(True))).values()
+        if info.seat_id not in source_seat_ids and info.room_id not in source_rooms
+    ]
+
+    # occupazione dei posti nell'intervallo coperto dalle prenotazioni da spostare
+    envelope_start = min(b.start_time for b in bookings)
+    envelope_end = max(b.end_time for b in bookings)
+    busy = SeatAvailabilityIndex()
+    busy.load(db.session.execute(
+        select(Booking.id, Booking.seat_id, Booking.start_time, Booking.end_time, Booking.status).where(
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < envelope_end,
+            Booking.end_time > envelope_start,
+        )
+    ))
+
+    scores = latest_scores()
+    rankings = {}
+    for seat_id in {b.seat_id for b in bookings}:
+        origin = sources.get(seat_id)
+        floor = origin.floor if origin else None
+        score = scores.get(seat_id) or 0.0
+        rankings[seat_id] = sorted(
+            targets,
+            key=lambda t: (t.floor != floor, abs((scores.get(t.seat_id) or 0.0) - score), t.seat_id),
+        )
+
+    assignments, unassigned = [], []
+    for b in bookings:
+        for target in rankings[b.seat_id]:
+            if busy.overlapping(target.seat_id, b.start_time, b.end_time) is None:
+                busy.upsert(b.id, target.seat_id, b.start_time, b.end_time, ACTIVE_STATUSES[0])
+                assignments.append(Assignment(b.id, b.user_id, b.seat_id, target.seat_id, b.start_time, b.end_time))
+                break
+        else:
+            unassigned.append(b.id)
+    return assignments, unassigned
+
+
+def apply_evacuation(assignments, reason):
+    """
+    Sposta le prenotazioni del piano e accoda le email, senza commit (lo fa il chiamante).
+    EvacuationConflict se dopo il flush un posto di destinazione risulta sovrapposto.
+    """
+    if not assignments:
+        return
+    by_id = {a.booking_id: a for a in assignments}
+    # i posti evacuati restano vuoti: niente riassegnazione dalla lista d'attesa
+    exclude_from_waitlist(db.session, {a.old_seat_id for a in assignments})
+    for booking in Booking.query.filter(Booking.id.in_(by_id)).all():
+        booking.seat_id = by_id[booking.id].new_seat_id
+    db.session.flush()
+
+    # verifica sul db, in un'unica query, che nessuno abbia prenotato i posti nel frattempo
+    other = aliased(Booking)
+    clash = db.session.execute(
+        select(Booking.id, other.id).join(other, and_(
+            other.seat_id == Booking.seat_id,
+            other.id != Booking.id,
+            other.status.in_(ACTIVE_STATUSES),
+            other.start_time < Booking.end_time,
+            other.end_time > Booking.start_time,
+        )).where(Booking.id.in_(by_id)).limit(1)
+    ).first()
+    if clash:
+        raise EvacuationConflict(f"Booking {clash[0]} overlaps booking {clash[1]} on the target seat")
+
+    seat_ids = {a.old_seat_id for a in assignments} | {a.new_seat_id for a in assignments}
+    rooms = dict(db.session.execute(select(Seat.id, Seat.room_id).where(Seat.id.in_(seat_ids))).all())
+    emails = dict(db.session.execute(
+        select(User.id, User.email).where(User.id.in_({a.user_id for a in assignments}))
+    ).all())
+    for a in assignments:
+        if not emails.get(a.user_id):
+            continue
+        queue_email(
+            subject=EMAIL_BOOKING_EVACUATED["subject"],
+            body=EMAIL_BOOKING_EVACUATED["body"].format(
+                start_time=a.start_time.strftime("%d/%m/%Y %H:%M"),
+                old_seat=a.old_seat_id,
+                old_room=rooms.get(a.old_seat_id),
+                new_seat=a.new_seat_id,
+                new_room=rooms.get(a.new_seat_id),
+                reason=reason,
+            ),
+            recipients=[emails[a.user_id]],
+        )
@@ -0,0 +1,111 @@
+"""
+Export dello storico per analisi offline.
+
+Ogni dataset restituisce (colonne, iteratore di righe). Le righe vengono lette
+da read_session con yield_per (cursore lato server su MySQL, fetch a blocchi
+su SQLite) e serializzate una alla volta: la memoria usata non dipende dal
+numero di righe esportate e la lettura non tiene lock di scrittura.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from src.backend.common.storage import read_session
+from src.backend.models import EnergyCommand, SeatSuggestion
+from src.backend.service.archive_service import (BOOKING_COLUMNS, READING_COLUMNS, booking_history,
+                                                 temperature_history)
+from src.backend.service.temperature_service import temperature_store
+
+EXPORT_FORMATS = ("ndjson", "csv")
+ENERGY_COMMAND_COLUMNS = ("id", "room_id", "command_type", "value", "issued_by", "timestamp")
+SUGGESTION_COLUMNS = ("id", "seat_id", "date", "score", "is_recommended", "reason", "created_at")
+
+BATCH_SIZE = 1000
+
+
+def _stream(stmt):
+    return read_session.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+
+
+def export_bookings(start=None, end=None, room_id=None):
+    """Prenotazioni calde e archiviate con start_time in [start, end]."""
+    history = booking_history(start, end)
+    return BOOKING_COLUMNS, _stream(select(*[history.c[c] for c in BOOKING_COLUMNS]))
+
+
+def export_temperature_readings(start=None, end=None, room_id=None):
+    """Letture di temperatura (timestamp UTC), dal database o dallo store time-series."""
+    store = temperature_store()
+    if store is not None:
+        rows = ((None, rid, value, ts) for rid, ts, value in store.iter_readings(start, end, room_id))
+        return READING_COLUMNS, rows
+    history = temperature_history(start, end, room_id)
+    return READING_COLUMNS, _stream(select(*[history.c[c] for c in READING_COLUMNS]))
+
+
+def export_energy_commands(start=None, end=None, room_id=None):
+    stmt = select(*[getattr(EnergyCommand, c) for c in ENERGY_COMMAND_COLUMNS])
+    if start is not None:
+        stmt = stmt.where(EnergyCommand.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(EnergyCommand.timestamp <= end)
+    if room_id is not None:
+        stmt = stmt.where(EnergyCommand.room_id == room_id)
+    return ENERGY_COMMAND_COLUMNS, _stream(stmt)
+
+
+def export_suggestions(start=None, end=None, room_id=None):
+    """Suggerimenti con date in [start, end] (solo la parte data)."""
+    stmt = select(*[getattr(SeatSuggestion, c) for c in SUGGESTION_COLUMNS])
+    if start is not None:
+        stmt = stmt.where(SeatSuggestion.date >= start.date())
+    if end is not None:
+        stmt = stmt.where(SeatSuggestion.date <= end.date())
+    return SUGGESTION_COLUMNS, _stream(stmt)
+
+
+EXPORTS = {
+    "bookings": export_bookings,
+    "temperature-readings": export_temperature_readings,
+    "energy-commands": export_energy_commands,
+    "suggestions": export_suggestions,
+}
+
+
+def _value(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def ndjson_lines(columns, rows):
+    """Un oggetto JSON per riga, emessi a blocchi di BATCH_SIZE righe."""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps({c: _value(v) for c, v in zip(columns, row)}))
+        if len(chunk) >= BATCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def csv_lines(columns, rows):
+    """Intestazione e righe CSV, emesse a blocchi di BATCH_SIZE righe."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_value(v) for v in row])
+        pending += 1
+        if pending >= BATCH_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if buf.tell():
+        yield buf.getvalue()
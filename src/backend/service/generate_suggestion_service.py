@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
 from sqlalchemy import func
 from src.backend.common.extensions import db
+from src.backend.common.storage import read_session
+from src.backend.service.archive_service import booking_history
+from src.backend.service.temperature_service import temperature_summary
 from src.backend.models.seat_suggestion import SeatSuggestion
-from src.backend.models import Seat, Booking, Room, TemperatureReading, RoomEnergyState
+from src.backend.models import Seat, Room, RoomEnergyState
 
 
 def _parse_payload_date_hour(payload):
@@ -37,6 +40,8 @@ def _generate_suggestions_service(payload: dict):
       - top_n: how many to mark as is_recommended (default 10)
       - recent_weight: blend recent vs annual (default 0.7)
     Returns list of SeatSuggestion objects created.
+    History is read through read_session; only the SeatSuggestion
+    delete/insert goes through db.session.
     """
     now = datetime.utcnow()
     payload = payload or {}
@@ -51,7 +56,7 @@ def _generate_suggestions_service(payload: dict):
     # remove old suggestions for the same date to avoid duplicates
     db.session.query(SeatSuggestion).filter(SeatSuggestion.date == target_date).delete(synchronize_session=False)
 
-    seats = Seat.query.filter_by(is_active=True).all()
+    seats = read_session.query(Seat).filter_by(is_active=True).all()
     suggestions = []
 
     # normalizers
@@ -62,46 +67,44 @@ def _generate_suggestions_service(payload: dict):
     target_weekday_sqlite = (target_date.weekday() + 1) % 7
     hh = f"{target_hour:02d}"
 
-    for seat in seats:
-        # OCCUPANCY - recent
+    # booking history (hot + archived partitions), one grouped query per window
+    def _occupancy_counts(since):
+        history = booking_history(since=since)
         try:
-            occ_recent = db.session.query(func.count(Booking.id)).filter(
-                Booking.seat_id == seat.id,
-                Booking.start_time >= window_start_recent,
-                func.strftime('%w', Booking.start_time) == str(target_weekday_sqlite),
-                func.strftime('%H', Booking.start_time) == hh
-            ).scalar() or 0
+            rows = read_session.query(history.c.seat_id, func.count(history.c.id)).filter(
+                func.strftime('%w', history.c.start_time) == str(target_weekday_sqlite),
+                func.strftime('%H', history.c.start_time) == hh
+            ).group_by(history.c.seat_id).all()
         except Exception:
-            occ_recent = db.session.query(func.count(Booking.id)).filter(
-                Booking.seat_id == seat.id,
-                Booking.start_time >= window_start_recent
-            ).scalar() or 0
+            rows = read_session.query(history.c.seat_id, func.count(history.c.id)).group_by(
+                history.c.seat_id
+            ).all()
+        return dict(rows)
+
+    recent_counts = _occupancy_counts(window_start_recent)
+    annual_counts = _occupancy_counts(window_start_annual)
+
+    # COMFORT input: 30-day average temperature per room
+    temp_window_days = 30
+    temp_threshold = now - timedelta(days=temp_window_days)
+    avg_temps = {
+        room_id: summary["avg"]
+        for room_id, summary in temperature_summary(temp_threshold, now, by_room=True).items()
+    }
+
+    for seat in seats:
+        # OCCUPANCY - recent
+        occ_recent = recent_counts.get(seat.id, 0)
         prob_recent = min(1.0, float(occ_recent) / weeks_recent)
 
         # OCCUPANCY - annual
-        try:
-            occ_annual = db.session.query(func.count(Booking.id)).filter(
-                Booking.seat_id == seat.id,
-                Booking.start_time >= window_start_annual,
-                func.strftime('%w', Booking.start_time) == str(target_weekday_sqlite),
-                func.strftime('%H', Booking.start_time) == hh
-            ).scalar() or 0
-        except Exception:
-            occ_annual = db.session.query(func.count(Booking.id)).filter(
-                Booking.seat_id == seat.id,
-                Booking.start_time >= window_start_annual
-            ).scalar() or 0
+        occ_annual = annual_counts.get(seat.id, 0)
         prob_annual = min(1.0, float(occ_annual) / weeks_annual)
 
         occupancy_probability = recent_weight * prob_recent + (1 - recent_weight) * prob_annual
 
         # COMFORT
-        temp_window_days = 30
-        temp_threshold = now - timedelta(days=temp_window_days)
-        avg_temp = db.session.query(func.avg(TemperatureReading.temperature)).filter(
-            TemperatureReading.room_id == seat.room_id,
-            TemperatureReading.timestamp >= temp_threshold
-        ).scalar()
+        avg_temp = avg_temps.get(seat.room_id)
         if avg_temp is None:
             comfort_score = 0.5
         else:
@@ -114,7 +117,7 @@ def _generate_suggestions_service(payload: dict):
                 ideal = 22.0
             comfort_score = max(0.0, 1.0 - (abs(avg_temp - ideal) / 10.0))
             try:
-                room = Room.query.get(seat.room_id)
+                room = read_session.get(Room, seat.room_id)
                 if room and room.sun_exposure:
                     exposure_penalty = {"south":0.15, "west":0.10, "east":0.05, "north":0.0}
                     comfort_score = max(0.0, comfort_score - exposure_penalty.get(room.sun_exposure.lower(), 0.0))
@@ -122,7 +125,7 @@ def _generate_suggestions_service(payload: dict):
                 pass
 
         # ENERGY COST
-        state = RoomEnergyState.query.filter_by(room_id=seat.room_id).first()
+        state = read_session.query(RoomEnergyState).filter_by(room_id=seat.room_id).first()
         if state and (state.lights_on or state.ac_on):
             energy_cost = 0.1 if occupancy_probability > 0.6 else 0.4
         else:
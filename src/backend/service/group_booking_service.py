@@ -0,0 +1,176 @@
+"""
+Prenotazione di gruppo: N posti liberi a due a due adiacenti nella stessa sala.
+
+Il grafo di adiacenza di una sala (posti con coordinate a distanza non
+superiore a adjacency_radius) e' costruito con una griglia di celle di lato pari
+al raggio, cosi' ogni posto si confronta solo con quelli delle 9 celle vicine,
+e resta in cache finche' posizioni e raggio non cambiano.
+
+Per la finestra richiesta si tolgono i posti occupati (indice in memoria dei
+posti o un'unica query) e si cerca una clique di N posti liberi: prima si
+eliminano ripetutamente i posti con meno di N-1 vicini liberi (k-core), poi una
+ricerca in profondita' estende il gruppo solo con i vicini comuni e abbandona
+un ramo appena gruppo + candidati < N.
+"""
+import math
+import threading
+
+from flask import current_app
+from sqlalchemy import select
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Room, Seat
+from src.backend.models.booking import BookingStatus
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.seat_availability import seat_availability
+
+_graph_cache = {}
+_graph_lock = threading.Lock()
+
+
+class GroupBookingConflict(Exception):
+    """Uno dei posti del gruppo e' stato prenotato tra la ricerca e il commit."""
+
+
+def build_adjacency(positions, radius):
+    """{seat_id: set(seat_id adiacenti)} per posizioni {seat_id: (x, y)}."""
+    graph = {seat_id: set() for seat_id in positions}
+    if radius <= 0:
+        return graph
+    cells = {}
+    for seat_id, (x, y) in positions.items():
+        cells.setdefault((math.floor(x / radius), math.floor(y / radius)), []).append(seat_id)
+
+    for (cx, cy), members in cells.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in cells.get((cx + dx, cy + dy), ()):
+                    for seat_id in members:
+                        if other <= seat_id:
+                            continue
+                        (x1, y1), (x2, y2) = positions[seat_id], positions[other]
+                        if math.hypot(x1 - x2, y1 - y2) <= radius:
+                            graph[seat_id].add(other)
+                            graph[other].add(seat_id)
+    return graph
+
+
+def room_adjacency(room_id):
+    """Grafo di adiacenza dei posti attivi con coordinate della sala, dalla cache se invariato."""
+    radius = db.session.scalar(select(Room.adjacency_radius).where(Room.id == room_id))
+    radius = radius or current_app.config.get("SEAT_ADJACENCY_RADIUS", 1.5)
+    rows = db.session.execute(
+        select(Seat.id, Seat.pos_x, Seat.pos_y).where(
+            Seat.room_id == room_id,
+            Seat.is_active.is_(True),
+            Seat.pos_x.is_not(None),
+            Seat.pos_y.is_not(None),
+        ).order_by(Seat.id)
+    ).all()
+    key = (radius, tuple(rows))
+    cached = _graph_cache.get(room_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    graph = build_adjacency({seat_id: (x, y) for seat_id, x, y in rows}, radius)
+    with _graph_lock:
+        _graph_cache[room_id] = (key, graph)
+    return graph
+
+
+def _busy_seats(seat_ids, start, end):
+    index = seat_availability()
+    if index is not None:
+        return {seat_id for seat_id in seat_ids if index.overlapping(seat_id, start, end) is not None}
+    return set(db.session.scalars(
+        select(Booking.seat_id).distinct().where(
+            Booking.seat_id.in_(seat_ids),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < end,
+            Booking.end_time > start,
+        )
+    ))
+
+
+def _k_core(graph, nodes, k):
+    """Sottoinsieme di nodes in cui ogni posto ha almeno k vicini nel sottoinsieme."""
+    nodes = set(nodes)
+    degree = {v: len(graph[v] & nodes) for v in nodes}
+    stack = [v for v in nodes if degree[v] < k]
+    while stack:
+        v = stack.pop()
+        if v not in nodes:
+            continue
+        nodes.discard(v)
+        for u in graph[v] & nodes:
+            degree[u] -= 1
+            if degree[u] == k - 1:
+                stack.append(u)
+    return nodes
+
+
+def _extend(graph, group, candidates, size):
+    if len(group) == size:
+        return group
+    for v in sorted(candidates):
+        if len(group) + len(candidates) < size:
+            return None
+        found = _extend(graph, group + [v], candidates & graph[v], size)
+        if found:
+            return found
+        candidates = candidates - {v}
+    return None
+
+
+def find_clique(graph, free, size):
+    """Primo gruppo (in ordine di id) di size posti di free a due a due adiacenti, oppure None."""
+    nodes = _k_core(graph, free, size - 1)
+    if len(nodes) < size:
+        return None
+    sub = {v: graph[v] & nodes for v in nodes}
+    return _extend(sub, [], set(nodes), size)
+
+
+def find_group(size, start, end, room_id=None, floor=None):
+    """(room_id, [seat_id]) del primo gruppo libero in [start, end) tra le sale, oppure None."""
+    stmt = select(Room.id).order_by(Room.id)
+    if room_id is not None:
+        stmt = stmt.where(Room.id == room_id)
+    if floor is not None:
+        stmt = stmt.where(Room.floor == floor)
+
+    for rid in db.session.scalars(stmt).all():
+        graph = room_adjacency(rid)
+        if len(graph) < size:
+            continue
+        free = set(graph) - _busy_seats(list(graph), start, end)
+        group = find_clique(graph, free, size)
+        if group:
+            return rid, group
+    return None
+
+
+def book_group(user_ids, seat_ids, start, end):
+    """
+    Crea una prenotazione per posto (user_ids[i] sul posto seat_ids[i]) senza commit.
+    GroupBookingConflict se uno dei posti risulta gia' prenotato nella finestra.
+    """
+    taken = db.session.scalar(
+        select(Booking.seat_id).where(
+            Booking.seat_id.in_(seat_ids),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time < end,
+            Booking.end_time > start,
+        ).limit(1)
+    )
+    if taken is not None:
+        raise GroupBookingConflict(f"Seat {taken} already booked in this time range")
+
+    bookings = [
+        Booking(user_id=user_id, seat_id=seat_id, start_time=start, end_time=end,
+                status=BookingStatus.PENDING_CHECKIN)
+        for user_id, seat_id in zip(user_ids, seat_ids)
+    ]
+    db.session.add_all(bookings)
+    db.session.flush()
+    return bookings
@@ -0,0 +1,94 @@
+"""
+Statement pre-costruiti per le query eseguite a ogni richiesta.
+
+Ogni statement e' costruito una sola volta all'import con parametri legati
+(bindparam): a ogni chiamata non si ricostruisce l'albero della query, la
+cache key dello statement e' memorizzata e la forma compilata viene presa
+dalla cache dell'engine; cambiano solo i valori dei parametri.
+(lambda_stmt e' stato misurato piu' lento con l'ORM: rifa' il traversal
+dello statement a ogni esecuzione, vedi scripts/bench_hot_queries.py.)
+"""
+from sqlalchemy import and_, bindparam, select
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Seat, User
+from src.backend.models.booking import BookingStatus
+
+ACTIVE_STATUSES = (BookingStatus.PENDING_CHECKIN, BookingStatus.CONFIRMED)
+
+_USER_BY_USERNAME = select(User).where(User.username == bindparam("username")).limit(1)
+
+_BOOKING_AT = select(Booking).where(
+    Booking.seat_id == bindparam("seat_id"),
+    Booking.status == bindparam("status"),
+    Booking.start_time <= bindparam("at"),
+    Booking.end_time >= bindparam("at"),
+).limit(1)
+
+_USER_PENDING_BOOKING = select(Booking).where(
+    Booking.user_id == bindparam("user_id"),
+    Booking.seat_id == bindparam("seat_id"),
+    Booking.status == BookingStatus.PENDING_CHECKIN,
+    Booking.start_time <= bindparam("at"),
+    Booking.end_time >= bindparam("at"),
+).limit(1)
+
+_OVERLAPPING_BOOKING = select(Booking).where(
+    Booking.seat_id == bindparam("seat_id"),
+    Booking.status.in_(ACTIVE_STATUSES),
+    Booking.start_time < bindparam("end_time"),
+    Booking.end_time > bindparam("start_time"),
+).limit(1)
+
+_SEATS_WITH_CURRENT_BOOKING = select(
+    Seat.id, Seat.room_id, Seat.is_active, Seat.is_occupied, Booking.status,
+).outerjoin(
+    Booking,
+    and_(
+        Seat.id == Booking.seat_id,
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.start_time <= bindparam("at"),
+        Booking.end_time >= bindparam("at"),
+    ),
+)
+
+
+def user_by_username(username):
+    return db.session.scalars(_USER_BY_USERNAME, {"username": username}).first()
+
+
+def booking_at(seat_id, status, at):
+    """Prenotazione del posto nello stato indicato che copre l'istante at."""
+    return db.session.scalars(_BOOKING_AT, {"seat_id": seat_id, "status": status, "at": at}).first()
+
+
+def active_booking(seat_id, at):
+    """Prenotazione CONFIRMED in corso sul posto."""
+    return booking_at(seat_id, BookingStatus.CONFIRMED, at)
+
+
+def pending_booking(seat_id, at):
+    """Prenotazione in attesa di check-in in corso sul posto."""
+    return booking_at(seat_id, BookingStatus.PENDING_CHECKIN, at)
+
+
+def user_pending_booking(user_id, seat_id, at):
+    """Prenotazione dell'utente sul posto in attesa di check-in e in corso."""
+    return db.session.scalars(
+        _USER_PENDING_BOOKING, {"user_id": user_id, "seat_id": seat_id, "at": at}
+    ).first()
+
+
+def overlapping_booking(seat_id, start_time, end_time):
+    """Prima prenotazione attiva del posto che si sovrappone a [start_time, end_time)."""
+    return db.session.scalars(
+        _OVERLAPPING_BOOKING, {"seat_id": seat_id, "start_time": start_time, "end_time": end_time}
+    ).first()
+
+
+def seats_with_current_booking(at):
+    """
+    (seat id, room_id, is_active, is_occupied, stato della prenotazione attiva
+    in at oppure None) per tutti i posti.
+    """
+    return db.session.execute(_SEATS_WITH_CURRENT_BOOKING, {"at": at}).all()
@@ -0,0 +1,155 @@
+"""
+Filtro delle letture di occupazione prima della macchina a stati delle prenotazioni.
+
+I sensori reinviano spesso lo stesso is_occupied: per ogni device si tiene in
+memoria l'ultimo stato applicato insieme alla prenotazione in corso in quel
+momento (dall'indice dei posti). Una lettura uguale allo stato noto, con la
+stessa prenotazione in corso, non tocca il database ("unchanged"); dopo
+OCCUPANCY_STATE_TTL_SECONDS una lettura passa comunque, cosi' un altro processo
+o una modifica fatta altrove non lasciano lo stato in memoria disallineato a lungo.
+
+Con OCCUPANCY_DEBOUNCE_SECONDS > 0 un cambio di stato viene applicato solo se
+resta stabile per tutta la finestra ("deferred" fino ad allora): un
+occupato/libero/occupato rapido si annulla senza rilasciare la prenotazione. I
+cambi rimasti in attesa senza nuove letture li applica il job occupancy_debounce.
+Lo stato e' per processo; OCCUPANCY_DEDUP=false disattiva il filtro.
+"""
+import threading
+from collections import namedtuple
+from datetime import timedelta
+
+from flask import current_app
+
+from src.backend.common.extensions import db
+from src.backend.common.logger import logger
+from src.backend.service.device_registry import resolve_device
+from src.backend.service.occupancy_service import apply_occupancy
+from src.backend.service.seat_availability import seat_availability
+
+# esito del filtro per ogni lettura
+APPLY = "apply"
+UNCHANGED = "unchanged"
+DEFERRED = "deferred"
+
+_Known = namedtuple("_Known", "value booking applied_at")
+
+
+class OccupancyFilter:
+    def __init__(self, debounce_seconds=0, ttl_seconds=60):
+        self.debounce = timedelta(seconds=debounce_seconds)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._known = {}  # device_id -> _Known
+        self._pending = {}  # device_id -> (valore, prima lettura del cambio)
+
+    def admit(self, device_id, value, now, booking=None):
+        """APPLY, UNCHANGED o DEFERRED per la lettura; con APPLY lo stato noto diventa value."""
+        with self._lock:
+            known = self._known.get(device_id)
+            if known is not None and value != known.value and self.debounce:
+                pending = self._pending.get(device_id)
+                if pending is None or pending[0] != value:
+                    self._pending[device_id] = (value, now)
+                    return DEFERRED
+                if now - pending[1] < self.debounce:
+                    return DEFERRED
+            elif (known is not None and value == known.value and booking == known.booking
+                  and now - known.applied_at < self.ttl):
+                # lettura ripetuta: annulla anche un cambio in attesa (flip-flop)
+                self._pending.pop(device_id, None)
+                return UNCHANGED
+            self._pending.pop(device_id, None)
+            self._known[device_id] = _Known(value, booking, now)
+            return APPLY
+
+    def settle(self, now, booking_of=None):
+        """[(device_id, valore)] dei cambi stabili da almeno la finestra, segnati come applicati."""
+        settled = []
+        with self._lock:
+            for device_id, (value, since) in list(self._pending.items()):
+                if now - since < self.debounce:
+                    continue
+                del self._pending[device_id]
+                booking = booking_of(device_id, now) if booking_of else None
+                self._known[device_id] = _Known(value, booking, now)
+                settled.append((device_id, value))
+        return settled
+
+    def forget(self, device_ids):
+        """Dimentica i device (es. lettura fallita o rollback): la prossima lettura passa."""
+        with self._lock:
+            for device_id in device_ids:
+                self._known.pop(device_id, None)
+                self._pending.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._known.clear()
+            self._pending.clear()
+
+    def __len__(self):
+        return len(self._known)
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_occupancy_filter(app):
+    if not app.config.get("OCCUPANCY_DEDUP", True):
+        return
+    app.extensions["occupancy_filter"] = OccupancyFilter(
+        app.config["OCCUPANCY_DEBOUNCE_SECONDS"],
+        app.config["OCCUPANCY_STATE_TTL_SECONDS"],
+    )
+
+
+def occupancy_filter():
+    """Filtro attivo, oppure None se disattivato."""
+    return current_app.extensions.get("occupancy_filter")
+
+
+def _booking_of(device_id, now):
+    """(booking_id, status) della prenotazione in corso sul posto del device secondo l'indice, oppure None."""
+    index = seat_availability()
+    _, seat_id = resolve_device(device_id)
+    current = index.at(seat_id, now) if index is not None and seat_id is not None else None
+    return (current.booking_id, current.status) if current is not None else None
+
+
+def filter_occupancy(readings, now):
+    """Esito APPLY | UNCHANGED | DEFERRED per ogni (device_id, is_occupied), nell'ordine."""
+    flt = occupancy_filter()
+    if flt is None:
+        return [APPLY] * len(readings)
+    return [flt.admit(device_id, value, now, _booking_of(device_id, now)) for device_id, value in readings]
+
+
+def forget_occupancy(device_ids):
+    flt = occupancy_filter()
+    if flt is not None:
+        flt.forget(device_ids)
+
+
+def reset_occupancy_filter():
+    flt = occupancy_filter()
+    if flt is not None:
+        flt.clear()
+
+
+def settle_pending_occupancy(now):
+    """Applica i cambi di stato rimasti stabili per tutta la finestra di debounce."""
+    flt = occupancy_filter()
+    if flt is None:
+        return 0
+    readings = flt.settle(now, _booking_of)
+    if not readings:
+        return 0
+    try:
+        results = apply_occupancy(readings, now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        flt.forget([device_id for device_id, _ in readings])
+        raise
+    flt.forget([result.device_id for result in results if result.error])
+    logger.info(f"Applied {len(readings)} debounced occupancy changes")
+    return len(readings)
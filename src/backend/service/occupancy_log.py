@@ -0,0 +1,151 @@
+"""
+Log degli eventi di occupazione dei posti e intervalli di utilizzo.
+
+apply_occupancy registra nella sessione ogni cambio reale di Seat.is_occupied;
+solo dopo il commit gli eventi passano a un WriteBehindBuffer che li inserisce
+in seat_occupancy_readings con un insert multi-riga per blocco, fuori dalla
+richiesta (un rollback li scarta). Se il buffer e' pieno il blocco viene scritto
+subito nel thread chiamante.
+
+Il job occupancy_compaction legge il log in ordine di id, lo riduce per posto a
+intervalli occupato [start_time, end_time) in seat_occupancy_intervals (end_time
+NULL finche' il posto resta occupato) e cancella gli eventi compattati.
+occupancy_intervals() legge gli intervalli di un periodo: gli eventi non ancora
+compattati compaiono al passaggio successivo del job.
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, insert, or_, select
+
+from src.backend.common.extensions import db
+from src.backend.common.logger import logger
+from src.backend.common.write_behind import WriteBehindBuffer
+from src.backend.models import Seat, SeatOccupancyInterval, SeatOccupancyReading
+
+_PENDING_KEY = "occupancy_events"
+
+
+def init_occupancy_log(app, db):
+    if not app.config.get("OCCUPANCY_EVENT_LOG", True):
+        return
+
+    def flush(events):
+        with app.app_context():
+            try:
+                write_occupancy_events(events)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    app.extensions["occupancy_log"] = WriteBehindBuffer(
+        flush,
+        max_rows=app.config["OCCUPANCY_EVENT_FLUSH_ROWS"],
+        interval_ms=app.config["OCCUPANCY_EVENT_FLUSH_INTERVAL_MS"],
+        capacity=app.config["OCCUPANCY_EVENT_BUFFER_CAPACITY"],
+        name="occupancy-event-log",
+    )
+    for name, listener in (("after_commit", _submit_events), ("after_rollback", _discard_events)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def occupancy_log():
+    """Buffer del log eventi, oppure None se disattivato."""
+    return current_app.extensions.get("occupancy_log")
+
+
+def record_occupancy_event(session, seat_id, is_occupied, timestamp, device_id=None):
+    """Accoda nella sessione un cambio di occupazione; viene scritto solo se la transazione va a buon fine."""
+    if occupancy_log() is not None:
+        session.info.setdefault(_PENDING_KEY, []).append((seat_id, is_occupied, timestamp, device_id))
+
+
+def write_occupancy_events(events):
+    """Insert multi-riga di (seat_id, is_occupied, timestamp, device_id) senza commit."""
+    if not events:
+        return
+    db.session.execute(insert(SeatOccupancyReading), [
+        {"seat_id": seat_id, "is_occupied": is_occupied, "timestamp": timestamp, "device_id": device_id}
+        for seat_id, is_occupied, timestamp, device_id in events
+    ])
+
+
+def _submit_events(session):
+    events = session.info.pop(_PENDING_KEY, None)
+    if not events or not has_app_context():
+        return
+    buffer = occupancy_log()
+    if buffer is None:
+        return
+    rejected = buffer.submit_many(events)
+    if rejected:
+        buffer.write(rejected)
+
+
+def _discard_events(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def compact_occupancy_events(session, batch_size):
+    """
+    Riduce il log a intervalli per posto, a blocchi di batch_size eventi con un
+    commit per blocco. Restituisce il numero di eventi compattati.
+    """
+    compacted = 0
+    while True:
+        events = session.execute(
+            select(SeatOccupancyReading.id, SeatOccupancyReading.seat_id,
+                   SeatOccupancyReading.is_occupied, SeatOccupancyReading.timestamp)
+            .where(SeatOccupancyReading.seat_id.is_not(None))
+            .order_by(SeatOccupancyReading.id)
+            .limit(batch_size)
+        ).all()
+        if not events:
+            break
+
+        seat_ids = {seat_id for _, seat_id, _, _ in events}
+        open_intervals = {
+            interval.seat_id: interval
+            for interval in session.scalars(
+                select(SeatOccupancyInterval).where(
+                    SeatOccupancyInterval.seat_id.in_(seat_ids),
+                    SeatOccupancyInterval.end_time.is_(None),
+                )
+            )
+        }
+        for _, seat_id, is_occupied, timestamp in sorted(events, key=lambda e: (e[1], e[3], e[0])):
+            current = open_intervals.get(seat_id)
+            if is_occupied and current is None:
+                open_intervals[seat_id] = SeatOccupancyInterval(seat_id=seat_id, start_time=timestamp)
+                session.add(open_intervals[seat_id])
+            elif not is_occupied and current is not None:
+                current.end_time = max(timestamp, current.start_time)
+                del open_intervals[seat_id]
+
+        session.execute(delete(SeatOccupancyReading).where(
+            SeatOccupancyReading.seat_id.is_not(None),
+            SeatOccupancyReading.id <= events[-1][0],
+        ))
+        session.commit()
+        compacted += len(events)
+    if compacted:
+        logger.info(f"Compacted {compacted} occupancy events")
+    return compacted
+
+
+def occupancy_intervals(session, start, end, seat_id=None, room_id=None):
+    """
+    [(seat_id, start_time, end_time)] degli intervalli di occupazione che si
+    sovrappongono a [start, end), ordinati per posto e inizio; end_time None se
+    il posto e' ancora occupato.
+    """
+    stmt = select(SeatOccupancyInterval.seat_id, SeatOccupancyInterval.start_time, SeatOccupancyInterval.end_time).where(
+        SeatOccupancyInterval.start_time < end,
+        or_(SeatOccupancyInterval.end_time.is_(None), SeatOccupancyInterval.end_time > start),
+    )
+    if seat_id is not None:
+        stmt = stmt.where(SeatOccupancyInterval.seat_id == seat_id)
+    if room_id is not None:
+        stmt = stmt.join(Seat, Seat.id == SeatOccupancyInterval.seat_id).where(Seat.room_id == room_id)
+    stmt = stmt.order_by(SeatOccupancyInterval.seat_id, SeatOccupancyInterval.start_time)
+    return session.execute(stmt).all()
@@ -0,0 +1,117 @@
+"""
+Ingest delle letture di occupazione dei posti (singole o a blocchi).
+
+Per un blocco di letture i posti e le prenotazioni in corso vengono letti con
+due query set-based (IN sugli id), le transizioni sono applicate in memoria
+nell'ordine delle letture e il chiamante fa un unico commit:
+  - posto occupato + prenotazione pending_checkin in corso -> confirmed
+  - posto libero + prenotazione confirmed in corso -> completed (rilascio forzato,
+    email accodata nella outbox)
+Ogni cambio di Seat.is_occupied finisce nel log eventi (occupancy_log) dopo il commit.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.backend.common.extensions import db
+from src.backend.common.labels import EMAIL_FORCE_RELEASE
+from src.backend.models import Booking, Seat, User
+from src.backend.models.booking import BookingStatus
+from src.backend.notification.mail import queue_email
+from src.backend.service.device_registry import resolve_device
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.occupancy_log import record_occupancy_event
+
+OccupancyResult = namedtuple("OccupancyResult", "device_id seat_id action error")
+
+# azioni restituite per ogni lettura
+CONFIRMED = "confirmed"
+RELEASED = "released"
+NONE = "none"
+
+
+def _current_bookings(seat_ids, now):
+    """
+    {(seat_id, status): Booking} delle prenotazioni attive in corso in now, lette
+    dal db: l'indice in memoria puo' non conoscere prenotazioni fatte da altri processi.
+    """
+    if not seat_ids:
+        return {}
+    bookings = db.session.scalars(
+        select(Booking).where(
+            Booking.seat_id.in_(seat_ids),
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.start_time <= now,
+            Booking.end_time >= now,
+        ).order_by(Booking.start_time)
+    ).all()
+    current = {}
+    for booking in bookings:
+        current.setdefault((booking.seat_id, booking.status), booking)
+    return current
+
+
+def apply_occupancy(readings, now=None):
+    """
+    readings: [(device_id, is_occupied)] nell'ordine di arrivo; il posto del device
+    viene dal registro dei dispositivi (device_id non registrato = id del posto).
+    Aggiorna Seat.is_occupied e le prenotazioni senza commit e restituisce un
+    OccupancyResult per lettura (error valorizzato se il posto non esiste).
+    """
+    now = now or datetime.now()
+    resolved = {device_id: resolve_device(device_id) for device_id, _ in readings}
+    seat_ids = {seat_id for _, seat_id in resolved.values() if seat_id is not None}
+    seats = {seat.id: seat for seat in Seat.query.filter(Seat.id.in_(seat_ids)).all()} if seat_ids else {}
+    current = _current_bookings(list(seats), now)
+
+    released = []
+    results = []
+    for device_id, is_occupied in readings:
+        registered_id, seat_id = resolved[device_id]
+        seat = seats.get(seat_id)
+        if seat is None:
+            results.append(OccupancyResult(device_id, None, None, "Seat not found for device_id"))
+            continue
+        if bool(seat.is_occupied) != bool(is_occupied):
+            record_occupancy_event(db.session, seat.id, bool(is_occupied), now, registered_id)
+        seat.is_occupied = is_occupied
+        action = NONE
+
+        confirmed = current.get((seat.id, BookingStatus.CONFIRMED))
+        if is_occupied:
+            # CASO 1: qualcuno si siede -> confermo la prenotazione pending (se non gia' confermata)
+            pending = current.get((seat.id, BookingStatus.PENDING_CHECKIN))
+            if confirmed is None and pending is not None:
+                pending.status = BookingStatus.CONFIRMED
+                current[(seat.id, BookingStatus.CONFIRMED)] = current.pop((seat.id, BookingStatus.PENDING_CHECKIN))
+                action = CONFIRMED
+        elif confirmed is not None:
+            # CASO 2: la sedia si libera -> rilascio forzato
+            confirmed.status = BookingStatus.COMPLETED
+            del current[(seat.id, BookingStatus.CONFIRMED)]
+            released.append(confirmed)
+            action = RELEASED
+        results.append(OccupancyResult(device_id, seat.id, action, None))
+
+    _notify_released(released)
+    return results
+
+
+def _notify_released(bookings):
+    if not bookings:
+        return
+    users = {user.id: user for user in User.query.filter(User.id.in_({b.user_id for b in bookings})).all()}
+    for booking in bookings:
+        user = users.get(booking.user_id)
+        if not user or not user.email:
+            continue
+        queue_email(
+            subject=EMAIL_FORCE_RELEASE["subject"],
+            body=EMAIL_FORCE_RELEASE["body"].format(
+                user_name=user.username,
+                seat_id=booking.seat_id,
+                end_time=booking.end_time.strftime("%H:%M"),
+            ),
+            recipients=[user.email],
+        )
@@ -0,0 +1,110 @@
+"""
+Proiezioni in sola lettura per le liste restituite dalle API.
+
+Ogni funzione seleziona solo le colonne serializzate, in un'unica query
+con le join necessarie, e restituisce namedtuple compatte invece di entita'
+ORM: niente identity map, niente lazy load per riga (es. b.user.username).
+"""
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, select, tuple_
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Room, Seat, SeatSuggestion, User
+from src.backend.service.hot_queries import seats_with_current_booking
+from src.backend.service.seat_availability import seat_availability
+
+BookingRow = namedtuple("BookingRow", "id seat_id user_id username start_time end_time status")
+SeatRow = namedtuple("SeatRow", "seat_id room_id active is_occupied booking_status")
+RoomRow = namedtuple("RoomRow", "id name floor sun_exposure")
+SuggestionRow = namedtuple("SuggestionRow", "seat_id score reason is_recommended")
+
+
+def booking_rows(seat_id=None, ends_after=None, user_id=None, room_id=None, statuses=None,
+                 start_from=None, start_to=None, after=None, limit=None):
+    """
+    Prenotazioni con lo username dell'utente, in una sola query, ordinate per (start_time, id).
+    start_from/start_to filtrano start_time in [start_from, start_to).
+    after=(start_time, id) e limit danno la pagina successiva a una chiave (keyset):
+    il costo non dipende da quante pagine precedono.
+    """
+    stmt = select(
+        Booking.id, Booking.seat_id, Booking.user_id, User.username,
+        Booking.start_time, Booking.end_time, Booking.status,
+    ).outerjoin(User, User.id == Booking.user_id)
+    if seat_id:
+        stmt = stmt.where(Booking.seat_id == seat_id)
+    if user_id is not None:
+        stmt = stmt.where(Booking.user_id == user_id)
+    if room_id is not None:
+        stmt = stmt.where(Booking.seat_id.in_(select(Seat.id).where(Seat.room_id == room_id)))
+    if statuses:
+        stmt = stmt.where(Booking.status.in_(statuses))
+    if start_from is not None:
+        stmt = stmt.where(Booking.start_time >= start_from)
+    if start_to is not None:
+        stmt = stmt.where(Booking.start_time < start_to)
+    if ends_after is not None:
+        stmt = stmt.where(Booking.end_time >= ends_after)
+    if after is not None:
+        stmt = stmt.where(tuple_(Booking.start_time, Booking.id) > tuple_(*after))
+    stmt = stmt.order_by(Booking.start_time, Booking.id)
+    if limit:
+        stmt = stmt.limit(limit)
+    return [BookingRow._make(row) for row in db.session.execute(stmt)]
+
+
+def encode_cursor(row):
+    """Cursore opaco per la pagina che segue la riga (start_time, id)."""
+    raw = f"{row.start_time.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(start_time, id) da un cursore di encode_cursor; ValueError se non valido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start_time, booking_id = raw.split("|")
+        return datetime.fromisoformat(start_time), int(booking_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def seat_rows(at):
+    """
+    Tutti i posti con lo stato della prenotazione attiva nell'istante at.
+    Con l'indice in memoria si leggono solo i posti, senza join sulle prenotazioni.
+    """
+    index = seat_availability()
+    if index is None:
+        return [SeatRow._make(row) for row in seats_with_current_booking(at)]
+    rows = []
+    for seat_id, room_id, active, is_occupied in db.session.execute(
+        select(Seat.id, Seat.room_id, Seat.is_active, Seat.is_occupied)
+    ):
+        current = index.at(seat_id, at)
+        rows.append(SeatRow(seat_id, room_id, active, is_occupied, current.status if current else None))
+    return rows
+
+
+def room_rows():
+    stmt = select(Room.id, Room.name, Room.floor, Room.sun_exposure)
+    return [RoomRow._make(row) for row in db.session.execute(stmt)]
+
+
+def suggestion_rows(date=None, top=None):
+    """Suggerimenti per data (default: l'ultima generata) ordinati per score."""
+    if date is None:
+        date = db.session.scalar(select(func.max(SeatSuggestion.date)))
+    stmt = select(
+        SeatSuggestion.seat_id, SeatSuggestion.score, SeatSuggestion.reason, SeatSuggestion.is_recommended,
+    )
+    if date is not None:
+        stmt = stmt.where(SeatSuggestion.date == date)
+    stmt = stmt.order_by(SeatSuggestion.score.desc())
+    if top:
+        stmt = stmt.limit(top)
+    return [SuggestionRow._make(row) for row in db.session.execute(stmt)]
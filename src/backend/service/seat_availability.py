@@ -0,0 +1,230 @@
+"""
+Indice in memoria delle prenotazioni attive (PENDING_CHECKIN/CONFIRMED) per posto.
+
+Per ogni posto le prenotazioni sono tenute ordinate per start_time, con il
+massimo prefisso degli end_time: "il posto e' occupato in [start, end)?" e
+"quale prenotazione copre l'istante t?" sono una bisect, O(log n) per posto.
+
+L'indice segue i commit della sessione (eventi after_flush/after_commit), quindi
+creazione, check-in, spostamento e chiusura lo aggiornano senza codice dedicato.
+Il database resta la fonte di verita': prima di un commit le scritture
+ricontrollano sul db, e le modifiche fatte con UPDATE/DELETE bulk richiedono
+rebuild_seat_availability(). L'indice e' per processo (SEAT_AVAILABILITY_INDEX=false lo disattiva).
+"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+
+from src.backend.common.logger import logger
+from src.backend.models import Booking
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+
+Interval = namedtuple("Interval", "start end booking_id status")
+
+_PENDING_KEY = "seat_availability_changes"
+
+
+class _SeatIntervals:
+    __slots__ = ("entries", "starts", "max_end")
+
+    def __init__(self):
+        self.entries = []
+        self.starts = []
+        self.max_end = []
+
+    def _refresh(self, i=0):
+        """Ricalcola starts/max_end dalla posizione i in poi."""
+        del self.starts[i:]
+        del self.max_end[i:]
+        running = self.max_end[-1] if self.max_end else None
+        for entry in self.entries[i:]:
+            running = entry.end if running is None or entry.end > running else running
+            self.starts.append(entry.start)
+            self.max_end.append(running)
+
+    def add(self, interval):
+        i = bisect_right(self.entries, interval)
+        insort(self.entries, interval)
+        self._refresh(i)
+
+    def discard(self, booking_id):
+        for i, entry in enumerate(self.entries):
+            if entry.booking_id == booking_id:
+                del self.entries[i]
+                self._refresh(i)
+                return
+
+    def overlapping(self, start, end):
+        """Prima prenotazione con entry.start < end e entry.end > start."""
+        k = bisect_left(self.starts, end)
+        if k == 0 or self.max_end[k - 1] <= start:
+            return None
+        # max_end garantisce che esista: con posti senza sovrapposizioni e' l'ultima
+        for i in range(k - 1, -1, -1):
+            if self.entries[i].end > start:
+                return self.entries[i]
+        return None
+
+    def between(self, start, end):
+        """Tutte le prenotazioni con entry.start < end e entry.end > start."""
+        found = []
+        for i in range(bisect_left(self.starts, end) - 1, -1, -1):
+            if self.max_end[i] <= start:
+                break
+            if self.entries[i].end > start:
+                found.append(self.entries[i])
+        return found
+
+    def at(self, ts):
+        """Prenotazione con entry.start <= ts <= entry.end (come le query sql)."""
+        k = bisect_right(self.starts, ts)
+        for i in range(k - 1, -1, -1):
+            if self.max_end[i] < ts:
+                return None
+            if self.entries[i].end >= ts:
+                return self.entries[i]
+        return None
+
+
+class SeatAvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._seats = {}
+        self._seat_of = {}  # booking_id -> seat_id
+
+    def load(self, rows):
+        """Sostituisce il contenuto con rows: (booking_id, seat_id, start, end, status)."""
+        seats, seat_of = {}, {}
+        for booking_id, seat_id, start, end, status in rows:
+            if status not in ACTIVE_STATUSES:
+                continue
+            seats.setdefault(seat_id, _SeatIntervals()).entries.append(Interval(start, end, booking_id, status))
+            seat_of[booking_id] = seat_id
+        for intervals in seats.values():
+            intervals.entries.sort()
+            intervals._refresh()
+        with self._lock:
+            self._seats, self._seat_of = seats, seat_of
+        return len(seat_of)
+
+    def upsert(self, booking_id, seat_id, start, end, status):
+        with self._lock:
+            self.remove(booking_id)
+            if status not in ACTIVE_STATUSES:
+                return
+            self._seats.setdefault(seat_id, _SeatIntervals()).add(Interval(start, end, booking_id, status))
+            self._seat_of[booking_id] = seat_id
+
+    def remove(self, booking_id):
+        with self._lock:
+            seat_id = self._seat_of.pop(booking_id, None)
+            if seat_id is not None:
+                self._seats[seat_id].discard(booking_id)
+
+    def overlapping(self, seat_id, start, end):
+        """Prenotazione attiva del posto che si sovrappone a [start, end), oppure None."""
+        with self._lock:
+            intervals = self._seats.get(seat_id)
+            return intervals.overlapping(start, end) if intervals else None
+
+    def between(self, seat_id, start, end):
+        """Prenotazioni attive del posto che si sovrappongono a [start, end)."""
+        with self._lock:
+            intervals = self._seats.get(seat_id)
+            return intervals.between(start, end) if intervals else []
+
+    def at(self, seat_id, ts):
+        """Prenotazione attiva del posto in corso nell'istante ts, oppure None."""
+        with self._lock:
+            intervals = self._seats.get(seat_id)
+            return intervals.at(ts) if intervals else None
+
+    def prune(self, before):
+        """Rimuove le prenotazioni terminate prima di before (es. pending mai confermate)."""
+        removed = 0
+        with self._lock:
+            for seat_id, intervals in list(self._seats.items()):
+                kept = [e for e in intervals.entries if e.end >= before]
+                if len(kept) == len(intervals.entries):
+                    continue
+                for entry in intervals.entries:
+                    if entry.end < before:
+                        self._seat_of.pop(entry.booking_id, None)
+                        removed += 1
+                if kept:
+                    intervals.entries = kept
+                    intervals._refresh()
+                else:
+                    del self._seats[seat_id]
+        return removed
+
+    def __len__(self):
+        return len(self._seat_of)
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_seat_availability(app, db):
+    """Registra l'indice in app.extensions e lo aggancia ai commit di db.session."""
+    if not app.config.get("SEAT_AVAILABILITY_INDEX", True):
+        return
+    app.extensions["seat_availability"] = SeatAvailabilityIndex()
+    for name, listener in (("after_flush", _collect_changes),
+                           ("after_commit", _apply_changes),
+                           ("after_rollback", _discard_changes)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def seat_availability():
+    """Indice attivo, oppure None se disattivato."""
+    return current_app.extensions.get("seat_availability")
+
+
+def rebuild_seat_availability(session, now=None):
+    """Ricarica dal db le prenotazioni attive non ancora terminate."""
+    index = seat_availability()
+    if index is None:
+        return 0
+    now = now or datetime.now()
+    rows = session.execute(
+        select(Booking.id, Booking.seat_id, Booking.start_time, Booking.end_time, Booking.status).where(
+            Booking.status.in_(ACTIVE_STATUSES),
+            Booking.end_time >= now,
+        )
+    ).all()
+    loaded = index.load(rows)
+    logger.info(f"Seat availability index loaded with {loaded} bookings")
+    return loaded
+
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault(_PENDING_KEY, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Booking) and obj.id is not None:
+            changes[obj.id] = (obj.seat_id, obj.start_time, obj.end_time, obj.status)
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.id is not None:
+            changes[obj.id] = None
+
+
+def _apply_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes or not has_app_context():
+        return
+    index = seat_availability()
+    if index is None:
+        return
+    for booking_id, state in changes.items():
+        if state is None:
+            index.remove(booking_id)
+        else:
+            index.upsert(booking_id, *state)
+
+
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,95 @@
+"""
+Ricerca dei posti liberi in una finestra, ordinati per l'ultimo score di suggerimento.
+
+Due query indicizzate: gli score dell'ultima generazione (indice date, seat_id, id)
+e i posti attivi con i filtri sulla stanza. I candidati, ordinati per score,
+vengono verificati sull'indice in memoria dei posti fino a trovarne k liberi;
+senza indice la verifica e' fatta a blocchi di candidati con una query
+sull'indice (seat_id, status, start_time, end_time) delle prenotazioni.
+"""
+from collections import namedtuple
+
+from sqlalchemy import func, select
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Room, Seat, SeatSuggestion
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.seat_availability import seat_availability
+
+FreeSeat = namedtuple("FreeSeat", "seat_id room_id room_name floor sun_exposure score")
+
+CHECK_CHUNK = 200
+
+
+_scores_cache = {}
+
+
+def latest_scores():
+    """
+    {seat_id: score} dell'ultimo suggerimento di ogni posto, per la data piu' recente.
+    Il risultato e' tenuto in cache finche' non cambiano data e id massimi
+    (cioe' fino alla prossima generazione dei suggerimenti).
+    """
+    key = tuple(db.session.execute(select(func.max(SeatSuggestion.date), func.max(SeatSuggestion.id))).one())
+    cached = _scores_cache.get("latest")
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    latest_date = select(func.max(SeatSuggestion.date)).scalar_subquery()
+    latest_ids = (
+        select(func.max(SeatSuggestion.id))
+        .where(SeatSuggestion.date == latest_date)
+        .group_by(SeatSuggestion.seat_id)
+    )
+    stmt = select(SeatSuggestion.seat_id, SeatSuggestion.score).where(SeatSuggestion.id.in_(latest_ids))
+    scores = dict(db.session.execute(stmt).all())
+    _scores_cache["latest"] = (key, scores)
+    return scores
+
+
+def _busy_seats(seat_ids, start, end):
+    """Posti tra seat_ids con una prenotazione attiva in [start, end): una probe per posto sull'indice."""
+    overlapping = select(Booking.id).where(
+        Booking.seat_id == Seat.id,
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.start_time < end,
+        Booking.end_time > start,
+    ).exists()
+    return set(db.session.scalars(select(Seat.id).where(Seat.id.in_(seat_ids), overlapping)))
+
+
+def search_free_seats(start, end, k=10, room_id=None, floor=None, sun_exposure=None):
+    """Fino a k posti attivi liberi in [start, end), per score decrescente (senza score in fondo)."""
+    stmt = (
+        select(Seat.id, Seat.room_id, Room.name, Room.floor, Room.sun_exposure)
+        .join(Room, Room.id == Seat.room_id)
+        .where(Seat.is_active.is_(True))
+    )
+    if room_id is not None:
+        stmt = stmt.where(Seat.room_id == room_id)
+    if floor is not None:
+        stmt = stmt.where(Room.floor == floor)
+    if sun_exposure:
+        stmt = stmt.where(func.lower(Room.sun_exposure) == sun_exposure.lower())
+
+    scores = latest_scores()
+    candidates = [FreeSeat(*row, scores.get(row[0])) for row in db.session.execute(stmt)]
+    candidates.sort(key=lambda seat: (seat.score is None, -(seat.score or 0.0), seat.seat_id))
+
+    index = seat_availability()
+    found = []
+    if index is not None:
+        for seat in candidates:
+            if index.overlapping(seat.seat_id, start, end) is None:
+                found.append(seat)
+                if len(found) >= k:
+                    break
+        return found
+
+    for i in range(0, len(candidates), CHECK_CHUNK):
+        chunk = candidates[i:i + CHECK_CHUNK]
+        busy = _busy_seats([seat.seat_id for seat in chunk], start, end)
+        found += [seat for seat in chunk if seat.seat_id not in busy]
+        if len(found) >= k:
+            break
+    return found[:k]
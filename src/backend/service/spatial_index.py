@@ -0,0 +1,182 @@
+"""
+Indice spaziale dei posti per sala: griglia uniforme di celle di SEAT_GRID_CELL_METERS.
+
+La ricerca dei posti piu' vicini a un punto parte dalla cella del punto e si
+allarga un anello di celle alla volta: dopo l'anello r tutti i posti non ancora
+visti distano almeno r * cella, quindi appena i k migliori trovati sono entro
+quella distanza la ricerca si ferma senza guardare il resto della sala.
+
+Le griglie sono in app.extensions e vengono ricostruite alla prima richiesta
+dopo una modifica della posizione, della sala o dello stato attivo di un posto
+(eventi after_commit della sessione); le letture dei sensori non la toccano.
+"""
+import heapq
+import math
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+
+from src.backend.common.extensions import db
+from src.backend.models import Booking, Room, Seat
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+from src.backend.service.seat_availability import seat_availability
+
+_PENDING_KEY = "seat_grid_changes"
+
+_LAYOUT = ("room_id", "pos_x", "pos_y", "is_active")
+
+
+class SeatGrid:
+    def __init__(self, positions, cell):
+        """positions: {seat_id: (x, y)}; cell: lato della cella in metri."""
+        self.cell = cell
+        self.cells = {}
+        for seat_id, (x, y) in positions.items():
+            self.cells.setdefault(self._cell_of(x, y), []).append((seat_id, x, y))
+        self._bounds = (
+            min((c[0] for c in self.cells), default=0), max((c[0] for c in self.cells), default=0),
+            min((c[1] for c in self.cells), default=0), max((c[1] for c in self.cells), default=0),
+        )
+
+    def _cell_of(self, x, y):
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def nearest(self, x, y, k, accept=None):
+        """[(distanza, seat_id)] dei k posti piu' vicini a (x, y) per cui accept(seat_id) e' vero."""
+        if not self.cells:
+            return []
+        cx, cy = self._cell_of(x, y)
+        min_x, max_x, min_y, max_y = self._bounds
+        last_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        best = []  # max-heap di (-distanza, -seat_id) con i k migliori
+        for r in range(last_ring + 1):
+            for key in self._ring(cx, cy, r):
+                for seat_id, sx, sy in self.cells.get(key, ()):
+                    if accept is not None and not accept(seat_id):
+                        continue
+                    item = (-math.hypot(sx - x, sy - y), -seat_id)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            # i posti degli anelli successivi distano almeno r * cell
+            if len(best) == k and -best[0][0] <= r * self.cell:
+                break
+        return sorted((-d, -s) for d, s in best)
+
+    def __len__(self):
+        return sum(len(seats) for seats in self.cells.values())
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_seat_grid(app, db):
+    """Registra la cache delle griglie e la invalida ai commit che toccano posti o sale."""
+    app.extensions["seat_grid"] = {"lock": threading.Lock(), "rooms": {}}
+    for name, listener in (("after_flush", _collect_changes),
+                           ("after_commit", _apply_changes),
+                           ("after_rollback", _discard_changes)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def reset_seat_grids():
+    """Svuota la cache (es. dopo delete bulk che non passano dagli eventi di sessione)."""
+    state = current_app.extensions.get("seat_grid")
+    if state is not None:
+        with state["lock"]:
+            state["rooms"].clear()
+
+
+def room_grid(room_id):
+    """Griglia dei posti attivi con coordinate della sala, costruita alla prima richiesta."""
+    state = current_app.extensions.get("seat_grid")
+    grid = state["rooms"].get(room_id) if state is not None else None
+    if grid is not None:
+        return grid
+    rows = db.session.execute(
+        select(Seat.id, Seat.pos_x, Seat.pos_y).where(
+            Seat.room_id == room_id,
+            Seat.is_active.is_(True),
+            Seat.pos_x.is_not(None),
+            Seat.pos_y.is_not(None),
+        )
+    ).all()
+    grid = SeatGrid({seat_id: (x, y) for seat_id, x, y in rows}, current_app.config["SEAT_GRID_CELL_METERS"])
+    if state is not None:
+        with state["lock"]:
+            state["rooms"][room_id] = grid
+    return grid
+
+
+def nearest_free_seats(room_id, x, y, k, start, end):
+    """
+    [(distanza, seat_id)] dei k posti della sala piu' vicini a (x, y) che sono
+    liberi adesso (is_occupied falso) e senza prenotazioni attive in [start, end).
+    """
+    grid = room_grid(room_id)
+    occupied = set(db.session.scalars(
+        select(Seat.id).where(Seat.room_id == room_id, Seat.is_occupied.is_(True))
+    ))
+    index = seat_availability()
+    if index is not None:
+        def accept(seat_id):
+            return seat_id not in occupied and index.overlapping(seat_id, start, end) is None
+    else:
+        booked = set(db.session.scalars(
+            select(Booking.seat_id).join(Seat, Seat.id == Booking.seat_id).where(
+                Seat.room_id == room_id,
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.start_time < end,
+                Booking.end_time > start,
+            )
+        ))
+
+        def accept(seat_id):
+            return seat_id not in occupied and seat_id not in booked
+    return grid.nearest(x, y, k, accept)
+
+
+def _collect_changes(session, flush_context):
+    rooms = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Seat):
+            rooms.add(obj.room_id)
+        elif isinstance(obj, Room):
+            rooms.add(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, Seat):
+            continue
+        attrs = inspect(obj).attrs
+        if any(attrs[name].history.has_changes() for name in _LAYOUT):
+            rooms.add(obj.room_id)
+            rooms.update(attrs.room_id.history.deleted or ())
+    if rooms:
+        session.info.setdefault(_PENDING_KEY, set()).update(rooms)
+
+
+def _apply_changes(session):
+    rooms = session.info.pop(_PENDING_KEY, None)
+    if not rooms or not has_app_context():
+        return
+    state = current_app.extensions.get("seat_grid")
+    if state is not None:
+        with state["lock"]:
+            for room_id in rooms:
+                state["rooms"].pop(room_id, None)
+
+
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
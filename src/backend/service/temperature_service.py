@@ -0,0 +1,373 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+from sqlalchemy.dialects import mysql, sqlite
+
+from src.backend.common.extensions import db
+from src.backend.common.logger import logger
+from src.backend.common.storage import read_session
+from src.backend.common.write_behind import WriteBehindBuffer
+from src.backend.models import TemperatureReading, TemperatureReadingArchive, TemperatureRollup
+from src.backend.service.timeseries_store import TemperatureSeriesStore
+
+# dal piu' grossolano al piu' fine
+GRANULARITIES = ("day", "hour", "minute")
+# rollup che scadono: granularita' -> chiave di config con i giorni di retention
+ROLLUP_RETENTION = {
+    "minute": "TEMPERATURE_MINUTE_ROLLUP_RETENTION_DAYS",
+    "hour": "TEMPERATURE_HOUR_ROLLUP_RETENTION_DAYS",
+}
+
+TEMPERATURE_BACKENDS = ("sql", "timeseries")
+
+
+def init_temperature_backend(app):
+    """
+    TEMPERATURE_BACKEND=sql (default): letture e rollup su database.
+    TEMPERATURE_BACKEND=timeseries: storico su segmenti mmap in TEMPERATURE_SERIES_DIR.
+    """
+    backend = app.config.get("TEMPERATURE_BACKEND", "sql")
+    if backend not in TEMPERATURE_BACKENDS:
+        raise ValueError(f"Unsupported TEMPERATURE_BACKEND '{backend}', expected one of {TEMPERATURE_BACKENDS}")
+    if backend == "timeseries":
+        app.extensions["temperature_store"] = TemperatureSeriesStore(app.config["TEMPERATURE_SERIES_DIR"])
+
+
+def init_temperature_write_behind(app):
+    """
+    TEMPERATURE_WRITE_BEHIND=true: le letture di /temperatures vengono accodate e
+    scritte da un thread in blocchi di TEMPERATURE_FLUSH_ROWS righe, al massimo ogni
+    TEMPERATURE_FLUSH_INTERVAL_MS millisecondi (un commit per blocco).
+    """
+    if not app.config.get("TEMPERATURE_WRITE_BEHIND", False):
+        return
+
+    def flush(readings):
+        with app.app_context():
+            try:
+                record_temperatures(readings)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    app.extensions["temperature_buffer"] = WriteBehindBuffer(
+        flush,
+        max_rows=app.config["TEMPERATURE_FLUSH_ROWS"],
+        interval_ms=app.config["TEMPERATURE_FLUSH_INTERVAL_MS"],
+        capacity=app.config["TEMPERATURE_BUFFER_CAPACITY"],
+        name="temperature-write-behind",
+    )
+
+
+def temperature_buffer():
+    """Buffer write-behind delle letture, oppure None se disattivato."""
+    return current_app.extensions.get("temperature_buffer")
+
+
+def temperature_store():
+    """Store time-series attivo, oppure None con il backend sql."""
+    return current_app.extensions.get("temperature_store")
+
+
+def truncate(ts, granularity):
+    """Inizio del bucket di granularity che contiene ts."""
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity '{granularity}'")
+
+
+def _ceil(ts, granularity):
+    start = truncate(ts, granularity)
+    if start == ts:
+        return ts
+    step = {"day": timedelta(days=1), "hour": timedelta(hours=1), "minute": timedelta(minutes=1)}[granularity]
+    return start + step
+
+
+# --------------------------------------------------------------------------- scrittura
+
+def record_temperature(room_id, temperature, timestamp=None):
+    """
+    Aggiunge la lettura alla sessione e aggiorna i rollup minute/hour/day.
+    Non esegue il commit: lo fa il chiamante insieme al resto della transazione.
+    Con il backend timeseries la lettura va solo nel segmento della stanza.
+    """
+    timestamp = timestamp or datetime.utcnow()
+    store = temperature_store()
+    if store is not None:
+        store.append(room_id, temperature, timestamp)
+        return None
+    reading = TemperatureReading(room_id=room_id, temperature=temperature, timestamp=timestamp)
+    db.session.add(reading)
+    _upsert_rollups(_aggregate([(room_id, temperature, timestamp)]))
+    return reading
+
+
+def record_temperatures(readings):
+    """
+    Come record_temperature per un blocco di (room_id, temperature, timestamp):
+    un insert multi-riga delle letture e un unico upsert dei rollup. Senza commit.
+    """
+    if not readings:
+        return
+    store = temperature_store()
+    if store is not None:
+        store.append_many(readings)
+        return
+    db.session.execute(insert(TemperatureReading), [
+        {"room_id": room_id, "temperature": temperature, "timestamp": timestamp}
+        for room_id, temperature, timestamp in readings
+    ])
+    _upsert_rollups(_aggregate(readings))
+
+
+def submit_temperatures(readings):
+    """
+    Accoda le letture nel buffer write-behind; quelle che non entrano (buffer
+    disattivato o pieno) sono scritte nella sessione corrente come record_temperatures.
+    Restituisce True se il chiamante deve fare commit.
+    """
+    buffer = temperature_buffer()
+    rejected = buffer.submit_many(readings) if buffer is not None else readings
+    record_temperatures(rejected)
+    return bool(rejected)
+
+
+def _aggregate(readings):
+    """(room_id, temperature, timestamp) -> righe di rollup aggregate per chiave."""
+    buckets = {}
+    for room_id, temperature, timestamp in readings:
+        for granularity in GRANULARITIES:
+            key = (granularity, room_id, truncate(timestamp, granularity))
+            acc = buckets.get(key)
+            if acc is None:
+                buckets[key] = {"count": 1, "sum": temperature, "min": temperature, "max": temperature}
+            else:
+                acc["count"] += 1
+                acc["sum"] += temperature
+                acc["min"] = min(acc["min"], temperature)
+                acc["max"] = max(acc["max"], temperature)
+    return [
+        {"granularity": g, "room_id": room_id, "bucket_start": bucket, **acc}
+        for (g, room_id, bucket), acc in buckets.items()
+    ]
+
+
+def _upsert_rollups(rows):
+    if not rows:
+        return
+    table = TemperatureRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        new = stmt.inserted
+    else:
+        stmt = sqlite.insert(table)
+        new = stmt.excluded
+
+    values = {
+        "count": table.c.count + new["count"],
+        "sum": table.c.sum + new["sum"],
+        "min": case((new["min"] < table.c.min, new["min"]), else_=table.c.min),
+        "max": case((new["max"] > table.c.max, new["max"]), else_=table.c.max),
+    }
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(**values)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.granularity, table.c.room_id, table.c.bucket_start],
+                                          set_=values)
+    db.session.execute(stmt, rows)
+
+
+def ensure_rollups(batch_size=5000):
+    """Ricostruisce i rollup dalle letture grezze se la tabella e' vuota (db esistenti)."""
+    if temperature_store() is not None:
+        return 0
+    if db.session.query(TemperatureRollup.room_id).first() is not None:
+        return 0
+    total = 0
+    for model in (TemperatureReading, TemperatureReadingArchive):
+        batch = []
+        rows = db.session.execute(
+            select(model.room_id, model.temperature, model.timestamp)
+            .where(model.temperature.is_not(None), model.timestamp.is_not(None))
+            .execution_options(yield_per=batch_size)
+        )
+        for row in rows:
+            batch.append(tuple(row))
+            if len(batch) >= batch_size:
+                _upsert_rollups(_aggregate(batch))
+                total += len(batch)
+                batch = []
+        _upsert_rollups(_aggregate(batch))
+        total += len(batch)
+    db.session.commit()
+    if total:
+        logger.info(f"Built temperature rollups from {total} readings")
+    return total
+
+
+def expire_temperature_history(now=None):
+    """
+    Applica la retention: le letture grezze (calde e archiviate) oltre
+    TEMPERATURE_RAW_RETENTION_DAYS e i rollup minute/hour oltre la rispettiva
+    finestra vengono eliminati. I rollup giornalieri restano.
+    """
+    now = now or datetime.utcnow()
+    config = current_app.config
+    raw_cutoff = now - timedelta(days=config["TEMPERATURE_RAW_RETENTION_DAYS"])
+
+    deleted = {}
+    store = temperature_store()
+    if store is not None:
+        deleted["segments"] = store.expire(raw_cutoff)
+    for model in (TemperatureReading, TemperatureReadingArchive):
+        result = db.session.execute(delete(model).where(model.timestamp < raw_cutoff))
+        deleted[model.__tablename__] = result.rowcount
+
+    for granularity, key in ROLLUP_RETENTION.items():
+        cutoff = now - timedelta(days=config[key])
+        result = db.session.execute(delete(TemperatureRollup).where(
+            TemperatureRollup.granularity == granularity,
+            TemperatureRollup.bucket_start < cutoff,
+        ))
+        deleted[f"rollup_{granularity}"] = result.rowcount
+
+    db.session.commit()
+    logger.info(f"Temperature retention: {deleted}")
+    return deleted
+
+
+# --------------------------------------------------------------------------- lettura
+
+def _covering_ranges(start, end, levels=GRANULARITIES):
+    """
+    Scompone [start, end) in intervalli allineati, usando per ciascun tratto
+    la granularita' piu' grossolana che lo copre esattamente.
+    """
+    granularity, finer = levels[0], levels[1:]
+    if start >= end:
+        return []
+    if not finer:
+        return [(granularity, truncate(start, granularity), end)]
+    lo, hi = _ceil(start, granularity), truncate(end, granularity)
+    if lo >= hi:
+        return _covering_ranges(start, end, finer)
+    return _covering_ranges(start, lo, finer) + [(granularity, lo, hi)] + _covering_ranges(hi, end, finer)
+
+
+def _readable_ranges(start, end, now=None):
+    """
+    Come _covering_ranges, senza usare rollup gia' cancellati dalla retention:
+    prima del limite dei rollup orari (arrotondato al giorno) si leggono solo i
+    giornalieri, prima di quello dei rollup al minuto (arrotondato all'ora) solo
+    giornalieri e orari. Un tratto non allineato in quelle zone viene allargato
+    al bucket intero che lo contiene invece di sparire dal risultato.
+    """
+    now = now or datetime.utcnow()
+    config = current_app.config
+    day_only = _ceil(now - timedelta(days=config[ROLLUP_RETENTION["hour"]]), "day")
+    no_minutes = max(_ceil(now - timedelta(days=config[ROLLUP_RETENTION["minute"]]), "hour"), day_only)
+    return (_covering_ranges(start, min(end, day_only), ("day",))
+            + _covering_ranges(max(start, day_only), min(end, no_minutes), ("day", "hour"))
+            + _covering_ranges(max(start, no_minutes), end))
+
+
+def _summary_columns():
+    return (
+        func.sum(TemperatureRollup.count).label("count"),
+        func.sum(TemperatureRollup.sum).label("sum"),
+        func.min(TemperatureRollup.min).label("min"),
+        func.max(TemperatureRollup.max).label("max"),
+    )
+
+
+def _summary(row):
+    count = row.count or 0
+    return {
+        "count": int(count),
+        "avg": (row.sum / count) if count else None,
+        "min": row.min,
+        "max": row.max,
+    }
+
+
+def temperature_summary(start=None, end=None, room_id=None, by_room=False):
+    """
+    count/avg/min/max delle temperature in [start, end), calcolati dai rollup.
+    Senza start/end usa i rollup giornalieri (tutto lo storico).
+    Con by_room=True restituisce {room_id: summary}.
+    """
+    store = temperature_store()
+    if store is not None:
+        return store.summary(start, end, room_id=room_id, by_room=by_room)
+
+    if start is None or end is None:
+        criteria = [TemperatureRollup.granularity == "day"]
+        if start is not None:
+            criteria.append(TemperatureRollup.bucket_start >= truncate(start, "day"))
+        if end is not None:
+            criteria.append(TemperatureRollup.bucket_start < end)
+    else:
+        ranges = _readable_ranges(start, end)
+        if not ranges:
+            return {} if by_room else {"count": 0, "avg": None, "min": None, "max": None}
+        criteria = [or_(*[
+            and_(TemperatureRollup.granularity == g,
+                 TemperatureRollup.bucket_start >= lo,
+                 TemperatureRollup.bucket_start < hi)
+            for g, lo, hi in ranges
+        ])]
+    if room_id is not None:
+        criteria.append(TemperatureRollup.room_id == room_id)
+
+    q = read_session.query(*_summary_columns()).filter(*criteria)
+    if by_room:
+        rows = q.add_columns(TemperatureRollup.room_id).group_by(TemperatureRollup.room_id).all()
+        return {row.room_id: _summary(row) for row in rows}
+    return _summary(q.one())
+
+
+def temperature_series(start, end, resolution="hour", room_id=None):
+    """
+    Media per bucket allineati alla risoluzione (hour | day), da un'unica query
+    sui rollup di quella granularita'. Restituisce [(bucket_start, bucket_end, avg)].
+    """
+    step = timedelta(hours=1) if resolution == "hour" else timedelta(days=1)
+    granularity = "hour" if resolution == "hour" else "day"
+    first = truncate(start, granularity)
+
+    store = temperature_store()
+    if store is not None:
+        averages = store.series(first, end, step, room_id=room_id)
+        return [(first + i * step, min(first + (i + 1) * step, end), avg) for i, avg in enumerate(averages)]
+
+    q = read_session.query(
+        TemperatureRollup.bucket_start,
+        func.sum(TemperatureRollup.sum),
+        func.sum(TemperatureRollup.count),
+    ).filter(
+        TemperatureRollup.granularity == granularity,
+        TemperatureRollup.bucket_start >= first,
+        TemperatureRollup.bucket_start < end,
+    )
+    if room_id is not None:
+        q = q.filter(TemperatureRollup.room_id == room_id)
+    averages = {
+        bucket: (total / count) if count else None
+        for bucket, total, count in q.group_by(TemperatureRollup.bucket_start).all()
+    }
+
+    series = []
+    cur = first
+    while cur < end:
+        series.append((cur, min(cur + step, end), averages.get(cur)))
+        cur += step
+    return series
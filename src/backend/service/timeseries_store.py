@@ -0,0 +1,220 @@
+import mmap
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # dipendenza opzionale, serve solo con TEMPERATURE_BACKEND=timeseries
+    np = None
+
+SEGMENT_SUFFIX = ".seg"
+UNSORTED_SUFFIX = ".unsorted"
+
+
+def _epoch(ts):
+    """datetime naive UTC -> secondi epoch (float)."""
+    return ts.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _month_key(ts):
+    return f"{ts.year:04d}{ts.month:02d}"
+
+
+class TemperatureSeriesStore:
+    """
+    Storico delle temperature su file append-only, un segmento per stanza e mese:
+        <base_dir>/room_<id>/<YYYYMM>.seg
+    Ogni record e' (timestamp epoch float64, valore float64), 16 byte little-endian.
+    Le letture mappano i segmenti con mmap e li vedono come array NumPy:
+    una media su un intervallo e' una slice (searchsorted) e una somma vettoriale.
+    """
+
+    def __init__(self, base_dir):
+        if np is None:
+            raise RuntimeError("TEMPERATURE_BACKEND=timeseries requires numpy (pip install numpy)")
+        self.base_dir = base_dir
+        self.record = np.dtype([("ts", "<f8"), ("value", "<f8")])
+        self._lock = threading.Lock()
+        self._last_ts = {}  # path -> ultimo timestamp scritto
+        self._views = {}    # path -> (size, mmap, array)
+        os.makedirs(base_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------- scrittura
+
+    def _path(self, room_id, month_key):
+        return os.path.join(self.base_dir, f"room_{int(room_id)}", month_key + SEGMENT_SUFFIX)
+
+    def append(self, room_id, value, timestamp):
+        self.append_many([(room_id, value, timestamp)])
+
+    def append_many(self, rows):
+        """rows: iterabile di (room_id, value, timestamp UTC naive)."""
+        by_path = {}
+        for room_id, value, timestamp in rows:
+            by_path.setdefault(self._path(room_id, _month_key(timestamp)), []).append((_epoch(timestamp), value))
+
+        with self._lock:
+            for path, records in by_path.items():
+                data = np.array(records, dtype=self.record)
+                last = self._last_timestamp(path)
+                if (last is not None and data["ts"][0] < last) or np.any(np.diff(data["ts"]) < 0):
+                    # scrittura fuori ordine: il segmento verra' riordinato alla prima lettura
+                    open(path + UNSORTED_SUFFIX, "a").close()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "ab") as f:
+                    f.write(data.tobytes())
+                self._last_ts[path] = max(float(data["ts"].max()), last if last is not None else float("-inf"))
+
+    def _last_timestamp(self, path):
+        if path in self._last_ts:
+            return self._last_ts[path]
+        if not os.path.exists(path) or os.path.getsize(path) < self.record.itemsize:
+            return None
+        with open(path, "rb") as f:
+            f.seek(-self.record.itemsize, os.SEEK_END)
+            last = float(np.frombuffer(f.read(self.record.itemsize), dtype=self.record)["ts"][0])
+        self._last_ts[path] = last
+        return last
+
+    # ------------------------------------------------------------------- lettura
+
+    def _view(self, path):
+        """Array NumPy (sola lettura) sopra il segmento mappato in memoria."""
+        if os.path.exists(path + UNSORTED_SUFFIX):
+            self._sort_segment(path)
+        size = os.path.getsize(path)
+        size -= size % self.record.itemsize  # ignora un eventuale record parziale in scrittura
+        cached = self._views.get(path)
+        if cached and cached[0] == size:
+            return cached[2]
+        if size == 0:
+            return np.empty(0, dtype=self.record)
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = np.frombuffer(mm, dtype=self.record, count=size // self.record.itemsize)
+        self._views[path] = (size, mm, view)
+        return view
+
+    def _sort_segment(self, path):
+        with self._lock:
+            if not os.path.exists(path + UNSORTED_SUFFIX):
+                return
+            data = np.fromfile(path, dtype=self.record)
+            data.sort(order="ts", kind="stable")
+            tmp = path + ".tmp"
+            data.tofile(tmp)
+            self._views.pop(path, None)
+            os.replace(tmp, path)
+            os.remove(path + UNSORTED_SUFFIX)
+            self._last_ts[path] = float(data["ts"][-1]) if len(data) else None
+
+    def _room_ids(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(int(name[len("room_"):]) for name in os.listdir(self.base_dir) if name.startswith("room_"))
+
+    def _slices(self, room_id, start=None, end=None):
+        """Slice [start, end) dei segmenti di una stanza, come array NumPy."""
+        room_dir = os.path.join(self.base_dir, f"room_{int(room_id)}")
+        if not os.path.isdir(room_dir):
+            return
+        lo = _epoch(start) if start is not None else float("-inf")
+        hi = _epoch(end) if end is not None else float("inf")
+        first = _month_key(start) if start is not None else ""
+        last = _month_key(end) if end is not None else "999999"
+        keys = sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(room_dir) if name.endswith(SEGMENT_SUFFIX))
+        for month_key in keys:
+            if not first <= month_key <= last:
+                continue
+            view = self._view(os.path.join(room_dir, month_key + SEGMENT_SUFFIX))
+            ts = view["ts"]
+            i, j = np.searchsorted(ts, lo, "left"), np.searchsorted(ts, hi, "left")
+            if i < j:
+                yield view[i:j]
+
+    def summary(self, start=None, end=None, room_id=None, by_room=False):
+        """count/avg/min/max in [start, end), come temperature_summary()."""
+        rooms = [room_id] if room_id is not None else self._room_ids()
+        out = {}
+        for rid in rooms:
+            count, total, lo, hi = 0, 0.0, None, None
+            for chunk in self._slices(rid, start, end):
+                values = chunk["value"]
+                count += len(values)
+                total += float(values.sum())
+                lo = float(values.min()) if lo is None else min(lo, float(values.min()))
+                hi = float(values.max()) if hi is None else max(hi, float(values.max()))
+            if count:
+                out[rid] = {"count": count, "sum": total, "min": lo, "max": hi}
+        if by_room:
+            return {rid: _finish(acc) for rid, acc in out.items()}
+        merged = {"count": 0, "sum": 0.0, "min": None, "max": None}
+        for acc in out.values():
+            merged["count"] += acc["count"]
+            merged["sum"] += acc["sum"]
+            merged["min"] = acc["min"] if merged["min"] is None else min(merged["min"], acc["min"])
+            merged["max"] = acc["max"] if merged["max"] is None else max(merged["max"], acc["max"])
+        return _finish(merged)
+
+    def series(self, start, end, step, room_id=None):
+        """Medie per bucket di ampiezza step a partire da start: lista di avg (None se vuoto)."""
+        n = max(0, int(-(-(_epoch(end) - _epoch(start)) // step.total_seconds())))
+        sums = np.zeros(n)
+        counts = np.zeros(n)
+        rooms = [room_id] if room_id is not None else self._room_ids()
+        origin, width = _epoch(start), step.total_seconds()
+        for rid in rooms:
+            for chunk in self._slices(rid, start, end):
+                idx = ((chunk["ts"] - origin) // width).astype(np.int64)
+                sums += np.bincount(idx, weights=chunk["value"], minlength=n)[:n]
+                counts += np.bincount(idx, minlength=n)[:n]
+        return [float(s / c) if c else None for s, c in zip(sums, counts)]
+
+    def iter_readings(self, start=None, end=None, room_id=None, chunk_size=10000):
+        """(room_id, timestamp UTC naive, valore) in [start, end), a blocchi di chunk_size record."""
+        rooms = [room_id] if room_id is not None else self._room_ids()
+        for rid in rooms:
+            for chunk in self._slices(rid, start, end):
+                for i in range(0, len(chunk), chunk_size):
+                    part = chunk[i:i + chunk_size]
+                    for ts, value in zip(part["ts"].tolist(), part["value"].tolist()):
+                        yield rid, datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None), value
+
+    # ------------------------------------------------------------------- manutenzione
+
+    def expire(self, before):
+        """Elimina i segmenti interamente precedenti al mese di before."""
+        cutoff = _month_key(before)
+        removed = 0
+        with self._lock:
+            for rid in self._room_ids():
+                room_dir = os.path.join(self.base_dir, f"room_{rid}")
+                for name in os.listdir(room_dir):
+                    if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)] < cutoff:
+                        path = os.path.join(room_dir, name)
+                        self._views.pop(path, None)
+                        self._last_ts.pop(path, None)
+                        os.remove(path)
+                        if os.path.exists(path + UNSORTED_SUFFIX):
+                            os.remove(path + UNSORTED_SUFFIX)
+                        removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+            self._last_ts.clear()
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+            os.makedirs(self.base_dir, exist_ok=True)
+
+
+def _finish(acc):
+    count = acc["count"]
+    return {
+        "count": count,
+        "avg": (acc["sum"] / count) if count else None,
+        "min": acc["min"],
+        "max": acc["max"],
+    }
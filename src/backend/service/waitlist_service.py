@@ -0,0 +1,343 @@
+"""
+Lista d'attesa per i posti di una sala.
+
+Le iscrizioni in attesa sono tenute in memoria per (sala, giorno), ordinate
+per inizio della finestra con il massimo prefisso delle fine (come l'indice dei
+posti). Quando un posto si libera prima della fine della prenotazione (rilascio
+dal sensore, spostamento, cancellazione) una bisect trova le sole iscrizioni
+della sala la cui finestra interseca il tempo liberato, senza leggere la tabella
+ne' scorrere le altre; il posto va alla prima di queste in ordine di iscrizione
+che sta interamente sul posto. Le verifiche sul db si fanno fuori dal lock.
+
+I rilasci vengono raccolti dagli eventi di sessione (after_flush) e soddisfatti
+prima del commit, nella stessa transazione che libera il posto: la prenotazione
+creata e l'email accodata partono o falliscono insieme al rilascio. La coda si
+riallinea con il db a ogni rilascio (nuove iscrizioni, anche di altri processi)
+e le iscrizioni non piu' in attesa vengono scartate al momento della verifica.
+"""
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, update
+
+from src.backend.common.labels import EMAIL_WAITLIST_FULFILLED
+from src.backend.common.logger import logger
+from src.backend.models import Booking, BookingSlot, Room, Seat, User, WaitlistEntry
+from src.backend.models.booking import BookingStatus
+from src.backend.models.waitlist import WaitlistStatus
+from src.backend.notification.mail import queue_email
+from src.backend.service.booking_slots import slot_starts, slots_enabled
+from src.backend.service.hot_queries import ACTIVE_STATUSES
+
+WaitEntry = namedtuple("WaitEntry", "id user_id room_id start end")
+
+_RELEASES_KEY = "waitlist_releases"
+_FULFILLED_KEY = "waitlist_fulfilled"
+_EXCLUDED_KEY = "waitlist_excluded_seats"
+
+
+class _DayWindows:
+    """Iscrizioni di una sala in un giorno ordinate per (inizio, id), con il massimo prefisso delle fine."""
+
+    def __init__(self):
+        self.items = []  # (start, id, WaitEntry)
+        self.max_end = []
+
+    def _refresh(self, i=0):
+        del self.max_end[i:]
+        running = self.max_end[-1] if self.max_end else None
+        for _, _, entry in self.items[i:]:
+            running = entry.end if running is None or entry.end > running else running
+            self.max_end.append(running)
+
+    def add(self, entry):
+        i = bisect_left(self.items, (entry.start, entry.id))
+        self.items.insert(i, (entry.start, entry.id, entry))
+        self._refresh(i)
+
+    def remove(self, entry):
+        i = bisect_left(self.items, (entry.start, entry.id))
+        if i < len(self.items) and self.items[i][1] == entry.id:
+            del self.items[i]
+            self._refresh(i)
+
+    def overlapping(self, start, end):
+        """Iscrizioni con finestra che interseca [start, end)."""
+        k = bisect_left(self.items, (end,))
+        found = []
+        for i in range(k - 1, -1, -1):
+            if self.max_end[i] <= start:
+                break  # nessuna iscrizione precedente arriva oltre start
+            entry = self.items[i][2]
+            if entry.end > start:
+                found.append(entry)
+        return found
+
+
+class WaitlistQueue:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._days = {}  # (room_id, giorno) -> _DayWindows
+        self._live = {}  # id -> WaitEntry ancora in attesa
+        self.last_id = 0
+
+    def load(self, rows):
+        """Sostituisce il contenuto con rows: (id, user_id, room_id, start, end)."""
+        with self._lock:
+            self._days, self._live, self.last_id = {}, {}, 0
+            for row in rows:
+                self.push(WaitEntry(*row))
+        return len(self._live)
+
+    def push(self, entry):
+        with self._lock:
+            if entry.id in self._live:
+                return
+            self._live[entry.id] = entry
+            self._days.setdefault((entry.room_id, entry.start.date()), _DayWindows()).add(entry)
+            self.last_id = max(self.last_id, entry.id)
+
+    def discard(self, entry_id):
+        with self._lock:
+            entry = self._live.pop(entry_id, None)
+            if entry is None:
+                return
+            key = (entry.room_id, entry.start.date())
+            windows = self._days.get(key)
+            if windows is not None:
+                windows.remove(entry)
+                if not windows.items:
+                    del self._days[key]
+
+    def match(self, room_id, start, end, accept):
+        """
+        Prima iscrizione della sala (per ordine di iscrizione) con finestra che
+        interseca [start, end) e per cui accept(entry) e' vero, oppure None.
+        I candidati si scelgono in memoria sotto lock; accept (che puo' leggere
+        il db) gira fuori dal lock. L'iscrizione resta in coda finche' non
+        viene scartata con discard().
+        """
+        day, last_day = start.date(), (end - timedelta(microseconds=1)).date()
+        candidates = []
+        with self._lock:
+            while day <= last_day:
+                windows = self._days.get((room_id, day))
+                if windows is not None:
+                    candidates.extend(windows.overlapping(start, end))
+                day += timedelta(days=1)
+        for entry in sorted(candidates, key=lambda e: e.id):
+            if entry.id in self._live and accept(entry):
+                return entry
+        return None
+
+    def prune(self, before):
+        """Scarta le iscrizioni terminate prima di before."""
+        with self._lock:
+            expired = [entry_id for entry_id, entry in self._live.items() if entry.end <= before]
+            for entry_id in expired:
+                self.discard(entry_id)
+        return len(expired)
+
+    def __len__(self):
+        return len(self._live)
+
+
+# --------------------------------------------------------------------------- integrazione
+
+def init_waitlist(app, db):
+    """Registra la coda in app.extensions e la aggancia ai commit di db.session."""
+    app.extensions["waitlist"] = WaitlistQueue()
+    for name, listener in (("after_flush", _collect_releases),
+                           ("before_commit", _fulfil_waitlist),
+                           ("after_commit", _apply_fulfilled),
+                           ("after_rollback", _discard_releases)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+
+def waitlist_queue():
+    return current_app.extensions.get("waitlist")
+
+
+def _waiting_rows(session, after_id=0, now=None):
+    return session.execute(
+        select(WaitlistEntry.id, WaitlistEntry.user_id, WaitlistEntry.room_id,
+               WaitlistEntry.start_time, WaitlistEntry.end_time).where(
+            WaitlistEntry.status == WaitlistStatus.WAITING,
+            WaitlistEntry.end_time > (now or datetime.now()),
+            WaitlistEntry.id > after_id,
+        ).order_by(WaitlistEntry.id)
+    ).all()
+
+
+def rebuild_waitlist(session, now=None):
+    """Carica dal db le iscrizioni in attesa non ancora terminate."""
+    queue = waitlist_queue()
+    if queue is None:
+        return 0
+    loaded = queue.load(_waiting_rows(session, now=now))
+    logger.info(f"Waitlist queue loaded with {loaded} entries")
+    return loaded
+
+
+def expire_waitlist(session, now=None):
+    """Segna come scadute le iscrizioni terminate e le toglie dalla coda."""
+    now = now or datetime.now()
+    result = session.execute(
+        update(WaitlistEntry)
+        .where(WaitlistEntry.status == WaitlistStatus.WAITING, WaitlistEntry.end_time <= now)
+        .values(status=WaitlistStatus.EXPIRED)
+    )
+    session.commit()
+    queue = waitlist_queue()
+    if queue is not None:
+        queue.prune(now)
+    return result.rowcount
+
+
+def exclude_from_waitlist(session, seat_ids):
+    """I posti liberati nella transazione corrente non vanno offerti alla lista d'attesa (es. evacuazione)."""
+    session.info.setdefault(_EXCLUDED_KEY, set()).update(seat_ids)
+
+
+def _old(attrs, name, obj):
+    history = attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+def _collect_releases(session, flush_context):
+    """Tempo liberato dalle prenotazioni attive chiuse, spostate o cancellate: (seat_id, da, a)."""
+    releases = []
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        attrs = inspect(obj).attrs
+        if _old(attrs, "status", obj) not in ACTIVE_STATUSES:
+            continue
+        old_seat = _old(attrs, "seat_id", obj)
+        if obj.status not in ACTIVE_STATUSES or old_seat != obj.seat_id:
+            releases.append((old_seat, _old(attrs, "start_time", obj), _old(attrs, "end_time", obj)))
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking) and obj.status in ACTIVE_STATUSES:
+            releases.append((obj.seat_id, obj.start_time, obj.end_time))
+
+    if releases:
+        session.info.setdefault(_RELEASES_KEY, []).extend(releases)
+
+
+def _fulfil_waitlist(session):
+    """Prima del commit offre il tempo liberato alle iscrizioni in attesa."""
+    if not session.info.get(_RELEASES_KEY) or not has_app_context():
+        return
+    queue = waitlist_queue()
+    if queue is None:
+        return
+    session.flush()  # raccoglie anche i rilasci non ancora scritti
+    excluded = session.info.get(_EXCLUDED_KEY, ())
+    releases = [r for r in session.info.pop(_RELEASES_KEY, []) if r[0] not in excluded]
+    if not releases:
+        return
+    now = datetime.now()
+    for row in _waiting_rows(session, after_id=queue.last_id, now=now):
+        queue.push(WaitEntry(*row))
+
+    fulfilled = session.info.setdefault(_FULFILLED_KEY, set())
+    for seat_id, free_from, free_to in releases:
+        free_from = max(free_from, now)
+        if free_to <= free_from:
+            continue
+        room_id = session.scalar(select(Seat.room_id).where(Seat.id == seat_id, Seat.is_active.is_(True)))
+        if room_id is None:
+            continue
+
+        def accept(entry):
+            return entry.id not in fulfilled and _fits(session, queue, seat_id, entry, now)
+
+        # lo stesso tempo liberato puo' servire piu' iscrizioni in fasce diverse
+        while True:
+            entry = queue.match(room_id, free_from, free_to, accept)
+            if entry is None:
+                break
+            _book(session, seat_id, entry, now)
+            fulfilled.add(entry.id)
+
+
+def _fits(session, queue, seat_id, entry, now):
+    """Il posto e' libero per tutta la finestra residua dell'iscrizione e l'utente non ha gia' un posto."""
+    start = max(entry.start, now)
+    if entry.end <= start:
+        return False
+    row = session.get(WaitlistEntry, entry.id)
+    if row is None or row.status != WaitlistStatus.WAITING:
+        queue.discard(entry.id)
+        return False
+    busy = select(Booking.id).where(
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.start_time < entry.end,
+        Booking.end_time > start,
+    )
+    if session.scalar(busy.where(Booking.seat_id == seat_id).limit(1)) is not None:
+        return False
+    if slots_enabled():
+        # le fasce arrotondano verso l'esterno: una prenotazione adiacente puo' occupare la prima o l'ultima
+        first_slot = slot_starts(start, entry.end, current_app.config["BOOKING_SLOT_MINUTES"])[0]
+        taken = select(BookingSlot.slot_start).where(
+            BookingSlot.seat_id == seat_id,
+            BookingSlot.slot_start >= first_slot,
+            BookingSlot.slot_start < entry.end,
+        ).limit(1)
+        if session.scalar(taken) is not None:
+            return False
+    return session.scalar(busy.where(Booking.user_id == entry.user_id).limit(1)) is None
+
+
+def _book(session, seat_id, entry, now):
+    start = max(entry.start, now)
+    booking = Booking(user_id=entry.user_id, seat_id=seat_id, start_time=start, end_time=entry.end,
+                      status=BookingStatus.PENDING_CHECKIN)
+    session.add(booking)
+    session.flush()
+
+    row = session.get(WaitlistEntry, entry.id)
+    row.status = WaitlistStatus.FULFILLED
+    row.booking_id = booking.id
+    row.fulfilled_at = now
+
+    user = session.get(User, entry.user_id)
+    if user and user.email:
+        room = session.get(Room, entry.room_id)
+        queue_email(
+            subject=EMAIL_WAITLIST_FULFILLED["subject"],
+            body=EMAIL_WAITLIST_FULFILLED["body"].format(
+                user_name=user.username,
+                seat_id=seat_id,
+                room=room.name if room else entry.room_id,
+                start_time=start.strftime("%d/%m/%Y %H:%M"),
+                end_time=entry.end.strftime("%H:%M"),
+            ),
+            recipients=[user.email],
+        )
+    session.flush()
+    logger.info(f"Waitlist entry {entry.id} fulfilled with booking {booking.id} on seat {seat_id}")
+
+
+def _apply_fulfilled(session):
+    session.info.pop(_RELEASES_KEY, None)
+    session.info.pop(_EXCLUDED_KEY, None)
+    fulfilled = session.info.pop(_FULFILLED_KEY, None)
+    if not fulfilled or not has_app_context():
+        return
+    queue = waitlist_queue()
+    if queue is not None:
+        for entry_id in fulfilled:
+            queue.discard(entry_id)
+
+
+def _discard_releases(session):
+    session.info.pop(_RELEASES_KEY, None)
+    session.info.pop(_EXCLUDED_KEY, None)
+    session.info.pop(_FULFILLED_KEY, None)
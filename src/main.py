@@ -1,7 +1,10 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Flask
 from flask_smorest import Api
+from src.backend.auth.token_blocklist import init_token_blocklist, is_token_revoked, load_token_blocklist
 from src.backend.common.extensions import db, jwt, mail
+from src.backend.common.schema import upgrade_schema
+from src.backend.common.storage import configure_storage, init_storage, describe_storage
 from dotenv import load_dotenv
 from datetime import timedelta
 import os
@@ -19,7 +22,20 @@ from src.backend.controllers.energy_command import energy_bp
 from src.backend.controllers.seat_suggestion import suggestion_bp
 from src.backend.controllers.temperature_readings import temperature_bp
 from src.backend.controllers.admin_stats import admin_bp
-from src.backend.job.scheduler import close_expired_bookings
+from src.backend.controllers.admin_export import export_bp
+from src.backend.controllers.waitlist_controller import waitlist_bp
+from src.backend.job.scheduler import close_expired_bookings, archive_old_records, expire_temperature_readings, \
+    send_queued_emails, purge_revoked_tokens, settle_occupancy_changes, compact_occupancy_log, \
+    flush_device_heartbeats
+from src.backend.service.booking_slots import ensure_booking_slots, init_booking_write_path
+from src.backend.service.device_registry import init_device_registry, load_device_registry
+from src.backend.service.seat_availability import init_seat_availability, rebuild_seat_availability
+from src.backend.service.occupancy_filter import init_occupancy_filter
+from src.backend.service.occupancy_log import init_occupancy_log
+from src.backend.service.spatial_index import init_seat_grid
+from src.backend.service.waitlist_service import init_waitlist, rebuild_waitlist
+from src.backend.service.temperature_service import ensure_rollups, init_temperature_backend, \
+    init_temperature_write_behind
 
 # Carica variabili da .env
 load_dotenv()
@@ -32,6 +48,10 @@ app.config["OPENAPI_VERSION"] = "3.0.3"
 
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')  # Cambia con una chiave sicura
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=120)
+# Token revocati (logout): ogni quanti secondi un processo rilegge le nuove revoche dal db
+app.config['JWT_BLOCKLIST_REFRESH_SECONDS'] = float(os.getenv('JWT_BLOCKLIST_REFRESH_SECONDS', 5))
+# ... e ogni quanti secondi rilegge tutte le revoche di token non ancora scaduti
+app.config['JWT_BLOCKLIST_FULL_RELOAD_SECONDS'] = float(os.getenv('JWT_BLOCKLIST_FULL_RELOAD_SECONDS', 300))
 
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
@@ -41,6 +61,73 @@ app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
 
+# Outbox delle email accodate: intervallo del job di invio e tentativi massimi
+app.config['EMAIL_OUTBOX_INTERVAL_SECONDS'] = int(os.getenv('EMAIL_OUTBOX_INTERVAL_SECONDS', 30))
+app.config['EMAIL_MAX_ATTEMPTS'] = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+
+# Archiviazione dello storico (prenotazioni COMPLETED e letture di temperatura)
+app.config['ARCHIVE_BOOKINGS_AFTER_DAYS'] = int(os.getenv('ARCHIVE_BOOKINGS_AFTER_DAYS', 30))
+app.config['ARCHIVE_READINGS_AFTER_DAYS'] = int(os.getenv('ARCHIVE_READINGS_AFTER_DAYS', 90))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.getenv('ARCHIVE_BATCH_SIZE', 5000))
+app.config['ARCHIVE_INTERVAL_HOURS'] = int(os.getenv('ARCHIVE_INTERVAL_HOURS', 24))
+
+# Retention delle temperature: letture grezze e rollup minute/hour (i giornalieri restano)
+app.config['TEMPERATURE_RAW_RETENTION_DAYS'] = int(os.getenv('TEMPERATURE_RAW_RETENTION_DAYS', 180))
+app.config['TEMPERATURE_MINUTE_ROLLUP_RETENTION_DAYS'] = int(os.getenv('TEMPERATURE_MINUTE_ROLLUP_RETENTION_DAYS', 14))
+app.config['TEMPERATURE_HOUR_ROLLUP_RETENTION_DAYS'] = int(os.getenv('TEMPERATURE_HOUR_ROLLUP_RETENTION_DAYS', 400))
+
+# Paginazione di GET /bookings: dimensione massima di una pagina (?limit=)
+app.config['BOOKINGS_PAGE_MAX'] = int(os.getenv('BOOKINGS_PAGE_MAX', 500))
+
+# Prenotazioni multiple/ricorrenti: numero massimo di occorrenze per richiesta
+app.config['BOOKINGS_BULK_MAX'] = int(os.getenv('BOOKINGS_BULK_MAX', 200))
+
+# Prenotazioni di gruppo: posti adiacenti entro SEAT_ADJACENCY_RADIUS metri (se la sala non lo specifica)
+app.config['SEAT_ADJACENCY_RADIUS'] = float(os.getenv('SEAT_ADJACENCY_RADIUS', 1.5))
+app.config['GROUP_BOOKING_MAX_SIZE'] = int(os.getenv('GROUP_BOOKING_MAX_SIZE', 12))
+
+# Ricerca del posto libero piu' vicino: lato (metri) delle celle della griglia spaziale per sala
+app.config['SEAT_GRID_CELL_METERS'] = float(os.getenv('SEAT_GRID_CELL_METERS', 2.0))
+
+# Ingest a blocchi (/seat-occupancy/batch, /temperatures/batch): letture massime per richiesta
+app.config['INGEST_BATCH_MAX'] = int(os.getenv('INGEST_BATCH_MAX', 1000))
+
+# Letture di occupazione: scarta le ripetute (stato noto valido OCCUPANCY_STATE_TTL_SECONDS) e,
+# con OCCUPANCY_DEBOUNCE_SECONDS > 0, applica un cambio solo se stabile per la finestra
+app.config['OCCUPANCY_DEDUP'] = os.getenv('OCCUPANCY_DEDUP', 'true').lower() in ['true', '1', 't']
+app.config['OCCUPANCY_DEBOUNCE_SECONDS'] = float(os.getenv('OCCUPANCY_DEBOUNCE_SECONDS', 0))
+app.config['OCCUPANCY_STATE_TTL_SECONDS'] = float(os.getenv('OCCUPANCY_STATE_TTL_SECONDS', 60))
+
+# Log eventi di occupazione: scritto a blocchi dopo il commit, compattato in intervalli per posto
+app.config['OCCUPANCY_EVENT_LOG'] = os.getenv('OCCUPANCY_EVENT_LOG', 'true').lower() in ['true', '1', 't']
+app.config['OCCUPANCY_EVENT_FLUSH_INTERVAL_MS'] = int(os.getenv('OCCUPANCY_EVENT_FLUSH_INTERVAL_MS', 500))
+app.config['OCCUPANCY_EVENT_FLUSH_ROWS'] = int(os.getenv('OCCUPANCY_EVENT_FLUSH_ROWS', 500))
+app.config['OCCUPANCY_EVENT_BUFFER_CAPACITY'] = int(os.getenv('OCCUPANCY_EVENT_BUFFER_CAPACITY', 10000))
+app.config['OCCUPANCY_COMPACT_INTERVAL_MINUTES'] = int(os.getenv('OCCUPANCY_COMPACT_INTERVAL_MINUTES', 5))
+app.config['OCCUPANCY_COMPACT_BATCH_SIZE'] = int(os.getenv('OCCUPANCY_COMPACT_BATCH_SIZE', 5000))
+
+# Registro dei dispositivi: last_seen scritto in blocco ogni DEVICE_HEARTBEAT_FLUSH_SECONDS,
+# device senza heartbeat da DEVICE_STALE_MINUTES minuti elencati in /admin/devices/stale
+app.config['DEVICE_HEARTBEAT_FLUSH_SECONDS'] = int(os.getenv('DEVICE_HEARTBEAT_FLUSH_SECONDS', 30))
+app.config['DEVICE_STALE_MINUTES'] = int(os.getenv('DEVICE_STALE_MINUTES', 10))
+
+# Indice in memoria delle prenotazioni attive per posto (conflitti e stato corrente)
+app.config['SEAT_AVAILABILITY_INDEX'] = os.getenv('SEAT_AVAILABILITY_INDEX', 'true').lower() in ['true', '1', 't']
+
+# Scrittura prenotazioni: check (query di sovrapposizione) oppure slots (vincolo unico su fasce fisse)
+app.config['BOOKING_WRITE_PATH'] = os.getenv('BOOKING_WRITE_PATH', 'check').lower()
+app.config['BOOKING_SLOT_MINUTES'] = int(os.getenv('BOOKING_SLOT_MINUTES', 15))
+
+# Write-behind delle letture di temperatura: accodate e scritte in blocco da un thread (opt-in)
+app.config['TEMPERATURE_WRITE_BEHIND'] = os.getenv('TEMPERATURE_WRITE_BEHIND', 'false').lower() in ['true', '1', 't']
+app.config['TEMPERATURE_FLUSH_INTERVAL_MS'] = int(os.getenv('TEMPERATURE_FLUSH_INTERVAL_MS', 200))
+app.config['TEMPERATURE_FLUSH_ROWS'] = int(os.getenv('TEMPERATURE_FLUSH_ROWS', 500))
+app.config['TEMPERATURE_BUFFER_CAPACITY'] = int(os.getenv('TEMPERATURE_BUFFER_CAPACITY', 10000))
+
+# Storico temperature: sql (tabelle + rollup) oppure timeseries (segmenti mmap, richiede numpy)
+app.config['TEMPERATURE_BACKEND'] = os.getenv('TEMPERATURE_BACKEND', 'sql').lower()
+app.config['TEMPERATURE_SERIES_DIR'] = os.getenv('TEMPERATURE_SERIES_DIR', os.path.join(app.instance_path, 'timeseries'))
+
 
 app.register_blueprint(login_bp)
 app.register_blueprint(user_bp)
@@ -52,29 +139,92 @@ app.register_blueprint(energy_bp)
 app.register_blueprint(suggestion_bp)
 app.register_blueprint(demo_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(export_bp)
 app.register_blueprint(temperature_bp)
-# Configurazione SQLite
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance')), 'iot.db')}"
+app.register_blueprint(waitlist_bp)
+# Configurazione storage (DB_BACKEND=sqlite | mysql)
+configure_storage(app)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-print("DB PATH:", app.config["SQLALCHEMY_DATABASE_URI"])
-print("ABSOLUTE PATH:", os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'iot.db')))
+print("DB:", describe_storage(app))
 
 
 # Inizializza estensioni
 db.init_app(app)
+init_storage(app, db)
 api = Api(app)
 jwt.init_app(app)
+init_token_blocklist(app)
 mail.init_app(app)
+init_temperature_backend(app)
+init_temperature_write_behind(app)
+init_seat_availability(app, db)
+init_booking_write_path(app, db)
+init_waitlist(app, db)
+init_seat_grid(app, db)
+init_occupancy_filter(app)
+init_occupancy_log(app, db)
+init_device_registry(app, db)
+def _with_app_context(app, func):
+    def job():
+        with app.app_context():
+            func()
+    return job
+
 def start_scheduler(app):
     scheduler = BackgroundScheduler()
     scheduler.add_job(
-        func=lambda: app.app_context().push() or close_expired_bookings(),
+        func=_with_app_context(app, close_expired_bookings),
         trigger="interval",
         minutes=1,
         id="booking_monitor"
     )
+    scheduler.add_job(
+        func=_with_app_context(app, archive_old_records),
+        trigger="interval",
+        hours=app.config['ARCHIVE_INTERVAL_HOURS'],
+        id="history_archiver"
+    )
+    scheduler.add_job(
+        func=_with_app_context(app, expire_temperature_readings),
+        trigger="interval",
+        hours=app.config['ARCHIVE_INTERVAL_HOURS'],
+        id="temperature_retention"
+    )
+    scheduler.add_job(
+        func=_with_app_context(app, send_queued_emails),
+        trigger="interval",
+        seconds=app.config['EMAIL_OUTBOX_INTERVAL_SECONDS'],
+        id="email_outbox"
+    )
+    scheduler.add_job(
+        func=_with_app_context(app, purge_revoked_tokens),
+        trigger="interval",
+        hours=1,
+        id="token_purge"
+    )
+    scheduler.add_job(
+        func=_with_app_context(app, flush_device_heartbeats),
+        trigger="interval",
+        seconds=app.config['DEVICE_HEARTBEAT_FLUSH_SECONDS'],
+        id="device_heartbeats"
+    )
+    if app.config['OCCUPANCY_EVENT_LOG']:
+        scheduler.add_job(
+            func=_with_app_context(app, compact_occupancy_log),
+            trigger="interval",
+            minutes=app.config['OCCUPANCY_COMPACT_INTERVAL_MINUTES'],
+            id="occupancy_compaction"
+        )
+    if app.config['OCCUPANCY_DEDUP'] and app.config['OCCUPANCY_DEBOUNCE_SECONDS'] > 0:
+        scheduler.add_job(
+            func=_with_app_context(app, settle_occupancy_changes),
+            trigger="interval",
+            seconds=max(1, app.config['OCCUPANCY_DEBOUNCE_SECONDS']),
+            id="occupancy_debounce"
+        )
     scheduler.start()
+    return scheduler
 
 # Gestione delle eccezioni HTTP
 @app.errorhandler(HTTPException)
@@ -100,6 +250,21 @@ def expired_token_callback(jwt_header, jwt_payload):
     """
     return jsonify({"message": "Token scaduto", "error": "token_expired"}), 401
 
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    """
+    Controlla se il token è stato revocato (logout): lookup in memoria,
+    aggiornato dal db al massimo ogni JWT_BLOCKLIST_REFRESH_SECONDS.
+    """
+    return is_token_revoked(db.session, jwt_payload)
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    """
+    Gestisce il caso in cui il token JWT è stato revocato.
+    """
+    return jsonify({"message": "Token revocato", "error": "token_revoked"}), 401
+
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
     """
@@ -129,9 +294,16 @@ def serve_frontend_register():
 @app.route("/frontend/admin_dashboard")
 def serve_frontend_admin_dashboard():
     return send_from_directory("frontend", "admin_dashboard.html")
-# Crea le tabelle se non esistono
+# Crea le tabelle se non esistono e aggiunge gli indici mancanti ai db esistenti
 with app.app_context():
     db.create_all()
+    upgrade_schema(db)
+    ensure_rollups()
+    ensure_booking_slots(db.session)
+    rebuild_seat_availability(db.session)
+    rebuild_waitlist(db.session)
+    load_token_blocklist(db.session)
+    load_device_registry(db.session)
 
 # Endpoint di test
 @app.route("/")
@@ -139,5 +311,8 @@ def home():
     return {"message": "IoT Parking API attiva"}
 
 if __name__ == "__main__":
+    # con il reloader di debug il modulo gira due volte: avvia i job solo nel processo servito
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_scheduler(app)
     app.run(debug=True)
     use_reloader = False